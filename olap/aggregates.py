@@ -0,0 +1,311 @@
+import argparse
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from psycopg2 import extensions
+
+from semantic import DIMENSIONS
+
+# Pre-built summary tables of the `sales` fact table. Every aggregate keeps the
+# date plus a subset of the other dimensions, with the measures stored so that
+# the app's templates can be rewritten to read them instead of `sales`:
+#
+#   total_amount    SUM(total_amount)
+#   quantity        SUM(quantity)
+#   unit_price_sum  SUM(unit_price), AVG(unit_price) = unit_price_sum / row_count
+#   row_count       COUNT(*)
+#
+# Monthly aggregates keep the smallest date id of each month in `date_id`, so
+# the templates' date joins and filters keep working as long as the selected
+# dates cover whole months.
+
+FACT_TABLE = "sales"
+# Fact column of each dimension table, e.g. "store": "store_id"
+DIMENSION_COLUMNS = {
+    name: dim.key.removeprefix("s.") for name, dim in DIMENSIONS.items() if dim.table is not None
+}
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    name: str
+    grain: str
+    dims: tuple
+
+    def build_sql(self, table):
+        columns = [DIMENSION_COLUMNS[dim] for dim in self.dims]
+        select_dims = "".join(f", s.{column}" for column in columns)
+        group_dims = "".join(f", s.{column}" for column in columns)
+        if self.grain == "day":
+            date_column = "s.date_id"
+            joins = ""
+        else:
+            date_column = "m.date_id"
+            joins = """
+            JOIN d_dates d ON s.date_id = d.id
+            JOIN (SELECT year, month, MIN(id) AS date_id FROM d_dates GROUP BY year, month) m
+              ON m.year = d.year AND m.month = d.month"""
+        return f"""
+            CREATE TABLE {table} AS
+            SELECT {date_column} AS date_id{select_dims},
+                   SUM(s.total_amount) AS total_amount,
+                   SUM(s.quantity)::bigint AS quantity,
+                   SUM(s.unit_price) AS unit_price_sum,
+                   COUNT(*) AS row_count
+            FROM {FACT_TABLE} s{joins}
+            GROUP BY {date_column}{group_dims}
+        """
+
+    def index_columns(self):
+        # Column list of each index, by the suffix of its name
+        columns = {"date_id": "date_id"}
+        for dim in self.dims:
+            column = DIMENSION_COLUMNS[dim]
+            columns[column] = f"{column}, date_id"
+        return columns
+
+    def index_sql(self, table):
+        return [
+            f"CREATE INDEX {table}_{suffix}_idx ON {table} ({columns})"
+            for suffix, columns in self.index_columns().items()
+        ]
+
+    def swap_sql(self, staging):
+        # Replaces the aggregate by its staging table, indexes included
+        statements = [f"DROP TABLE IF EXISTS {self.name}", f"ALTER TABLE {staging} RENAME TO {self.name}"]
+        statements += [
+            f"ALTER INDEX {staging}_{suffix}_idx RENAME TO {self.name}_{suffix}_idx" for suffix in self.index_columns()
+        ]
+        return statements
+
+
+AGGREGATES = [
+    Aggregate("agg_sales_day_store_doctype", "day", ("store", "document_type")),
+    Aggregate("agg_sales_day_store_product_doctype", "day", ("store", "product", "document_type")),
+    Aggregate("agg_sales_day_customer", "day", ("customer",)),
+    Aggregate("agg_sales_month_store_product_doctype", "month", ("store", "product", "document_type")),
+    Aggregate("agg_sales_month_customer", "month", ("customer",)),
+]
+
+CATALOG_TABLE = "olap_aggregates"
+
+# Measure expressions over `sales` and their equivalent over an aggregate
+MEASURE_REWRITES = [
+    ("COUNT(DISTINCT s.id)", "SUM(s.row_count)::bigint"),
+    ("COUNT(s.id)", "SUM(s.row_count)::bigint"),
+    ("SUM(s.quantity)", "SUM(s.quantity)::bigint"),
+    ("AVG(s.total_amount)", "(SUM(s.total_amount) / SUM(s.row_count))"),
+    ("AVG(s.unit_price)", "(SUM(s.unit_price_sum) / SUM(s.row_count))"),
+    ("SUM(s.unit_price)", "SUM(s.unit_price_sum)"),
+]
+
+_FACT_COLUMN_RE = re.compile(r"\bs\.(\w+)")
+
+
+def fact_dimensions(sql):
+    return frozenset(
+        dim for dim, column in DIMENSION_COLUMNS.items() if re.search(rf"\bs\.{column}\b", sql)
+    )
+
+
+def rewrite(sql, table):
+    """Rewrites a query over `sales s` to read from the aggregate `table`.
+
+    Raises ValueError when the query uses a fact column or measure that has no
+    equivalent in the aggregates.
+    """
+    if f"FROM {FACT_TABLE} s" not in sql:
+        raise ValueError("Query doesn't read from the fact table")
+    for fact_expr, aggregate_expr in MEASURE_REWRITES:
+        sql = sql.replace(fact_expr, aggregate_expr)
+    sql = sql.replace(f"FROM {FACT_TABLE} s", f"FROM {table} s")
+
+    allowed = {"date_id", "total_amount", "quantity", "unit_price_sum", "row_count", *DIMENSION_COLUMNS.values()}
+    unknown = set(_FACT_COLUMN_RE.findall(sql)) - allowed
+    if unknown:
+        raise ValueError(f"Query uses fact columns {sorted(unknown)} that aren't aggregated")
+    return sql
+
+
+def can_rewrite(sql):
+    try:
+        rewrite(sql, "agg")
+        return True
+    except ValueError:
+        return False
+
+
+def refresh(conn, names=None):
+    """Rebuilds the aggregates (all of them by default) from `sales`.
+
+    Every aggregate is built into a staging table from a single snapshot,
+    then each is swapped in atomically in its own short transaction, so
+    readers see either the old or the new version and only wait for that
+    table's swap. Returns the name, row count and build time of each
+    refreshed aggregate.
+    """
+    aggregates = [a for a in AGGREGATES if names is None or a.name in names]
+    conn.set_session(isolation_level=extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    built = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+                    name text PRIMARY KEY,
+                    grain text NOT NULL,
+                    dims text[] NOT NULL,
+                    row_count bigint NOT NULL,
+                    source_max_id bigint NOT NULL,
+                    refreshed_at timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {FACT_TABLE}")
+            source_max_id = cur.fetchone()[0]
+
+            for aggregate in aggregates:
+                start = time.monotonic()
+                staging = f"{aggregate.name}_new"
+                cur.execute(f"DROP TABLE IF EXISTS {staging}")
+                cur.execute(aggregate.build_sql(staging))
+                for statement in aggregate.index_sql(staging):
+                    cur.execute(statement)
+                cur.execute(f"ANALYZE {staging}")
+                cur.execute(f"SELECT COUNT(*) FROM {staging}")
+                built.append((aggregate, staging, cur.fetchone()[0], time.monotonic() - start))
+        # Nothing reads the staging tables, the build holds no lock readers wait on
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    refreshed = []
+    try:
+        for aggregate, staging, row_count, elapsed in built:
+            start = time.monotonic()
+            with conn.cursor() as cur:
+                for statement in aggregate.swap_sql(staging):
+                    cur.execute(statement)
+                # The snapshot's highest sales id, for the navigator's freshness check
+                cur.execute(f"""
+                    INSERT INTO {CATALOG_TABLE} (name, grain, dims, row_count, source_max_id, refreshed_at)
+                    VALUES (%s, %s, %s, %s, %s, now())
+                    ON CONFLICT (name) DO UPDATE SET
+                        grain = EXCLUDED.grain,
+                        dims = EXCLUDED.dims,
+                        row_count = EXCLUDED.row_count,
+                        source_max_id = EXCLUDED.source_max_id,
+                        refreshed_at = EXCLUDED.refreshed_at
+                """, (aggregate.name, aggregate.grain, list(aggregate.dims), row_count, source_max_id))
+            conn.commit()
+            refreshed.append((aggregate.name, row_count, elapsed + time.monotonic() - start))
+    except Exception:
+        conn.rollback()
+        # Staging tables left over by the failed swap and the ones after it
+        with conn.cursor() as cur:
+            for _, staging, _, _ in built[len(refreshed):]:
+                cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.commit()
+        raise
+    return refreshed
+
+
+class Navigator:
+    """Picks the smallest aggregate able to answer a query.
+
+    The catalog is re-read at most every `refresh_interval` seconds. Aggregates
+    built before the last load into `sales` are ignored until refreshed.
+    """
+
+    def __init__(self, pool, date_index=None, refresh_interval=60.0):
+        self.pool = pool
+        self.date_index = date_index
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._catalog = []
+        self._checked_at = None
+
+    def catalog(self):
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._catalog
+
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (CATALOG_TABLE,))
+                    if cur.fetchone()[0]:
+                        cur.execute(f"""
+                            SELECT name, grain, dims, row_count
+                            FROM {CATALOG_TABLE}
+                            WHERE source_max_id = (SELECT COALESCE(MAX(id), 0) FROM {FACT_TABLE})
+                            ORDER BY row_count
+                        """)
+                        self._catalog = [
+                            (name, grain, frozenset(dims), row_count) for name, grain, dims, row_count in cur.fetchall()
+                        ]
+                    else:
+                        self._catalog = []
+            self._checked_at = time.monotonic()
+            return self._catalog
+
+    def route(self, sql, date_ids=None):
+        """Returns the table to read `sql` from, `sales` when no aggregate fits."""
+        if not can_rewrite(sql):
+            return FACT_TABLE
+        dims = fact_dimensions(sql)
+        needs_day = "d.day" in sql
+        for name, grain, aggregate_dims, _ in self.catalog():
+            if not dims <= aggregate_dims:
+                continue
+            if grain == "month":
+                if needs_day:
+                    continue
+                if date_ids is not None and not self._whole_months(date_ids):
+                    continue
+            return name
+        return FACT_TABLE
+
+    def _whole_months(self, date_ids):
+        if self.date_index is None:
+            return False
+        return self.date_index().covers_whole_months(date_ids)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from db import connect
+    from sampling import DEFAULT_MIN_ROWS, DEFAULT_RATE, SAMPLE_TABLE, refresh_sample
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Rebuild the OLAP aggregate tables after an ETL run.")
+    parser.add_argument("names", nargs="*", help="aggregates to rebuild, all of them (and the sample) by default")
+    parser.add_argument(
+        "--sample-rate", type=float, default=float(os.getenv("OLAP_SAMPLE_RATE", str(DEFAULT_RATE))),
+        help=f"fraction of the sales kept in {SAMPLE_TABLE} for the approximate preview (default: {DEFAULT_RATE})",
+    )
+    args = parser.parse_args()
+
+    known = {a.name for a in AGGREGATES} | {SAMPLE_TABLE}
+    unknown = set(args.names) - known
+    if unknown:
+        parser.error(f"unknown aggregates: {', '.join(sorted(unknown))} (available: {', '.join(sorted(known))})")
+
+    conn = connect(os.environ["DATA_MART_POSTGRES_URI"])
+    try:
+        names = [name for name in args.names if name != SAMPLE_TABLE]
+        if names or not args.names:
+            for name, row_count, elapsed in refresh(conn, names or None):
+                print(f"Refreshed {name}: {row_count} rows in {elapsed:.2f}s")
+        if not args.names or SAMPLE_TABLE in args.names:
+            row_count, elapsed = refresh_sample(conn, args.sample_rate, DEFAULT_MIN_ROWS)
+            print(f"Refreshed {SAMPLE_TABLE}: {row_count} rows in {elapsed:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# Benchmarks of the OLAP app's queries against a synthetic data mart.
+# Run from the olap directory with `python3 -m bench --help`.
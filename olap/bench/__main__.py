@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from aggregates import Navigator
+from db import ConnectionPool, connect
+from dates import DateDimension
+
+from bench.catalog import build_catalog
+from bench.generate import SALES_PER_SCALE, generate
+from bench.runner import compare, run, sales_rows
+
+
+def database_url(args, fallback=True):
+    # Generating wipes the database, so it never falls back to the data mart
+    url = args.database_url or os.getenv("BENCH_POSTGRES_URI")
+    if not url and fallback:
+        url = os.getenv("DATA_MART_POSTGRES_URI")
+    if not url:
+        sys.exit("Set BENCH_POSTGRES_URI or pass --database-url")
+    return url
+
+
+def generate_command(args):
+    conn = connect(database_url(args, fallback=False))
+    try:
+        generate(conn, args.scale, seed=args.seed, reset=args.reset)
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
+
+
+def run_command(args):
+    pool = ConnectionPool(database_url(args), minconn=1, maxconn=2)
+    try:
+        with pool.connection() as conn:
+            cases = build_catalog(conn, include_exports=args.include_exports)
+        rows = sales_rows(pool)
+        scale = args.scale or f"{rows / SALES_PER_SCALE:g}"
+
+        baseline = {}
+        if args.baseline and Path(args.baseline).exists():
+            baseline = json.loads(Path(args.baseline).read_text()).get(scale, {}).get("cases", {})
+
+        navigator = None
+        if args.aggregates:
+            navigator = Navigator(pool, date_index=DateDimension(pool).index)
+
+        print(f"Scale factor {scale} ({rows} sales), {len(cases)} cases")
+        results = run(pool, cases, args.repeat, args.warmup, args.filter, navigator, baseline)
+
+        if args.output:
+            output = Path(args.output)
+            saved = json.loads(output.read_text()) if output.exists() else {}
+            saved[scale] = {"sales_rows": rows, "cases": results}
+            output.write_text(json.dumps(saved, indent=2, sort_keys=True))
+            print(f"Saved results to {output}")
+
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"Regression: {name} p50 {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        return 1 if regressions else 0
+    finally:
+        pool.close()
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(prog="python3 -m bench", description="Benchmark the OLAP queries.")
+    parser.add_argument("--database-url", help="benchmark database, BENCH_POSTGRES_URI by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="load a synthetic data mart with COPY")
+    generate_parser.add_argument("--scale", type=float, default=1.0, help="millions of sales rows (default: 1)")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--reset", action="store_true", help="drop the schema and apply the ETL migrations first")
+    generate_parser.set_defaults(func=generate_command)
+
+    run_parser = commands.add_parser("run", help="time every query shape issued by the app")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed runs per query (default: 5)")
+    run_parser.add_argument("--warmup", type=int, default=1, help="untimed runs per query (default: 1)")
+    run_parser.add_argument("--filter", help="only run the cases matching this regular expression")
+    run_parser.add_argument("--scale", help="scale factor label, derived from the sales row count by default")
+    run_parser.add_argument("--aggregates", action="store_true", help="route queries to the aggregates like the app")
+    run_parser.add_argument("--include-exports", action="store_true", help="also run the export queries")
+    run_parser.add_argument("--output", help="JSON file to store the results in, per scale factor")
+    run_parser.add_argument("--baseline", help="JSON file of earlier results to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="median slowdown reported as a regression (default: 0.2)")
+    run_parser.set_defaults(func=run_command)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from dates import DateIndex
+from queries import CROSSTAB_KEYS, TEMPLATES, execute
+from semantic import DIMENSIONS
+
+# Every query shape the app issues, with representative parameters. Templates
+# filtered by date get one case per date range, the others a single case.
+
+# Days of the date ranges, counted back from the last date of the dimension
+DATE_RANGES = {
+    "month": 30,
+    "year": 365,
+}
+TOP_N = 10
+# Keyset-paginated templates are timed on their first page
+PAGE_SIZE = 100
+
+# Templates only used by the exports, left out unless asked for
+EXPORT_PREFIXES = ("facts", "export")
+
+
+@dataclass(frozen=True)
+class QueryCase:
+    name: str
+    template_id: str
+    params: dict = field(default_factory=dict, compare=False, hash=False)
+
+    @property
+    def values(self):
+        return TEMPLATES[self.template_id].bind(self.params)
+
+
+def _first_name(conn, dim):
+    # The first name, or attribute value, of a dimension
+    relation = DIMENSIONS[dim].relation or f"SELECT id, name AS value FROM {DIMENSIONS[dim].table}"
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT value FROM ({relation}) r WHERE value IS NOT NULL ORDER BY value LIMIT 1")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _first_ids(conn, dim):
+    # Ids of the dimension's first name, as the engine binds a filter
+    return [row[0] for row in execute(conn, f"ids_{dim}", TEMPLATES[f"ids_{dim}"].bind(
+        {"names": [_first_name(conn, dim)]}
+    ))]
+
+
+def _top_columns(conn, template_id, date_ids):
+    # crosstab_store_month -> the TOP_N months with the highest sales
+    cols = next(dim for dim in CROSSTAB_KEYS if template_id.endswith(f"_{dim}"))
+    rows = execute(conn, f"pivot_columns_{cols}", TEMPLATES[f"pivot_columns_{cols}"].bind(
+        {"date_ids": date_ids, "top_n": TOP_N}
+    ))
+    return [row[0] for row in rows]
+
+
+def build_catalog(conn, include_exports=False):
+    index = DateIndex.load(conn)
+    date_ids = {}
+    if index.last is not None:
+        for label, days in DATE_RANGES.items():
+            date_ids[label] = list(index.resolve(index.last - timedelta(days=days - 1), index.last).ids)
+
+    values = {}
+    cases = []
+    for template_id, template in TEMPLATES.items():
+        if not include_exports and template_id.startswith(EXPORT_PREFIXES):
+            continue
+        names = [name for name, _ in template.params]
+
+        params = {}
+        if "top_n" in names:
+            params["top_n"] = TOP_N
+        if "page_offset" in names:
+            params.update(page_size=PAGE_SIZE, page_offset=0)
+        elif "page_size" in names:
+            params.update(after_year=0, after_month=0, page_size=PAGE_SIZE)
+        if "names" in names:
+            params["names"] = [_first_name(conn, template_id.removeprefix("ids_"))]
+        for name in names:
+            if name.endswith("_ids") and name != "date_ids":
+                dim = name.removesuffix("_ids")
+                if dim not in values:
+                    values[dim] = _first_ids(conn, dim)
+                params[name] = values[dim]
+
+        if "date_ids" in names:
+            for label, ids in date_ids.items():
+                case_params = {**params, "date_ids": ids}
+                if "col_keys" in names:
+                    case_params["col_keys"] = _top_columns(conn, template_id, ids)
+                cases.append(QueryCase(f"{template_id}@{label}", template_id, case_params))
+        else:
+            cases.append(QueryCase(template_id, template_id, params))
+    return cases
@@ -0,0 +1,197 @@
+import io
+import struct
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Synthetic data mart at a chosen scale factor, loaded with COPY. A scale
+# factor of 1 is a million sales; the dimensions grow with it so per-customer
+# and per-product groups keep a realistic size.
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "etl" / "prisma" / "migrations"
+
+SALES_PER_SCALE = 1_000_000
+CHUNK_ROWS = 1_000_000
+FIRST_DATE = date(2020, 1, 1)
+DAYS = 5 * 365 + 1
+
+STORES = [
+    ("Viseu", "Doce Norte"), ("Lisboa", "Aroma da Sé"), ("Coimbra", "Pastel & Tradição"),
+    ("Porto", "Forno da Ribeira"), ("Braga", "Massa Mãe"), ("Faro", "Sabores do Sul"),
+    ("Aveiro", "Ovos Moles & Cia"), ("Guarda", "Pão da Serra"),
+]
+DOCUMENT_TYPES = ["Fatura", "Fatura Simplificada", "Fatura-Recibo"]
+MATERIALS = [None, "Papel", "Cartão", "Plástico", "Vidro"]
+
+# Binary COPY layout of the generated sales columns, all fixed width
+SALES_COLUMNS = [
+    ("quantity", ">i2"),
+    ("unit_price", ">f8"),
+    ("total_amount", ">f8"),
+    ("document_num", ">i4"),
+    ("date_id", ">i4"),
+    ("customer_id", ">i4"),
+    ("store_id", ">i2"),
+    ("product_id", ">i4"),
+    ("document_type_id", ">i2"),
+]
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+
+
+def dimension_sizes(scale):
+    return {
+        "sales": int(SALES_PER_SCALE * scale),
+        "customers": max(500, int(50_000 * scale ** 0.5)),
+        "products": max(80, int(1_000 * scale ** 0.5)),
+        "stores": len(STORES),
+        "document_types": len(DOCUMENT_TYPES),
+        "dates": DAYS,
+    }
+
+
+def reset_schema(conn):
+    """Drops everything in the public schema and applies the ETL migrations."""
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA public CASCADE")
+        cur.execute("CREATE SCHEMA public")
+        for migration in sorted(MIGRATIONS_DIR.glob("*/migration.sql")):
+            cur.execute(migration.read_text())
+    conn.commit()
+
+
+def _copy_text(cur, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _load_dimensions(cur, sizes, rng):
+    _copy_text(cur, "d_stores", ["id", "location", "name"], ((i, *store) for i, store in enumerate(STORES, start=1)))
+    _copy_text(cur, "d_document_types", ["id", "name"], enumerate(DOCUMENT_TYPES, start=1))
+    # Loaded in a shuffled order, like the ETL, so date ids don't follow the calendar
+    days = [FIRST_DATE + timedelta(days=int(i)) for i in rng.permutation(sizes["dates"])]
+    _copy_text(
+        cur, "d_dates", ["id", "year", "month", "day"],
+        ((i, d.year, d.month, d.day) for i, d in enumerate(days, start=1)),
+    )
+    _copy_text(
+        cur, "d_customers", ["id", "nif", "name", "email", "phone"],
+        (
+            (i, 100_000_000 + i, f"Cliente {i}", f"cliente{i}@example.pt", f"9{i % 100_000_000:08d}" if i % 3 else None)
+            for i in range(1, sizes["customers"] + 1)
+        ),
+    )
+    prices = np.round(rng.uniform(0.5, 25.0, sizes["products"]), 2)
+    _copy_text(
+        cur, "d_products", ["id", "sku", "name", "description", "price", "material"],
+        (
+            (i, f"SKU-{i:06d}", f"Produto {i}", None, prices[i - 1], MATERIALS[i % len(MATERIALS)])
+            for i in range(1, sizes["products"] + 1)
+        ),
+    )
+    for table in ("d_stores", "d_document_types", "d_dates", "d_customers", "d_products"):
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+    return prices
+
+
+def _sales_chunk(rng, rows, first_document, sizes, prices):
+    # Popular products and customers get most of the sales
+    products = (rng.random(rows) ** 3 * sizes["products"]).astype(np.int32) + 1
+    customers = (rng.random(rows) ** 2 * sizes["customers"]).astype(np.int32) + 1
+    quantity = rng.integers(1, 13, rows, dtype=np.int16)
+    unit_price = prices[products - 1]
+
+    chunk = np.empty(rows, dtype=[
+        ("fields", ">i2"),
+        *((name, [("length", ">i4"), ("value", dtype)]) for name, dtype in SALES_COLUMNS),
+    ])
+    chunk["fields"] = len(SALES_COLUMNS)
+    values = {
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total_amount": np.round(unit_price * quantity, 2),
+        "document_num": first_document + np.arange(rows) // 3,
+        "date_id": rng.integers(1, sizes["dates"] + 1, rows),
+        "customer_id": customers,
+        "store_id": rng.integers(1, sizes["stores"] + 1, rows),
+        "product_id": products,
+        "document_type_id": rng.integers(1, sizes["document_types"] + 1, rows),
+    }
+    for name, dtype in SALES_COLUMNS:
+        chunk[name]["length"] = np.dtype(dtype).itemsize
+        chunk[name]["value"] = values[name]
+    return chunk.tobytes()
+
+
+def _drop_sales_constraints(cur):
+    # Indexes and foreign keys are rebuilt once after the load, far faster than
+    # maintaining them row by row
+    cur.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = 'sales'::regclass AND contype = 'f'
+    """)
+    foreign_keys = cur.fetchall()
+    cur.execute("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE tablename = 'sales' AND indexname <> 'sales_pkey'
+    """)
+    indexes = cur.fetchall()
+    for name, _ in foreign_keys:
+        cur.execute(f'ALTER TABLE sales DROP CONSTRAINT "{name}"')
+    for name, _ in indexes:
+        cur.execute(f'DROP INDEX "{name}"')
+    return foreign_keys, indexes
+
+
+def generate(conn, scale, seed=0, reset=False, log=print):
+    """Loads a synthetic data mart of `scale` million sales into `conn`'s database.
+
+    With `reset`, the public schema is dropped and rebuilt from the ETL
+    migrations first; otherwise the tables must exist and be empty.
+    """
+    sizes = dimension_sizes(scale)
+    rng = np.random.default_rng(seed)
+    if reset:
+        reset_schema(conn)
+
+    start = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM sales) OR EXISTS (SELECT 1 FROM d_dates)")
+        if cur.fetchone()[0]:
+            raise ValueError("The data mart already has data, use reset to replace it")
+
+        prices = _load_dimensions(cur, sizes, rng)
+        log(f"Loaded dimensions: {sizes['customers']} customers, {sizes['products']} products")
+
+        foreign_keys, indexes = _drop_sales_constraints(cur)
+        columns = ", ".join(name for name, _ in SALES_COLUMNS)
+        loaded = 0
+        while loaded < sizes["sales"]:
+            rows = min(CHUNK_ROWS, sizes["sales"] - loaded)
+            data = _COPY_HEADER + _sales_chunk(rng, rows, loaded // 3 + 1, sizes, prices) + _COPY_TRAILER
+            cur.copy_expert(f"COPY sales ({columns}) FROM STDIN WITH (FORMAT binary)", io.BytesIO(data))
+            loaded += rows
+            log(f"Loaded {loaded} of {sizes['sales']} sales ({time.monotonic() - start:.1f}s)")
+
+        for _, definition in indexes:
+            cur.execute(definition)
+        for name, definition in foreign_keys:
+            cur.execute(f'ALTER TABLE sales ADD CONSTRAINT "{name}" {definition}')
+    conn.commit()
+
+    # VACUUM can't run inside a transaction
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+    finally:
+        conn.autocommit = autocommit
+    log(f"Generated scale factor {scale} in {time.monotonic() - start:.1f}s")
+    return sizes
@@ -0,0 +1,104 @@
+import re
+import time
+import tracemalloc
+
+import numpy as np
+
+from aggregates import FACT_TABLE
+from queries import TEMPLATES, execute
+
+# Latency, throughput and memory of each catalog case. Queries run exactly as
+# in the app, through prepared statements on a pooled connection.
+
+PERCENTILES = (50, 95, 99)
+# Slowdowns below this many seconds are noise, not regressions
+NOISE_FLOOR = 0.002
+
+
+def run_case(conn, case, repeat=5, warmup=1, source=FACT_TABLE):
+    values = case.values
+    for _ in range(warmup):
+        execute(conn, case.template_id, values, source)
+        conn.rollback()
+
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(execute(conn, case.template_id, values, source))
+        latencies.append(time.perf_counter() - start)
+        conn.rollback()
+
+    # Memory is measured on a separate run, tracing slows the query down
+    tracemalloc.start()
+    try:
+        execute(conn, case.template_id, values, source)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        conn.rollback()
+
+    latencies = np.array(latencies)
+    result = {f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+    result.update({
+        "mean": float(latencies.mean()),
+        "min": float(latencies.min()),
+        "max": float(latencies.max()),
+        "rows": rows,
+        "rows_per_s": rows / result["p50"] if result["p50"] else None,
+        "peak_mb": peak / 2**20,
+        "source": source,
+    })
+    return result
+
+
+def run(pool, cases, repeat=5, warmup=1, pattern=None, navigator=None, baseline=None, log=print):
+    """Runs the catalog cases matching `pattern`, returns their results by name.
+
+    With a `navigator`, each query reads from the aggregate the app would
+    route it to. Each result is logged next to its `baseline` entry, if any.
+    """
+    results = {}
+    for case in cases:
+        if pattern and not re.search(pattern, case.name):
+            continue
+        source = FACT_TABLE
+        if navigator is not None:
+            source = navigator.route(TEMPLATES[case.template_id].sql, case.params.get("date_ids"))
+        with pool.connection() as conn:
+            results[case.name] = run_case(conn, case, repeat, warmup, source)
+        log(format_result(case.name, results[case.name], (baseline or {}).get(case.name)))
+    return results
+
+
+def sales_rows(pool):
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {FACT_TABLE}")
+            return cur.fetchone()[0]
+
+
+def compare(results, baseline, threshold=0.2):
+    """Cases whose median latency grew more than `threshold` over the baseline.
+
+    Returns (name, baseline p50, current p50) tuples.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result["p50"] > previous["p50"] * (1 + threshold) and result["p50"] - previous["p50"] > NOISE_FLOOR:
+            regressions.append((name, previous["p50"], result["p50"]))
+    return regressions
+
+
+def format_result(name, result, previous=None):
+    line = (
+        f"{name:<48} p50 {result['p50'] * 1000:9.2f} ms  p95 {result['p95'] * 1000:9.2f} ms  "
+        f"p99 {result['p99'] * 1000:9.2f} ms  {result['rows']:>7} rows  "
+        f"{(result['rows_per_s'] or 0):>12.0f} rows/s  {result['peak_mb']:7.2f} MB"
+    )
+    if previous is not None:
+        line += f"  {(result['p50'] / previous['p50'] - 1) * 100:+6.1f}% vs baseline"
+    return line
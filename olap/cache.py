@@ -0,0 +1,221 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from aggregates import FACT_TABLE
+
+# Results of the templates are cached per data mart version: any load into the
+# fact or dimension tables changes the version, and entries of older versions
+# are either refreshed (see incremental.py) or recomputed, instead of serving
+# stale numbers until the app restarts.
+
+DEFAULT_TTL = 900.0
+# Seconds an entry stays fresh, by query class (the template id's prefix)
+QUERY_CLASS_TTLS = {
+    "values": 3600.0,
+}
+
+VERSION_SQL = f"""
+    SELECT
+        (SELECT MIN(id) FROM {FACT_TABLE}),
+        (SELECT MAX(id) FROM {FACT_TABLE}),
+        (SELECT MAX(id) FROM d_dates),
+        (SELECT MAX(id) FROM d_stores),
+        (SELECT MAX(id) FROM d_products),
+        (SELECT MAX(id) FROM d_customers),
+        (SELECT MAX(id) FROM d_document_types)
+"""
+
+
+def query_class(template_id):
+    return template_id.split("_", 1)[0]
+
+
+def freeze(values):
+    # Bound values as a hashable cache key
+    return tuple(tuple(value) if isinstance(value, list) else value for value in values)
+
+
+def result_size(result):
+    """Approximate memory used by a query result, in bytes."""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+        # FrameResult and other tuples led by a DataFrame
+        return int(result[0].memory_usage(deep=True).sum()) + sys.getsizeof(result)
+    if isinstance(result, list):
+        return sys.getsizeof(result) + sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in result
+        )
+    return sys.getsizeof(result)
+
+
+class DataVersion:
+    """Cheap version stamp of the data mart.
+
+    The id bounds of the fact table and the highest id of each dimension,
+    which all move with every ETL load. Re-checked at most every
+    `refresh_interval` seconds.
+    """
+
+    def __init__(self, pool, refresh_interval=30.0):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+
+    def current(self):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._version
+
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(VERSION_SQL)
+                    self._version = cur.fetchone()
+            self._checked_at = time.monotonic()
+            return self._version
+
+
+class ResultCache:
+    """LRU cache of query results bounded by entry count and total bytes.
+
+    Entries expire after the TTL of their query class. Entries of an older data
+    version are outdated: they are never returned, but get_or_compute can hand
+    them to a `refresh` function instead of computing the result again.
+    With `shared` (a sharedcache.SharedCache), misses are looked up there and
+    computed results stored there too, for the other processes.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=128 * 2**20, ttls=None, default_ttl=DEFAULT_TTL, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = QUERY_CLASS_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        # key -> (result, size, expires_at, version)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.refreshes = 0
+
+    def get(self, key, version):
+        """Returns (True, result) on a hit, (False, None) on a miss."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None or entry[3] != version:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def pop_outdated(self, key, version):
+        """Removes and returns the result of an entry of an older data version, None if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] == version:
+                return None
+            self._remove(key)
+            return entry[0]
+
+    def put(self, key, result, version, ttl=None):
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, expires_at, version)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, template_id, values, compute, version, *extra, refresh=None):
+        """Returns the cached result of a template, computing and storing it on a miss.
+
+        With `refresh`, a result of an older data version is brought up to date
+        with refresh(outdated result) instead, unless that returns None.
+        `None` results (failed queries) aren't cached.
+        """
+        key = (template_id, freeze(values), *extra)
+        ttl = self.ttls.get(query_class(template_id), self.default_ttl)
+        hit, result = self.get(key, version)
+        if hit:
+            return result
+        outdated = self.pop_outdated(key, version)
+        if self.shared is not None:
+            stored = self.shared.get(key, version)
+            if stored is not None:
+                current, stored_result = stored
+                if current:
+                    self.put(key, stored_result, version, ttl)
+                    return stored_result
+                if outdated is None:
+                    outdated = stored_result
+        result = None
+        if outdated is not None and refresh is not None:
+            result = refresh(outdated)
+            if result is not None:
+                self.refreshes += 1
+        if result is None:
+            result = compute()
+        if result is not None:
+            self.put(key, result, version, ttl)
+            if self.shared is not None:
+                self.shared.put(key, result, version, ttl)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "refreshes": self.refreshes,
+                "shared": None if self.shared is None else self.shared.stats(),
+            }
+
+    def _check_version(self, version):
+        # Outdated entries stay until refreshed or evicted, they are the least
+        # recently used ones
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._version = version
+
+    def _remove(self, key):
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
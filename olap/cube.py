@@ -0,0 +1,329 @@
+import threading
+import time
+
+import numpy as np
+
+from queries import ATTRIBUTE_ROLLUPS, DICE_DIMENSIONS, SLICE_DIMENSIONS, TEMPLATES
+
+# In-memory columnar copy of the `sales` fact table, used to answer the Visão
+# Analítica operations without going back to Postgres. Dimension ids are
+# replaced by dense codes into per-dimension id arrays, and the templates'
+# GROUP BYs are evaluated over those codes. Amounts are kept as integer cents,
+# so sums are exact, and results have the same rows and order as their
+# templates': periods in calendar order, dimensions as ids for the engine to
+# label like the database's rows.
+
+# Dimensions with at most this many values get a precomputed row bitmap per
+# value, the others an inverted index from value to rows
+BITMAP_MAX_VALUES = 64
+
+FETCH_SIZE = 100_000
+
+# Bytes per fact row: five codes and the amount in cents
+ROW_BYTES = 2 + 2 + 4 + 4 + 4 + 8
+
+
+class CubeTooLarge(Exception):
+    pass
+
+
+class Dimension:
+    def __init__(self, ids):
+        self.ids = np.sort(np.asarray(ids, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, ids):
+        return np.searchsorted(self.ids, ids)
+
+    def codes_of(self, ids):
+        return np.flatnonzero(np.isin(self.ids, np.asarray(ids, dtype=np.int64)))
+
+
+class Calendar:
+    """The date dimension in calendar order, with the coarser periods of each day."""
+
+    def __init__(self, ids, years, months, days):
+        ids, years, months, days = (np.asarray(a, dtype=np.int64) for a in (ids, years, months, days))
+        order = np.lexsort((days, months, years))
+        self.ids = ids[order]
+        self.years = years[order]
+        self.months = months[order]
+        self.days = days[order]
+        self._by_id = np.argsort(self.ids)
+        self._sorted_ids = self.ids[self._by_id]
+
+        day_labels = [f"{d:02d}/{m:02d}/{y}" for y, m, d in zip(self.years, self.months, self.days)]
+        self.periods = {"day": (np.arange(len(self.ids)), day_labels)}
+        for grain, keys, label in (
+            ("month", self.years * 100 + self.months, lambda k: f"{k % 100:02d}/{k // 100}"),
+            ("quarter", self.years * 10 + (self.months + 2) // 3, lambda k: f"{k // 10}-Q{k % 10}"),
+            ("year", self.years, lambda k: str(k)),
+        ):
+            unique, codes = np.unique(keys, return_inverse=True)
+            self.periods[grain] = (codes, [label(int(k)) for k in unique])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, ids):
+        return self._by_id[np.searchsorted(self._sorted_ids, ids)]
+
+    def mask(self, ids):
+        return np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+
+
+class Cube:
+    def __init__(self, dims, calendar, codes, amount_cents):
+        self.dims = dims
+        self.calendar = calendar
+        self.codes = codes
+        self.amount_cents = amount_cents
+        self.rows = len(amount_cents)
+
+        # Row filters: bitmaps for small dimensions, inverted
+        # indexes (rows sorted by code + offsets) for the large ones
+        self._bitmaps = {}
+        self._postings = {}
+        for name, dim in dims.items():
+            if len(dim) <= BITMAP_MAX_VALUES:
+                self._bitmaps[name] = np.stack([
+                    np.packbits(codes[name] == code) for code in range(len(dim))
+                ]) if len(dim) else np.zeros((0, 0), dtype=np.uint8)
+            else:
+                order = np.argsort(codes[name], kind="stable").astype(np.int32)
+                offsets = np.searchsorted(codes[name][order], np.arange(len(dim) + 1))
+                self._postings[name] = (order, offsets)
+        self._handlers = self._build_handlers()
+
+    @property
+    def nbytes(self):
+        arrays = [self.amount_cents, *self.codes.values()]
+        arrays += list(self._bitmaps.values())
+        arrays += [a for pair in self._postings.values() for a in pair]
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def estimate_bytes(cls, rows, small_dimension_values, large_dimensions):
+        return rows * ROW_BYTES + rows * small_dimension_values // 8 + rows * 4 * large_dimensions
+
+    @classmethod
+    def load(cls, conn, memory_budget=None):
+        # Count, dimensions and facts from the same snapshot
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute("SELECT COUNT(*) FROM sales")
+            rows = cur.fetchone()[0]
+
+            ids = {}
+            for name, table in (
+                ("store", "d_stores"), ("document_type", "d_document_types"),
+                ("product", "d_products"), ("customer", "d_customers"),
+            ):
+                cur.execute(f"SELECT id FROM {table}")
+                ids[name] = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT id, year, month, day FROM d_dates")
+            dates = cur.fetchall()
+
+        small_values = sum(len(d) for d in ids.values() if len(d) <= BITMAP_MAX_VALUES)
+        large = sum(1 for d in ids.values() if len(d) > BITMAP_MAX_VALUES)
+        estimate = cls.estimate_bytes(rows, small_values, large)
+        if memory_budget is not None and estimate > memory_budget:
+            conn.rollback()
+            raise CubeTooLarge(
+                f"The sales cube needs about {estimate / 2**20:.0f} MiB, over the {memory_budget / 2**20:.0f} MiB budget"
+            )
+
+        dims = {name: Dimension(dim_ids) for name, dim_ids in ids.items()}
+        calendar = Calendar(*([list(c) for c in zip(*dates)] if dates else [[] for _ in range(4)]))
+
+        codes = {
+            "store": np.empty(rows, dtype=np.int16),
+            "document_type": np.empty(rows, dtype=np.int16),
+            "product": np.empty(rows, dtype=np.int32),
+            "customer": np.empty(rows, dtype=np.int32),
+            "date": np.empty(rows, dtype=np.int32),
+        }
+        amount_cents = np.empty(rows, dtype=np.int64)
+
+        with conn.cursor(name="olap_cube_load") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute("""
+                SELECT store_id, document_type_id, product_id, customer_id, date_id,
+                       ROUND(total_amount * 100)::bigint
+                FROM sales
+            """)
+            start = 0
+            while True:
+                chunk = cur.fetchmany(FETCH_SIZE)
+                if not chunk:
+                    break
+                end = start + len(chunk)
+                store_id, document_type_id, product_id, customer_id, date_id, cents = zip(*chunk)
+                codes["store"][start:end] = dims["store"].encode(store_id)
+                codes["document_type"][start:end] = dims["document_type"].encode(document_type_id)
+                codes["product"][start:end] = dims["product"].encode(product_id)
+                codes["customer"][start:end] = dims["customer"].encode(customer_id)
+                codes["date"][start:end] = calendar.encode(date_id)
+                amount_cents[start:end] = cents
+                start = end
+        conn.rollback()
+
+        return cls(dims, calendar, codes, amount_cents)
+
+    # Filters
+
+    def _unpack(self, bitmap):
+        return np.unpackbits(bitmap, count=self.rows).view(bool)
+
+    def rows_with_ids(self, dim, ids):
+        codes = self.dims[dim].codes_of(ids)
+        mask = np.zeros(self.rows, dtype=bool)
+        if dim in self._bitmaps:
+            for code in codes:
+                mask |= self._unpack(self._bitmaps[dim][code])
+        else:
+            order, offsets = self._postings[dim]
+            for code in codes:
+                mask[order[offsets[code]:offsets[code + 1]]] = True
+        return mask
+
+    def rows_in_dates(self, date_ids):
+        return self.calendar.mask(date_ids)[self.codes["date"]]
+
+    def rows_filtered(self, params):
+        # Rows in the template's dates and in the ids of its filtered dimensions
+        mask = self.rows_in_dates(params["date_ids"])
+        for name, ids in params.items():
+            if name.endswith("_ids") and name != "date_ids":
+                mask &= self.rows_with_ids(name.removesuffix("_ids"), ids)
+        return mask
+
+    # Grouping
+
+    def _group_key(self, key, mask):
+        # Per selected row group code, and the key of each group code: the
+        # label of a period, or a dimension's id
+        if key in self.calendar.periods:
+            codes, labels = self.calendar.periods[key]
+            return codes[self.codes["date"][mask]], labels
+        return self.codes[key][mask], self.dims[key].ids.tolist()
+
+    def group(self, keys, mask):
+        """Sums the amounts of the rows in `mask`, grouped by `keys`.
+
+        Returns the key tuples and totals of the non-empty groups, ordered
+        by the group codes (calendar order for periods, id order otherwise).
+        Totals are added up in cents, exactly, and converted back at the end.
+        """
+        size = 1
+        combined = np.zeros(int(mask.sum()), dtype=np.int64)
+        all_keys = []
+        for key in keys:
+            codes, key_values = self._group_key(key, mask)
+            combined = combined * len(key_values) + codes
+            size *= len(key_values)
+            all_keys.append(key_values)
+
+        counts = np.bincount(combined, minlength=size)
+        sums = np.zeros(size, dtype=np.int64)
+        np.add.at(sums, combined, self.amount_cents[mask])
+        groups = np.flatnonzero(counts)
+
+        result = []
+        for group in groups:
+            values = []
+            rest = int(group)
+            for key_values in reversed(all_keys):
+                rest, code = divmod(rest, len(key_values))
+                values.append(key_values[code])
+            result.append((tuple(reversed(values)), int(sums[group]) / 100))
+        return result
+
+    # Templates
+
+    def supports(self, template_id):
+        return template_id in self._handlers
+
+    def execute(self, template_id, values):
+        params = TEMPLATES[template_id].unbind(values)
+        return self._handlers[template_id](params)
+
+    def _build_handlers(self):
+        handlers = {}
+        for dim in SLICE_DIMENSIONS:
+            handlers[f"slice_{dim}"] = lambda p: self._monthly(self.rows_filtered(p))
+        for dim1 in DICE_DIMENSIONS:
+            for dim2 in DICE_DIMENSIONS:
+                if dim1 != dim2:
+                    handlers[f"dice_{dim1}_{dim2}"] = lambda p: self._monthly(self.rows_filtered(p))
+        for grain in ("day", "month", "quarter", "year"):
+            handlers[f"drill_{grain}"] = lambda p, grain=grain: self._periods(p, grain, numeric_year=True)
+        for grain in ("day", "month", "year"):
+            handlers[f"rollup_{grain}"] = lambda p, grain=grain: self._periods(p, grain)
+        for template_id, (dim, _, _) in ATTRIBUTE_ROLLUPS.items():
+            handlers[template_id] = lambda p, dim=dim: self._members(p, dim)
+        return handlers
+
+    def _monthly(self, mask):
+        return [(keys[0], total) for keys, total in self.group(["month"], mask)]
+
+    def _periods(self, params, grain, numeric_year=False):
+        result = [(keys[0], total) for keys, total in self.group([grain], self.rows_in_dates(params["date_ids"]))]
+        if grain == "year" and numeric_year:
+            result = [(int(label), total) for label, total in result]
+        return result
+
+    def _members(self, params, dim):
+        # Sales per dimension id, rolled up by attribute by the engine as the template's rows are
+        return [(keys[0], total) for keys, total in self.group([dim], self.rows_in_dates(params["date_ids"]))]
+
+
+class CubeEngine:
+    """Keeps a Cube in sync with the data mart.
+
+    The fact table's signature is re-checked at most every `refresh_interval`
+    seconds and the cube is reloaded when it changes, `reload()` forces it.
+    """
+
+    def __init__(self, pool, memory_budget=None, refresh_interval=60.0):
+        self.pool = pool
+        self.memory_budget = memory_budget
+        self.refresh_interval = refresh_interval
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._cube = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _current_signature(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT (SELECT MIN(id) FROM sales), (SELECT MAX(id) FROM sales),
+                       (SELECT MAX(id) FROM d_products), (SELECT MAX(id) FROM d_customers),
+                       (SELECT MAX(id) FROM d_dates)
+            """)
+            return cur.fetchone()
+
+    def cube(self):
+        with self._lock:
+            if self._cube is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._cube
+            with self.pool.connection() as conn:
+                signature = self._current_signature(conn)
+                if self._cube is None or signature != self._signature:
+                    start = time.monotonic()
+                    self._cube = None
+                    self._cube = Cube.load(conn, self.memory_budget)
+                    self._signature = signature
+                    self.load_seconds = time.monotonic() - start
+            self._checked_at = time.monotonic()
+            return self._cube
+
+    def reload(self):
+        with self._lock:
+            self._cube = None
+            self._signature = None
+        return self.cube()
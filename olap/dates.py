@@ -0,0 +1,119 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+
+
+class DateSelection:
+    def __init__(self, ids):
+        # Sorted, so equal selections give equal cache keys
+        self.ids = tuple(sorted(ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+
+def _period_key(level, year, month, day):
+    if level == "year":
+        return year
+    if level == "quarter":
+        return year * 10 + (month + 2) // 3
+    if level == "month":
+        return year * 100 + month
+    return year * 10000 + month * 100 + day
+
+
+class DateIndex:
+    """The d_dates dimension sorted by calendar day.
+
+    Date ids are assigned by the ETL in load order, which isn't guaranteed to
+    follow the calendar, so ranges are resolved on the calendar ordinal and
+    mapped back to the exact set of ids.
+    """
+
+    def __init__(self, rows):
+        self._month_of = {}
+        self._day_of = {}
+        self._month_sizes = Counter()
+        for date_id, year, month, day in rows:
+            self._month_of[date_id] = (year, month)
+            self._day_of[date_id] = (year, month, day)
+            self._month_sizes[(year, month)] += 1
+
+        rows = sorted((date(year, month, day).toordinal(), date_id) for date_id, year, month, day in rows)
+        self._ordinals = array("i", (ordinal for ordinal, _ in rows))
+        self._ids = array("i", (date_id for _, date_id in rows))
+
+    @classmethod
+    def load(cls, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, year, month, day FROM d_dates")
+            return cls(cur.fetchall())
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def first(self):
+        return date.fromordinal(self._ordinals[0]) if self._ordinals else None
+
+    @property
+    def last(self):
+        return date.fromordinal(self._ordinals[-1]) if self._ordinals else None
+
+    def resolve(self, start=None, end=None):
+        lo = bisect_left(self._ordinals, start.toordinal()) if start else 0
+        hi = bisect_right(self._ordinals, end.toordinal()) if end else len(self._ordinals)
+        return DateSelection(self._ids[lo:hi])
+
+    def restrict(self, selection, level, keys):
+        """The dates of `selection` in the periods `keys` of a date level.
+
+        Keys are the integer keys of semantic.DIMENSIONS, e.g. 202403 for
+        March 2024.
+        """
+        keys = {int(key) for key in keys}
+        return DateSelection(
+            date_id for date_id in selection.ids if _period_key(level, *self._day_of[date_id]) in keys
+        )
+
+    def covers_whole_months(self, ids):
+        # Whether `ids` is a union of complete months of the dimension
+        counts = Counter(self._month_of.get(date_id) for date_id in ids)
+        return all(self._month_sizes[month] == count for month, count in counts.items())
+
+
+class DateDimension:
+    """Keeps a DateIndex in sync with the data mart.
+
+    The dimension's signature (row count and highest id) is re-checked at most
+    every `refresh_interval` seconds, and the index is rebuilt when it changes.
+    """
+
+    def __init__(self, pool, refresh_interval=60.0):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def index(self):
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._index
+
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COUNT(*), MAX(id) FROM d_dates")
+                    signature = cur.fetchone()
+                if self._index is None or signature != self._signature:
+                    self._index = DateIndex.load(conn)
+                    self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
@@ -0,0 +1,217 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+class PoolClosed(psycopg2.InterfaceError):
+    pass
+
+
+def connection_kwargs(database_url):
+    # The URI carries Prisma's `?schema=public`, which libpq doesn't accept,
+    # so it can't be handed to psycopg2 as a DSN directly.
+    url = urlparse(database_url)
+    return {
+        "host": url.hostname,
+        "port": url.port,
+        "database": url.path[1:],
+        "user": url.username,
+        "password": url.password,
+    }
+
+
+def connect(database_url, **kwargs):
+    return psycopg2.connect(**connection_kwargs(database_url), **kwargs)
+
+
+class PooledConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Names of the statements already prepared on this connection
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of connections to the data mart.
+
+    Connections idle for longer than `health_check_after` seconds are probed
+    with `SELECT 1` on checkout, so connections killed by a server restart are
+    replaced transparently instead of failing the next query.
+    """
+
+    def __init__(self, database_url, minconn=1, maxconn=10, timeout=30.0, health_check_after=5.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._kwargs = connection_kwargs(database_url)
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = set()
+        # Open connections plus the ones currently being opened
+        self._size = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+        for _ in range(minconn):
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                # The database may not be up yet, connections are opened on demand
+                break
+            with self._cond:
+                self._size += 1
+                self._idle.append(conn)
+
+    def _open(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self._kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            with self._cond:
+                conn = None
+                while True:
+                    if self._closed:
+                        raise PoolClosed("Connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout:.1f}s waiting for a database connection "
+                            f"({self.maxconn} in use)"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is not None and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                conn = None
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except psycopg2.Error:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            with self._cond:
+                if self._closed:
+                    self._size -= 1
+                    self._close_quietly(conn)
+                    continue
+                waited = time.monotonic() - start
+                self._in_use.add(conn)
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._discarded += 1
+                self._close_quietly(conn)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min": self.minconn,
+                "max": self.maxconn,
+                "checkouts": self._checkouts,
+                "wait_total_s": self._wait_total,
+                "wait_avg_s": self._wait_total / self._checkouts if self._checkouts else 0.0,
+                "wait_max_s": self._wait_max,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+from queries import ATTRIBUTE_ROLLUPS, LABELS
+from semantic import DIMENSIONS
+
+# Attributes of the dimension tables, kept in memory so aggregate queries can
+# group the facts by id and get their labels here instead of joining every
+# fact row to its dimension. Stores and document types are loaded whole; the
+# products and customers a result needs are fetched by id and kept in an LRU.
+
+DIMENSION_TABLES = {name: (dim.table, dim.attributes) for name, dim in DIMENSIONS.items() if dim.table is not None}
+SMALL_DIMENSIONS = ("store", "document_type")
+
+
+class DimensionCache:
+    """Attributes by id of each dimension in DIMENSION_TABLES.
+
+    Everything is reloaded when `version()` changes, so an ETL load never
+    leaves stale names behind.
+    """
+
+    def __init__(self, pool, version, max_lazy_rows=200_000):
+        self.pool = pool
+        self.version = version
+        self.max_lazy_rows = max_lazy_rows
+        self._lock = threading.Lock()
+        self._version = None
+        self._rows = {}
+
+    def _sync(self, conn):
+        version = self.version()
+        if version == self._version:
+            return
+        self._rows = {dim: OrderedDict() for dim in DIMENSION_TABLES}
+        with conn.cursor() as cur:
+            for dim in SMALL_DIMENSIONS:
+                table, attrs = DIMENSION_TABLES[dim]
+                cur.execute(f"SELECT id, {', '.join(attrs)} FROM {table}")
+                self._rows[dim].update((row[0], row[1:]) for row in cur.fetchall())
+        self._version = version
+
+    def _fetch(self, conn, dim, ids):
+        # Rows of `ids` by id. They are picked before the LRU is trimmed, so a
+        # result with more ids than max_lazy_rows doesn't evict its own labels.
+        table, attrs = DIMENSION_TABLES[dim]
+        rows = self._rows[dim]
+        missing = [i for i in ids if i not in rows]
+        if missing:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT id, {', '.join(attrs)} FROM {table} WHERE id = ANY(%s)", (missing,))
+                rows.update((row[0], row[1:]) for row in cur.fetchall())
+        found = {i: rows[i] for i in ids if i in rows}
+        if dim not in SMALL_DIMENSIONS:
+            for i in found:
+                rows.move_to_end(i)
+            while len(rows) > self.max_lazy_rows:
+                rows.popitem(last=False)
+        return found
+
+    def attributes(self, dim, ids, attrs=None):
+        """`attrs` of the dimension rows `ids`, in order, Nones for unknown ids."""
+        _, names = DIMENSION_TABLES[dim]
+        positions = [names.index(attr) for attr in (attrs or names)]
+        ids = list(ids)
+        with self._lock:
+            with self.pool.connection() as conn:
+                self._sync(conn)
+                rows = self._fetch(conn, dim, {i for i in ids if i is not None})
+        return [
+            tuple(None if i not in rows else rows[i][p] for p in positions)
+            for i in ids
+        ]
+
+    def label(self, template_id, rows):
+        """Rows of `template_id` with dimension ids replaced by their labels.
+
+        Templates in ATTRIBUTE_ROLLUPS are also rolled up by the attribute here.
+        Other templates' rows are returned as they are.
+        """
+        if template_id in LABELS:
+            dim, attrs = LABELS[template_id]
+            labels = self.attributes(dim, (row[0] for row in rows), attrs)
+            return [(*label, *row[1:]) for label, row in zip(labels, rows)]
+        if template_id in ATTRIBUTE_ROLLUPS:
+            dim, attr, missing = ATTRIBUTE_ROLLUPS[template_id]
+            labels = self.attributes(dim, (row[0] for row in rows), (attr,))
+            # Total and number of distinct dimension members per attribute value
+            totals = {}
+            for (label,), (_, total) in zip(labels, rows):
+                label = missing if label is None else label
+                amount, members = totals.get(label, (0, 0))
+                totals[label] = (amount + total, members + 1)
+            return sorted(((label, amount, members) for label, (amount, members) in totals.items()), key=lambda r: -r[1])
+        return rows
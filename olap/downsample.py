@@ -0,0 +1,75 @@
+import numpy as np
+
+# Long series are charted from a subset of their points sized to the chart
+# width: the browser can't show more than about one point per pixel, and every
+# extra point makes the figure bigger to send and slower to draw. Lines keep
+# their shape with Largest-Triangle-Three-Buckets; bars keep the lowest and
+# highest value of each bucket so peaks and dips don't disappear.
+
+# Approximate widths in pixels of a chart across the page and of one in a
+# two-column row
+FULL_WIDTH = 1200
+HALF_WIDTH = 600
+POINTS_PER_PIXEL = 1
+# Line charts with more points than this are drawn with WebGL instead of SVG
+WEBGL_POINTS = 500
+
+
+def target_points(width):
+    return max(3, int(width * POINTS_PER_PIXEL))
+
+
+def lttb(x, y, n):
+    """Positions of the `n` points of (x, y) picked by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; the points between them are split in
+    n - 2 buckets, and from each the point forming the largest triangle with
+    the previously picked point and the average of the next bucket is picked.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    n = max(n, 3)
+    # Bucket edges, with the last point as the bucket after the last one
+    edges = np.append(np.linspace(1, size - 1, n - 1).astype(np.int64), size)
+    picked = np.empty(n, dtype=np.int64)
+    picked[0], picked[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end:edges[i + 2]].mean()
+        next_y = y[end:edges[i + 2]].mean()
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(areas.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def minmax(y, n):
+    """Positions of the lowest and highest point of each of n // 2 buckets, in order."""
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    edges = np.linspace(0, size, max(n // 2, 1) + 1).astype(np.int64)
+    picked = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        segment = y[start:end]
+        picked.extend(sorted({start + int(segment.argmin()), start + int(segment.argmax())}))
+    return np.array(picked, dtype=np.int64)
+
+
+def downsample(frame, column, max_points, method="lttb"):
+    """Rows of `frame` that keep the shape of `column` in at most `max_points` points.
+
+    Rows are taken as evenly spaced, like the periods of a series.
+    """
+    if len(frame) <= max_points:
+        return frame
+    y = frame[column].to_numpy(dtype=np.float64)
+    if method == "lttb":
+        rows = lttb(np.arange(len(y), dtype=np.float64), y, max_points)
+    elif method == "minmax":
+        rows = minmax(y, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return frame.iloc[rows]
@@ -0,0 +1,854 @@
+import argparse
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from psycopg2 import Error
+from psycopg2.extensions import QueryCanceledError
+
+from aggregates import FACT_TABLE, Navigator
+from cache import DataVersion, ResultCache
+from cube import CubeEngine, CubeTooLarge
+from db import ConnectionPool
+from dates import DateDimension
+from dimensions import DimensionCache
+from exports import export, export_frame
+from hierarchy import LEVELS, DateHierarchy
+from incremental import Watermarked, delta_sql, fact_bounds, fold_of, fold_rows
+from leaderboard import Leaderboards
+from profiler import Profiler, explain, log_to, result_stats
+from queries import CROSSTAB_COLUMNS, PERIOD_DIMENSIONS, TEMPLATES, compiled, execute
+from sampling import DEFAULT_RATE, Sampler, estimate_sql
+from search import SEARCH_DIMENSIONS, DimensionSearch
+from semantic import DIMENSIONS, MEASURES, Query, base_level, key_label
+from sharedcache import SharedCache
+from streaming import FrameResult, fetch_frame
+
+# The dashboard's views without Streamlit: every page under views/ asks the
+# engine for a view, and the same requests can be run from the command line
+# or a scheduled job to produce report snapshots.
+
+
+@dataclass(frozen=True)
+class ViewRequest:
+    view: str
+    # Inclusive date range, the whole date dimension when not given
+    start: date = None
+    end: date = None
+    # Dimension keys (see semantic.DIMENSIONS): the slice/dice dimensions, the
+    # pivot's rows and columns, or the group-by dimensions of an aggregate
+    dims: tuple = ()
+    # Slice and dice values, one per dimension
+    values: tuple = ()
+    # Measures of an aggregate (see semantic.MEASURES), total sales by default
+    measures: tuple = ()
+    # (dimension, values) pairs filtering any view by any level of a hierarchy,
+    # e.g. ("city", ("Viseu",)) or ("month", (202403,))
+    filters: tuple = ()
+    # Time granularity, or the roll-up hierarchy
+    grain: str = None
+    top_n: int = None
+
+    @property
+    def slug(self):
+        parts = [
+            self.view, *self.dims, *map(str, self.values), *self.measures,
+            *(f"{dim}-{'-'.join(map(str, values))}" for dim, values in self.filters),
+            self.grain, self.top_n and f"top{self.top_n}",
+        ]
+        return re.sub(r"[^\w.-]+", "-", "_".join(str(part) for part in parts if part)).strip("-").lower()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        for key in ("start", "end"):
+            if isinstance(data.get(key), str):
+                data[key] = date.fromisoformat(data[key])
+        for key in ("dims", "values", "measures"):
+            if key in data:
+                data[key] = tuple(data[key])
+        if "filters" in data:
+            data["filters"] = tuple((dim, tuple(values)) for dim, values in data["filters"])
+        return cls(**data)
+
+    def to_dict(self):
+        data = asdict(self)
+        for key in ("start", "end"):
+            if data[key] is not None:
+                data[key] = data[key].isoformat()
+        data["dims"] = list(self.dims)
+        data["values"] = list(self.values)
+        data["measures"] = list(self.measures)
+        data["filters"] = [[dim, list(values)] for dim, values in self.filters]
+        return data
+
+    @property
+    def filter_values(self):
+        # The slice and dice values as filters, then `filters`
+        return (*((dim, (value,)) for dim, value in zip(self.dims, self.values)), *self.filters)
+
+
+@dataclass(frozen=True)
+class View:
+    # Template id and column names for a request
+    template: object
+    columns: object
+    # Large results, fetched with a server-side cursor up to the row/byte limits
+    streamed: bool = False
+
+    def template_id(self, request):
+        return self.template(request) if callable(self.template) else self.template
+
+    def column_names(self, request):
+        return self.columns(request) if callable(self.columns) else self.columns
+
+
+def aggregate_query(request):
+    # Date levels are grouped by their integer keys, labeled by the engine
+    return Query(
+        request.dims, request.measures or ("total_sales",), tuple(dim for dim, _ in request.filters),
+        order="total" if request.top_n else "dims", top_n=bool(request.top_n),
+    )
+
+
+def aggregate_columns(request):
+    query = aggregate_query(request)
+    return [*(DIMENSIONS[dim].label for dim in query.dims), *(MEASURES[name].label for name in query.measures)]
+
+
+ROLLUP_COLUMNS = {
+    "material": ["Material", "Total Vendas", "Número de Produtos"],
+    "location": ["Localização", "Total Vendas", "Número de Lojas"],
+}
+
+VIEWS = {
+    "store": View("sales_by_store", ["Loja", "Localização", "Total Vendas", "Número de Transações"]),
+    "document_type": View("sales_by_document_type", ["Tipo de Documento", "Total Vendas", "Número de Transações"]),
+    "products": View(
+        "top_products", ["Produto", "SKU", "Material", "Total Vendas", "Quantidade Vendida", "Preço Médio"]
+    ),
+    "customers": View("top_customers", ["Cliente", "Email", "Total Compras", "Número Transações", "Valor Médio"]),
+    "dates": View(
+        lambda r: f"sales_by_{r.grain}", ["Período", "Total Vendas", "Número Transações", "Valor Médio"], streamed=True
+    ),
+    "slice": View(lambda r: f"slice_{r.dims[0]}", ["Período", "Total Vendas"]),
+    "dice": View(lambda r: f"dice_{r.dims[0]}_{r.dims[1]}", ["Período", "Total Vendas"]),
+    "drill": View(lambda r: f"drill_{r.grain}", ["Período", "Total Vendas"]),
+    "rollup": View(
+        lambda r: f"rollup_{r.grain}", lambda r: ROLLUP_COLUMNS.get(r.grain, ["Período", "Total Vendas"])
+    ),
+    "pivot": View(lambda r: f"pivot_{r.dims[0]}_{r.dims[1]}", ["Linha", "Coluna", "Total Vendas"], streamed=True),
+    # Any dimensions, measures and filters of the semantic layer
+    "aggregate": View(lambda r: compiled(aggregate_query(r)), aggregate_columns),
+    # Fact rows behind the other views, for exports
+    "facts": View(
+        lambda r: "_".join(["facts", *r.dims]),
+        [
+            "Data", "Loja", "Localização", "SKU", "Produto", "Cliente", "Tipo de Documento",
+            "Número Documento", "Quantidade", "Preço Unitário", "Total",
+        ],
+    ),
+}
+
+# Views whose dimensions are filtered by one value each
+FILTERED_VIEWS = {"slice", "dice", "facts"}
+# Views the in-memory cube can answer
+CUBE_VIEWS = {"slice", "dice", "drill", "rollup"}
+# Views over the date hierarchy, answered from one cached ROLLUP per date range
+HIERARCHY_VIEWS = {"drill", "rollup"}
+# Dashboard views that can be estimated from the sales sample in preview mode.
+# Top-N products and customers are exact and fast from the leaderboards.
+APPROXIMATE_VIEWS = {"store", "document_type", "dates"}
+# Column with the 95% confidence margin of an estimated view's total sales
+MARGIN_COLUMN = "Margem Total Vendas (95%)"
+# Views whose detail table is fetched one page at a time
+PAGED_VIEWS = HIERARCHY_VIEWS | {"slice"}
+PAGE_SIZE = 100
+# Columns and rows of a pivot page; the remaining columns are summed in OTHERS_COLUMN
+CROSSTAB_TOP_COLUMNS = 20
+CROSSTAB_PAGE_ROWS = 50
+OTHERS_COLUMN = "Outros"
+TOTAL_COLUMN = "Total"
+
+# Batch of the task running on the current worker thread
+_batch = contextvars.ContextVar("olap_batch", default=None)
+
+
+@dataclass
+class ViewResult:
+    request: ViewRequest
+    frame: pd.DataFrame
+    truncated: bool = False
+    seconds: float = 0.0
+    # Non-fatal problems, e.g. the cube not fitting in memory
+    warnings: list = field(default_factory=list)
+    # Sampling rate of an estimated result, None when exact
+    sample_rate: float = None
+
+
+@dataclass
+class Page:
+    frame: pd.DataFrame
+    # Period key of the page's last row, the next page starts after it
+    last_key: tuple = None
+    has_more: bool = False
+
+
+@dataclass
+class Crosstab:
+    # Rows labeled by the row dimension, one column per top column member,
+    # then OTHERS_COLUMN (when there are other members) and TOTAL_COLUMN
+    frame: pd.DataFrame
+    offset: int = 0
+    # Rows of the whole pivot
+    total_rows: int = 0
+
+    @property
+    def has_more(self):
+        return self.offset + len(self.frame) < self.total_rows
+
+
+class Batch:
+    """Independent queries of one page run, executed concurrently.
+
+    Each submitted call runs on a worker thread with its own pooled
+    connection, and the caller waits only for the futures it renders.
+    `cancel` drops the calls that haven't started and cancels the queries
+    still running on the server.
+    """
+
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._futures = []
+        self._connections = set()
+        self.cancelled = False
+
+    def submit(self, fn, *args, **kwargs):
+        # The worker gets a copy of the caller's context (e.g. the profiler's page)
+        context = contextvars.copy_context()
+        context.run(_batch.set, self)
+        future = self._executor.submit(context.run, fn, *args, **kwargs)
+        with self._lock:
+            self._futures.append(future)
+            if self.cancelled:
+                future.cancel()
+        return future
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise QueryCanceledError("The page's queries were cancelled")
+            self._connections.add(conn)
+
+    def detach(self, conn):
+        # Waits for a cancel in progress, so it can't reach the connection's next query
+        with self._lock:
+            self._connections.discard(conn)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            for future in self._futures:
+                future.cancel()
+            for conn in self._connections:
+                try:
+                    conn.cancel()
+                except Error:
+                    pass
+
+    def pending(self):
+        with self._lock:
+            return sum(not future.done() for future in self._futures)
+
+
+class Engine:
+    """Runs view requests against the data mart.
+
+    Queries are routed to the smallest aggregate that can answer them, cached
+    per data mart version and timed by the profiler.
+    """
+
+    def __init__(self, pool, cache=None, profiler=None, cube_memory_budget=None, leaderboard_memory_budget=None,
+                 version_interval=30.0, itersize=10_000, max_rows=None, max_bytes=None, workers=None,
+                 sample_rate=DEFAULT_RATE):
+        self.pool = pool
+        # More workers than connections would only wait on the pool
+        self.executor = ThreadPoolExecutor(max_workers=workers or pool.maxconn, thread_name_prefix="olap-query")
+        self.dates = DateDimension(pool)
+        self.navigator = Navigator(pool, date_index=self.dates.index)
+        self.data_version = DataVersion(pool, refresh_interval=version_interval)
+        self.cache = ResultCache() if cache is None else cache
+        self.profiler = Profiler() if profiler is None else profiler
+        self.cube_engine = CubeEngine(pool, memory_budget=cube_memory_budget)
+        self.dimensions = DimensionCache(pool, version=self.data_version.current)
+        self.sampler = Sampler(pool, fallback_rate=sample_rate)
+        self.leaderboards = Leaderboards(
+            pool, version=self.data_version.current, memory_budget=leaderboard_memory_budget
+        )
+        self.searches = {dim: DimensionSearch(pool, table) for dim, table in SEARCH_DIMENSIONS.items()}
+        self.itersize = itersize
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._explaining = threading.Lock()
+
+    @classmethod
+    def from_env(cls, database_url=None):
+        """Engine configured from the same environment variables as the app."""
+        database_url = database_url or os.getenv("DATA_MART_POSTGRES_URI")
+        if not database_url:
+            return None
+        log_path = os.getenv("OLAP_PROFILE_LOG")
+        if log_path:
+            log_to(log_path)
+        shared_path = os.getenv("OLAP_SHARED_CACHE_PATH")
+        shared = None
+        if shared_path:
+            shared = SharedCache(shared_path, max_bytes=int(os.getenv("OLAP_SHARED_CACHE_MB", "1024")) * 2**20)
+        return cls(
+            ConnectionPool(
+                database_url,
+                minconn=int(os.getenv("DATA_MART_POOL_MIN", "1")),
+                maxconn=int(os.getenv("DATA_MART_POOL_MAX", "10")),
+                timeout=float(os.getenv("DATA_MART_POOL_TIMEOUT", "30")),
+            ),
+            cache=ResultCache(
+                max_entries=int(os.getenv("OLAP_CACHE_MAX_ENTRIES", "256")),
+                max_bytes=int(os.getenv("OLAP_CACHE_MAX_MB", "128")) * 2**20,
+                shared=shared,
+            ),
+            profiler=Profiler(slow_threshold=float(os.getenv("OLAP_SLOW_QUERY_MS", "1000")) / 1000),
+            cube_memory_budget=int(os.getenv("OLAP_CUBE_MEMORY_MB", "512")) * 2**20,
+            leaderboard_memory_budget=int(os.getenv("OLAP_LEADERBOARD_MEMORY_MB", "256")) * 2**20,
+            version_interval=float(os.getenv("OLAP_CACHE_VERSION_INTERVAL", "30")),
+            itersize=int(os.getenv("OLAP_FETCH_ITERSIZE", "10000")),
+            max_rows=int(os.getenv("OLAP_MAX_RESULT_ROWS", "200000")),
+            max_bytes=int(os.getenv("OLAP_MAX_RESULT_MB", "100")) * 2**20,
+            sample_rate=float(os.getenv("OLAP_SAMPLE_RATE", str(DEFAULT_RATE))),
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+
+    def batch(self):
+        """A new Batch running on the engine's worker threads."""
+        return Batch(self.executor)
+
+    def date_ids(self, start=None, end=None):
+        return list(self.dates.index().resolve(start, end).ids)
+
+    def _run(self, template_id, values, fetch, kind="query", analyze=True, source=None):
+        # Runs fetch(conn, source, timing) on a pooled connection, reading from
+        # the smallest aggregate that can answer the query unless `source` is given
+        template = TEMPLATES[template_id]
+        if source is None:
+            source = self.navigator.route(template.sql, template.unbind(values).get("date_ids"))
+        timing = {}
+        batch = _batch.get()
+        with self.pool.connection() as conn:
+            start = time.perf_counter()
+            try:
+                if batch is not None:
+                    batch.attach(conn)
+                try:
+                    result = fetch(conn, source, timing)
+                finally:
+                    if batch is not None:
+                        batch.detach(conn)
+            except Exception as e:
+                self.profiler.record(kind, template_id, time.perf_counter() - start, source=source, error=str(e))
+                raise
+            seconds = time.perf_counter() - start
+            rows, size = result_stats(result)
+            fields = {
+                "source": source, "first_row": timing.get("first_row"), "rows": rows, "bytes": size, "cache": "miss",
+            }
+            self.profiler.record(kind, template_id, seconds, **fields)
+        if analyze and self.profiler.is_slow(seconds):
+            self._explain_later(template_id, values, source, seconds)
+        return result
+
+    def _explain_later(self, template_id, values, source, seconds):
+        # EXPLAIN ANALYZE runs the query again, so it's done on a worker after
+        # the result is returned, one at a time, and recorded as its own
+        # "explain" record for the diagnostics page
+        if not self._explaining.acquire(blocking=False):
+            return
+
+        def run():
+            start = time.perf_counter()
+            try:
+                with self.pool.connection() as conn:
+                    plan = explain(conn, template_id, values, source)
+                    conn.rollback()
+            except Exception as e:
+                plan = f"EXPLAIN failed: {e}"
+            finally:
+                self._explaining.release()
+            self.profiler.record(
+                "explain", template_id, time.perf_counter() - start, source=source, query_seconds=seconds, explain=plan
+            )
+
+        try:
+            self.executor.submit(contextvars.copy_context().run, run)
+        except RuntimeError:
+            # The engine is closing
+            self._explaining.release()
+
+    def _cached(self, template_id, values, compute, *extra, refresh=None):
+        # Shared by every caller until the data mart changes
+        version = self.data_version.current()
+        missed = False
+
+        def compute_missed():
+            nonlocal missed
+            missed = True
+            return compute()
+
+        def refresh_missed(stale):
+            nonlocal missed
+            missed = True
+            return refresh(stale)
+
+        start = time.perf_counter()
+        result = self.cache.get_or_compute(
+            TEMPLATES[template_id].cache_key, values, compute_missed, version, *extra,
+            refresh=refresh and refresh_missed,
+        )
+        if not missed:
+            rows, size = result_stats(result)
+            self.profiler.record("query", template_id, time.perf_counter() - start, rows=rows, bytes=size, cache="hit")
+        return result
+
+    def _folded(self, template_id, values, fetch, rows_of, build, *extra):
+        # Cached result of fetch(conn, source, timing). Results of the templates
+        # with a fold (see incremental.fold_of) keep the sales ids they cover,
+        # and once the data mart changes they are refreshed by folding in the
+        # newer sales: rows_of gives a result's rows (None if it can't be
+        # folded) and build makes a result from rows.
+        template = TEMPLATES[template_id]
+        fold = fold_of(template)
+        if fold is None:
+            return self._cached(template_id, values, lambda: self._run(template_id, values, fetch), *extra)
+
+        def fetch_watermarked(conn, source, timing):
+            low_id, high_id = fact_bounds(conn, source)
+            return Watermarked(fetch(conn, source, timing), low_id, high_id)
+
+        def fetch_refreshed(stale, conn, source, timing):
+            low_id, high_id = fact_bounds(conn)
+            if low_id is None or low_id != stale.low_id or high_id < stale.high_id:
+                # Truncated or reloaded
+                return None
+            if high_id == stale.high_id:
+                return Watermarked(stale.result, low_id, high_id)
+            with conn.cursor() as cur:
+                cur.execute(delta_sql(template.sql), {**template.unbind(values), "watermark": stale.high_id})
+                delta = cur.fetchall()
+            return Watermarked(build(fold_rows(fold, rows_of(stale.result), delta)), low_id, high_id)
+
+        def refresh(stale):
+            if stale.low_id is None or rows_of(stale.result) is None:
+                return None
+            return self._run(
+                template_id, values, lambda *args: fetch_refreshed(stale, *args),
+                kind="refresh", analyze=False, source=FACT_TABLE,
+            )
+
+        return self._cached(
+            template_id, values, lambda: self._run(template_id, values, fetch_watermarked), *extra, refresh=refresh
+        ).result
+
+    def query(self, template_id, values=()):
+        """Rows of a template, for already bound values."""
+        return self._folded(
+            template_id, values,
+            lambda conn, source, timing: execute(conn, template_id, values, source, timing),
+            lambda rows: rows, lambda rows: rows,
+        )
+
+    def query_frame(self, template_id, values, columns):
+        """A template's rows as a FrameResult, fetched in chunks up to the row/byte limits."""
+        columns = tuple(columns)
+
+        def rows_of(result):
+            # A truncated frame misses rows, it is fetched again instead
+            return None if result.truncated else list(result.frame.itertuples(index=False, name=None))
+
+        def build(rows):
+            frame = pd.DataFrame(rows, columns=list(columns))
+            return FrameResult(frame, False, len(frame), int(frame.memory_usage(deep=True).sum()))
+
+        return self._folded(
+            template_id, values,
+            lambda conn, source, timing: fetch_frame(
+                conn, template_id, values, list(columns), source,
+                itersize=self.itersize, max_rows=self.max_rows, max_bytes=self.max_bytes, timing=timing,
+            ),
+            rows_of, build, columns,
+        )
+
+    def estimate(self, template_id, values):
+        """Rows of a template estimated from the sales sample, and the sampling rate.
+
+        Each row ends with the 95% confidence margin of its total sales.
+        """
+        sample = self.sampler.sample()
+        sql = estimate_sql(TEMPLATES[template_id].sql, sample.source)
+        params = TEMPLATES[template_id].unbind(values)
+
+        def fetch(conn, source, timing):
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+
+        rows = self._cached(template_id, values, lambda: self._run(
+            template_id, values, fetch, kind="estimate", analyze=False, source=sample.source,
+        ), "estimate", sample)
+        return rows, sample.rate
+
+    def date_hierarchy(self, date_ids):
+        """DateHierarchy of the selected dates, every level from one query."""
+        values = TEMPLATES["date_hierarchy"].bind({"date_ids": date_ids})
+        return self._folded(
+            "date_hierarchy", values,
+            lambda conn, source, timing: DateHierarchy(execute(conn, "date_hierarchy", values, source, timing)),
+            DateHierarchy.to_rows, DateHierarchy,
+        )
+
+    def cube_query(self, template_id, values):
+        """Rows from the in-memory cube, None when it can't answer the template."""
+        cube = self.cube_engine.cube()
+        if not cube.supports(template_id):
+            return None
+        with self.profiler.span("cube", template_id) as fields:
+            results = cube.execute(template_id, values)
+            fields["rows"] = len(results)
+        return results
+
+    def resolve(self, request):
+        """Template id, bound values and column names of a request."""
+        if request.view not in VIEWS:
+            raise ValueError(f"Unknown view {request.view!r} (available: {', '.join(VIEWS)})")
+        view = VIEWS[request.view]
+        template_id = view.template_id(request)
+        if template_id not in TEMPLATES:
+            raise ValueError(f"View {request.view!r} has no query for {request.to_dict()}")
+        template = TEMPLATES[template_id]
+        types = dict(template.params)
+
+        if request.view in FILTERED_VIEWS and len(request.values) != len(request.dims):
+            raise ValueError(f"View {request.view!r} takes {len(request.dims)} values, got {len(request.values)}")
+
+        params = {}
+        if "top_n" in types:
+            params["top_n"] = request.top_n or 10
+        # Filters are bound as ids of the finest level of their hierarchy,
+        # and the date hierarchy's narrow down the selected dates
+        dates = self.dates.index()
+        selection = dates.resolve(request.start, request.end)
+        for dim, filter_values in request.filter_values:
+            base = base_level(dim)
+            if base == "day":
+                selection = dates.restrict(selection, dim, filter_values)
+                continue
+            name = f"{base}_ids"
+            if name not in types:
+                raise ValueError(f"View {request.view!r} can't be filtered by {dim!r}")
+            ids = self.dimension_ids(dim, filter_values)
+            params[name] = sorted(set(ids) & set(params[name])) if name in params else ids
+        if "date_ids" in types:
+            params["date_ids"] = list(selection.ids)
+        return template_id, template.bind(params), view.column_names(request)
+
+    def dimension_ids(self, dim, names):
+        """Ids of the finest level of `dim`'s hierarchy with these names, or attribute values."""
+        template = TEMPLATES[f"ids_{dim}"]
+        return [row[0] for row in self.query(template.id, template.bind({"names": [str(name) for name in names]}))]
+
+    def label_aggregate(self, dims, rows):
+        """Rows of an aggregate with dimension ids replaced by names and date keys by periods."""
+        columns = list(zip(*rows)) if rows else [() for _ in dims]
+        for i, dim in enumerate(dims):
+            if DIMENSIONS[dim].table is not None:
+                columns[i] = [name for name, in self.dimensions.attributes(dim, columns[i], ("name",))]
+            elif DIMENSIONS[dim].is_date:
+                columns[i] = [key_label(dim, key) for key in columns[i]]
+        return list(zip(*columns))
+
+    def leaderboard(self, template_id, values):
+        """Top-N rows of `template_id`, merged from the in-memory per-day partials.
+
+        None when the leaderboard is over its memory budget.
+        """
+        with self.profiler.span("leaderboard", template_id) as fields:
+            rows = self.leaderboards.query(template_id, TEMPLATES[template_id].unbind(values))
+            fields["rows"] = None if rows is None else len(rows)
+        return rows
+
+    def view(self, request, use_cube=False, approximate=False):
+        start = time.perf_counter()
+        template_id, values, columns = self.resolve(request)
+        result = ViewResult(request, None)
+
+        rows = None
+        if approximate and request.view in APPROXIMATE_VIEWS:
+            rows, result.sample_rate = self.estimate(template_id, values)
+            rows = self.dimensions.label(template_id, rows)
+            columns = [*columns, MARGIN_COLUMN]
+        if use_cube and request.view in CUBE_VIEWS:
+            try:
+                rows = self.cube_query(template_id, values)
+            except CubeTooLarge as e:
+                result.warnings.append(str(e))
+            if rows is not None:
+                rows = self.dimensions.label(template_id, rows)
+        if rows is None and request.view in HIERARCHY_VIEWS and request.grain in LEVELS:
+            rows = self.date_hierarchy(TEMPLATES[template_id].unbind(values)["date_ids"]).rows(
+                request.grain, numeric_year=request.view == "drill"
+            )
+        if rows is None and VIEWS[request.view].streamed:
+            fetched = self.query_frame(template_id, values, columns)
+            # The cached frame is shared, callers get their own copy
+            result.frame = fetched.frame.copy()
+            result.truncated = fetched.truncated
+        else:
+            if rows is None:
+                if template_id in self.leaderboards:
+                    rows = self.leaderboard(template_id, values)
+                if rows is None:
+                    rows = self.query(template_id, values)
+                # SQL and leaderboard results group by dimension ids
+                if request.view == "aggregate":
+                    rows = self.label_aggregate(aggregate_query(request).normalized().dims, rows)
+                else:
+                    rows = self.dimensions.label(template_id, rows)
+            with self.profiler.span("dataframe", ", ".join(columns), rows=len(rows)):
+                result.frame = pd.DataFrame(rows, columns=columns)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def page(self, request, after=None, size=PAGE_SIZE):
+        """The `size` periods of a view following the period key `after`.
+
+        Pages are read with keyset pagination, or from the cached date
+        hierarchy, so the cost of a page doesn't grow with its position.
+        """
+        template_id, values, columns = self.resolve(request)
+        params = TEMPLATES[template_id].unbind(values)
+        if request.view in HIERARCHY_VIEWS and request.grain in LEVELS:
+            hierarchy = self.date_hierarchy(params["date_ids"])
+            keyed = [
+                (key, hierarchy.label(request.grain, key, numeric_year=request.view == "drill"), total)
+                for key, total in hierarchy.periods_after(request.grain, after, size + 1)
+            ]
+        elif request.view == "slice":
+            after_year, after_month = after or (0, 0)
+            page_id = f"{template_id}_page"
+            page_values = TEMPLATES[page_id].bind(
+                {**params, "after_year": after_year, "after_month": after_month, "page_size": size + 1}
+            )
+            keyed = [((year, month), period, total) for year, month, period, total in self.query(page_id, page_values)]
+        else:
+            raise ValueError(f"View {request.view!r} isn't paginated")
+
+        page = Page(pd.DataFrame([row[1:] for row in keyed[:size]], columns=columns), has_more=len(keyed) > size)
+        if keyed:
+            page.last_key = keyed[:size][-1][0]
+        return page
+
+    def totals(self, request):
+        """Total sales and number of periods of a paginated view, without its rows."""
+        template_id, values, _ = self.resolve(request)
+        if request.view in HIERARCHY_VIEWS and request.grain in LEVELS:
+            hierarchy = self.date_hierarchy(TEMPLATES[template_id].unbind(values)["date_ids"])
+            return hierarchy.total or 0, len(hierarchy.periods(request.grain))
+        if request.view == "slice":
+            total, periods = self.query(f"{template_id}_total", values)[0]
+            return total or 0, periods
+        raise ValueError(f"View {request.view!r} isn't paginated")
+
+    def _crosstab_labels(self, dim, keys):
+        if dim in PERIOD_DIMENSIONS:
+            return [key_label(dim, key) for key in keys]
+        return [label for label, in self.dimensions.attributes(dim, keys, ("name",))]
+
+    def crosstab(self, request, offset=0, limit=CROSSTAB_PAGE_ROWS, top_columns=CROSSTAB_TOP_COLUMNS):
+        """A page of the pivot of `request.dims` (rows, columns), computed in the database.
+
+        Only the `top_columns` column members with the highest sales get their
+        own column, in period order for months and years; the rest are summed
+        together. Rows are ordered by total, or by period, and `limit` of them
+        are read from `offset`, so the page's size doesn't depend on the
+        dimensions'.
+        """
+        rows_dim, cols_dim = request.dims
+        template_id = f"crosstab_{rows_dim}_{cols_dim}"
+        if template_id not in TEMPLATES:
+            raise ValueError(f"View {request.view!r} has no crosstab for {request.to_dict()}")
+        date_ids = self.date_ids(request.start, request.end)
+
+        columns_id = f"pivot_columns_{cols_dim}"
+        col_keys = [row[0] for row in self.query(columns_id, TEMPLATES[columns_id].bind(
+            {"date_ids": date_ids, "top_n": min(top_columns, CROSSTAB_COLUMNS)}
+        ))]
+        if cols_dim in PERIOD_DIMENSIONS:
+            col_keys.sort()
+        rows = self.query(template_id, TEMPLATES[template_id].bind(
+            {"date_ids": date_ids, "col_keys": col_keys, "page_size": limit, "page_offset": offset}
+        ))
+
+        with self.profiler.span("dataframe", template_id, rows=len(rows)):
+            cells = [row[1:len(col_keys) + 1] for row in rows]
+            frame = pd.DataFrame(
+                cells, index=self._crosstab_labels(rows_dim, [row[0] for row in rows]),
+                columns=self._crosstab_labels(cols_dim, col_keys), dtype="float64",
+            )
+            others = [row[-3] for row in rows]
+            if any(value is not None for value in others):
+                frame[OTHERS_COLUMN] = pd.Series(others, index=frame.index, dtype="float64")
+            frame[TOTAL_COLUMN] = pd.Series([row[-2] for row in rows], index=frame.index, dtype="float64")
+            frame = frame.fillna(0.0)
+        return Crosstab(frame, offset, rows[0][-1] if rows else 0)
+
+    def export_crosstab(self, request, fmt, top_columns=CROSSTAB_TOP_COLUMNS):
+        """Spooled file with every row of the pivot of `request.dims` in `fmt`.
+
+        The file has the crosstab's wide shape, the same columns as the Pivot
+        tab's pages. It's written from the crosstab's frame, which holds one
+        row per row member and at most CROSSTAB_COLUMNS + 2 columns.
+        """
+        crosstab = self.crosstab(request, 0, None, top_columns)
+        frame = crosstab.frame.rename_axis(DIMENSIONS[request.dims[0]].label).reset_index()
+        with self.profiler.span("export", f"crosstab_{'_'.join(request.dims)}", rows=len(frame)):
+            return export_frame(frame, fmt)
+
+    def run_views(self, requests, workers=4, use_cube=False):
+        """Runs the requests in parallel. Failed requests give their exception instead of a result."""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batch = Batch(executor)
+            futures = [batch.submit(self.view, request, use_cube) for request in requests]
+            try:
+                return [future.exception() or future.result() for future in futures]
+            except BaseException:
+                # e.g. Ctrl+C, don't leave the remaining queries running on the server
+                batch.cancel()
+                raise
+
+    def export(self, request, fmt, columns=None):
+        """Spooled file with the request's rows in `fmt`, streamed from the data mart with COPY.
+
+        `columns` replaces the view's column names in the file.
+        """
+        template_id, values, view_columns = self.resolve(request)
+        if request.view == "aggregate":
+            raise ValueError("The aggregate view is labeled in memory and can't be exported with COPY")
+        # Views grouped by dimension ids are exported with their labels joined in
+        template_id = f"export_{template_id}" if f"export_{template_id}" in TEMPLATES else template_id
+        columns = view_columns if columns is None else columns
+        return self._run(
+            template_id, values,
+            lambda conn, source, timing: export(conn, template_id, values, fmt, columns, source),
+            kind="export", analyze=False,
+        )
+
+    def dimension_values(self, dim):
+        return [row[0] for row in self.query(f"values_{dim}")]
+
+    def search_values(self, dim, text="", limit=50):
+        """Names of a large dimension matching `text`, best first."""
+        with self.profiler.span("search", dim, text=text) as fields:
+            results = self.searches[dim].search(text, limit)
+            fields["rows"] = len(results)
+        return results
+
+
+def write_snapshots(results, output_dir, fmt="csv"):
+    """Writes each result and a manifest.json describing the run to `output_dir`."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    for i, result in enumerate(results, start=1):
+        if isinstance(result, Exception):
+            manifest.append({"error": str(result)})
+            continue
+        path = output_dir / f"{i:02d}_{result.request.slug}.{fmt}"
+        if fmt == "parquet":
+            result.frame.to_parquet(path, index=False)
+        else:
+            result.frame.to_csv(path, index=False)
+        manifest.append({
+            "request": result.request.to_dict(),
+            "file": path.name,
+            "rows": len(result.frame),
+            "truncated": result.truncated,
+            "seconds": round(result.seconds, 4),
+            "warnings": result.warnings,
+        })
+    (output_dir / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False, default=str))
+    return manifest
+
+
+def parse_request(text, start=None, end=None):
+    # A view name, or a JSON object with the ViewRequest fields
+    data = json.loads(text) if text.lstrip().startswith("{") else {"view": text}
+    data.setdefault("start", start)
+    data.setdefault("end", end)
+    return ViewRequest.from_dict(data)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Run dashboard views and save them as report snapshots.")
+    parser.add_argument(
+        "requests", nargs="*",
+        help=f"view names ({', '.join(VIEWS)}) or JSON requests, e.g. "
+             '\'{"view": "pivot", "dims": ["store", "month"]}\'',
+    )
+    parser.add_argument("--file", help="JSON file with a list of requests")
+    parser.add_argument("--start", help="default start date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="default end date (YYYY-MM-DD)")
+    parser.add_argument("--output-dir", default="snapshots", help="directory for the snapshots (default: snapshots)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=4, help="views run in parallel (default: 4)")
+    parser.add_argument("--cube", action="store_true", help="answer the analytic views from the in-memory cube")
+    args = parser.parse_args()
+
+    requests = [parse_request(text, args.start, args.end) for text in args.requests]
+    if args.file:
+        for data in json.loads(Path(args.file).read_text()):
+            data.setdefault("start", args.start)
+            data.setdefault("end", args.end)
+            requests.append(ViewRequest.from_dict(data))
+    if not requests:
+        parser.error("no views to run")
+
+    engine = Engine.from_env()
+    if engine is None:
+        parser.error("DATA_MART_POSTGRES_URI isn't set")
+    try:
+        results = engine.run_views(requests, workers=args.workers, use_cube=args.cube)
+        for entry in write_snapshots(results, args.output_dir, args.format):
+            if "error" in entry:
+                print(f"Failed: {entry['error']}")
+            else:
+                print(f"{entry['file']}: {entry['rows']} rows in {entry['seconds']:.2f}s")
+    finally:
+        engine.close()
+    return 1 if any(isinstance(result, Exception) for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+import csv
+import gzip
+import io
+import tempfile
+from dataclasses import dataclass
+
+from aggregates import FACT_TABLE
+from queries import TEMPLATES
+
+# File exports streamed straight from Postgres with COPY ... TO STDOUT. The
+# output is written to a spooled temporary file, kept in memory while small
+# and moved to disk past SPOOL_MAX_SIZE, so the number of exported rows never
+# has to fit in the app's memory.
+
+SPOOL_MAX_SIZE = 8 * 2**20
+# Rows per Parquet row group
+ROW_GROUP_SIZE = 100_000
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    label: str
+    extension: str
+    mime: str
+
+
+FORMATS = {
+    "csv": ExportFormat("CSV", "csv", "text/csv"),
+    "csv.gz": ExportFormat("CSV (gzip)", "csv.gz", "application/gzip"),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet"),
+}
+
+# Arrow types of the Postgres types returned by the templates, by type oid.
+# Anything else is exported as a string.
+_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int64",
+    23: "int64",
+    700: "float64",
+    701: "float64",
+    1082: "date32",
+    1700: "float64",
+}
+
+
+class ExportReader(io.RawIOBase):
+    """Read-only raw stream over an export's spooled file.
+
+    Download widgets that take raw streams read the file through it, instead
+    of the caller copying the whole file into a bytes object first.
+    """
+
+    def __init__(self, file):
+        self._file = file
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    @property
+    def size(self):
+        position = self._file.tell()
+        size = self._file.seek(0, io.SEEK_END)
+        self._file.seek(position)
+        return size
+
+
+def copy_query(conn, template_id, values, source=FACT_TABLE):
+    # COPY takes no bind parameters, so the values are inlined by the driver
+    template = TEMPLATES[template_id]
+    with conn.cursor() as cur:
+        return cur.mogrify(template.source_sql(source), template.unbind(values)).decode()
+
+
+def export(conn, template_id, values, fmt, columns=None, source=FACT_TABLE):
+    """Exports the rows of a template in `fmt`, one of FORMATS.
+
+    Returns a spooled temporary file positioned at the start. `columns`
+    replaces the column names of the query in the header.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (available: {', '.join(FORMATS)})")
+
+    query = copy_query(conn, template_id, values, source)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        if fmt == "parquet":
+            _write_parquet(conn, query, out, columns)
+        elif fmt == "csv.gz":
+            with gzip.GzipFile(fileobj=out, mode="wb") as target:
+                _write_csv(conn, query, target, columns)
+        else:
+            _write_csv(conn, query, out, columns)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def export_frame(frame, fmt):
+    """Exports a DataFrame already in memory in `fmt`, e.g. the Pivot tab's crosstab.
+
+    Returns a spooled temporary file positioned at the start. The frame's
+    index isn't written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (available: {', '.join(FORMATS)})")
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Column names are written as they are, even when two members share a name
+            table = pa.Table.from_arrays(
+                [pa.array(frame.iloc[:, i]) for i in range(frame.shape[1])], names=[str(c) for c in frame.columns]
+            )
+            pq.write_table(table, out, row_group_size=ROW_GROUP_SIZE)
+        elif fmt == "csv.gz":
+            with gzip.GzipFile(fileobj=out, mode="wb") as target:
+                _write_frame_csv(frame, target)
+        else:
+            _write_frame_csv(frame, out)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def _write_frame_csv(frame, target):
+    text = io.TextIOWrapper(target, encoding="utf-8", newline="")
+    frame.to_csv(text, index=False, lineterminator="\n")
+    text.flush()
+    text.detach()
+
+
+def _columns(conn, query):
+    # Names and type oids of the query's columns, without running it
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({query}) q LIMIT 0")
+        return [(column.name, column.type_code) for column in cur.description]
+
+
+def _write_csv(conn, query, target, columns=None):
+    if columns is None:
+        columns = [name for name, _ in _columns(conn, query)]
+    header = io.StringIO()
+    csv.writer(header, lineterminator="\n").writerow(columns)
+    target.write(header.getvalue().encode())
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", target)
+
+
+def _write_parquet(conn, query, target, columns=None):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    described = _columns(conn, query)
+    names = list(columns) if columns is not None else [name for name, _ in described]
+    schema = pa.schema([
+        (name, getattr(pa, _ARROW_TYPES.get(type_code, "string"))())
+        for name, (_, type_code) in zip(names, described)
+    ])
+
+    # COPY into a CSV spool first, then convert it to Parquet one block at a time
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", spool)
+        empty = spool.tell() == 0
+        spool.seek(0)
+
+        with pq.ParquetWriter(target, schema) as writer:
+            if empty:
+                return
+            reader = pa_csv.open_csv(
+                spool,
+                read_options=pa_csv.ReadOptions(column_names=names),
+                convert_options=pa_csv.ConvertOptions(column_types=schema, strings_can_be_null=True),
+            )
+            batches = []
+            rows = 0
+            for batch in reader:
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows >= ROW_GROUP_SIZE:
+                    writer.write_table(pa.Table.from_batches(batches, schema), row_group_size=ROW_GROUP_SIZE)
+                    batches = []
+                    rows = 0
+            if batches:
+                writer.write_table(pa.Table.from_batches(batches, schema), row_group_size=ROW_GROUP_SIZE)
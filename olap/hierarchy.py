@@ -0,0 +1,81 @@
+import bisect
+import math
+
+from cache import result_size
+from semantic import HIERARCHIES
+
+# Totals of the date hierarchy, year > quarter > month > day, built from the
+# rows of the single ROLLUP query "date_hierarchy". Drill-down and Roll-up
+# move between levels with lookups here instead of a GROUP BY per level.
+
+LEVELS = HIERARCHIES["date"]
+# GROUPING() value of each level's rows
+_LEVEL_OF = {0: "day", 1: "month", 3: "quarter", 7: "year", 15: "total"}
+
+
+def period_label(level, key):
+    """The label the drill_/rollup_ templates give a period."""
+    year, quarter, month, day = (*key, None, None, None)[:4]
+    if level == "day":
+        return f"{day:02d}/{month:02d}/{year}"
+    if level == "month":
+        return f"{month:02d}/{year}"
+    if level == "quarter":
+        return f"{year}-Q{quarter}"
+    return str(year)
+
+
+class DateHierarchy:
+    def __init__(self, rows):
+        self.total = None
+        self._levels = {level: [] for level in LEVELS}
+        # Total of each period, keyed by (year, quarter, month, day) prefixes
+        self._totals = {}
+        self._size = result_size(rows)
+        for grouping, year, quarter, month, day, total in rows:
+            level = _LEVEL_OF[grouping]
+            if level == "total":
+                self.total = total
+                continue
+            key = (year, quarter, month, day)[:LEVELS.index(level) + 1]
+            self._levels[level].append((key, total))
+            self._totals[key] = total
+        for periods in self._levels.values():
+            periods.sort()
+
+    def to_rows(self):
+        """Rows of the date_hierarchy template this was built from, in any order."""
+        grouping = {level: code for code, level in _LEVEL_OF.items()}
+        rows = [
+            (grouping[level], *key, *(None,) * (len(LEVELS) - len(key)), total)
+            for level, periods in self._levels.items() for key, total in periods
+        ]
+        if self.total is not None:
+            rows.append((grouping["total"], None, None, None, None, self.total))
+        return rows
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._size
+
+    def periods(self, level, parent=()):
+        """(key, total) pairs of a level, only the ones inside `parent` when given."""
+        parent = tuple(parent)
+        return [(key, total) for key, total in self._levels[level] if key[:len(parent)] == parent]
+
+    def periods_after(self, level, after=None, limit=None):
+        """(key, total) pairs of a level following the key `after`, in order."""
+        periods = self._levels[level]
+        start = 0 if after is None else bisect.bisect_right(periods, (tuple(after), math.inf))
+        return periods[start:start + limit if limit else None]
+
+    def subtotal(self, key):
+        return self._totals.get(tuple(key))
+
+    def rows(self, level, numeric_year=False):
+        """(period, total) rows of a level, like the drill_/rollup_ templates."""
+        return [(self.label(level, key, numeric_year), total) for key, total in self._levels[level]]
+
+    @staticmethod
+    def label(level, key, numeric_year=False):
+        # Drill-down shows the year as a number
+        return key[0] if level == "year" and numeric_year else period_label(level, key)
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+
+from aggregates import CATALOG_TABLE, FACT_TABLE
+from cache import result_size
+from semantic import DIMENSIONS, MEASURES
+
+# Cached results brought up to date after an ETL load without recomputing
+# them. The ETL only appends sales, so a result computed when the highest
+# sales id was W becomes current again by running its template over the sales
+# with ids above W and folding those groups into it. A different lowest id or
+# a lower highest id means the table was truncated or reloaded, and the
+# result is recomputed instead.
+
+
+@dataclass(frozen=True)
+class Fold:
+    # Leading group-by columns of the template's rows
+    keys: int
+    # Per measure column: "sum", or ("ratio", i, j) for measure i / measure j
+    measures: tuple
+    # Sort key of the merged rows, like the template's ORDER BY; None keeps any order
+    order: object = None
+
+
+def _period_order(label):
+    # "DD/MM/YYYY", "MM/YYYY", "YYYY-Qn" and "YYYY" labels in calendar order
+    if "-Q" in label:
+        return tuple(int(part) for part in label.split("-Q"))
+    return tuple(int(part) for part in reversed(label.split("/")))
+
+
+def _by_labels(row):
+    return row[0], row[1]
+
+
+# Templates written by hand, the ones compiled from a semantic.Query get their
+# fold from query_fold
+FOLDS = {
+    "date_hierarchy": Fold(5, ("sum",)),
+    **{
+        f"pivot_{rows}_{cols}": Fold(2, ("sum",), _by_labels)
+        for rows in ("store", "product", "document_type", "month", "year")
+        for cols in ("store", "product", "document_type", "month", "year")
+        if rows != cols
+    },
+}
+
+
+def query_fold(query):
+    """Fold of the rows of a normalized semantic.Query, None when they are recomputed instead.
+
+    Top-N rows miss the groups under the cut, an average can only be added up
+    when its sum and count are measures of the query too, and attributes are
+    looked up in relations an ETL load can change as well.
+    """
+    dims = [DIMENSIONS[name] for name in query.dims]
+    if query.top_n or any(dim.is_attribute for dim in dims):
+        return None
+    sqls = [MEASURES[name].sql for name in query.measures]
+    measures = []
+    for name in query.measures:
+        ratio = MEASURES[name].ratio
+        if ratio is None:
+            measures.append("sum")
+        elif all(part in sqls for part in ratio):
+            measures.append(("ratio", sqls.index(ratio[0]), sqls.index(ratio[1])))
+        else:
+            return None
+
+    keys = len(dims)
+    order = None
+    if query.order == "total":
+        def order(row):
+            return -row[keys]
+    elif query.order == "dims":
+        labeled = [query.periods and dim.is_date for dim in dims]
+
+        def order(row):
+            return tuple(_period_order(value) if label else value for value, label in zip(row, labeled))
+    return Fold(keys, tuple(measures), order)
+
+
+def fold_of(template):
+    """Fold of a template's rows, None when they can't be refreshed."""
+    if template.query is not None:
+        return query_fold(template.query)
+    return FOLDS.get(template.id)
+
+
+@dataclass(frozen=True)
+class Watermarked:
+    result: object
+    # Lowest and highest sales id when the result was computed
+    low_id: int
+    high_id: int
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + result_size(self.result)
+
+
+def fact_bounds(conn, source=FACT_TABLE):
+    """(lowest, highest) sales id behind `source`, in a snapshot shared with the next queries.
+
+    Must run first in its transaction.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        if source == FACT_TABLE:
+            cur.execute(f"SELECT MIN(id), MAX(id) FROM {FACT_TABLE}")
+        else:
+            # Aggregates hold the sales up to the id they were built at
+            cur.execute(
+                f"SELECT (SELECT MIN(id) FROM {FACT_TABLE}), source_max_id FROM {CATALOG_TABLE} WHERE name = %s",
+                (source,),
+            )
+        return cur.fetchone()
+
+
+def delta_sql(sql):
+    """The template over only the sales above %(watermark)s."""
+    source = f"FROM {FACT_TABLE} s"
+    if source not in sql:
+        raise ValueError("Query doesn't read from the fact table")
+    return sql.replace(source, f"FROM (SELECT * FROM {FACT_TABLE} WHERE id > %(watermark)s) s")
+
+
+def fold_rows(fold, rows, delta):
+    """`rows` with the groups of `delta` added in."""
+    merged = {}
+    for row in rows:
+        merged[tuple(row[:fold.keys])] = list(row[fold.keys:])
+    for row in delta:
+        key = tuple(row[:fold.keys])
+        measures = merged.get(key)
+        if measures is None:
+            merged[key] = list(row[fold.keys:])
+            continue
+        for i, kind in enumerate(fold.measures):
+            if kind == "sum":
+                measures[i] += row[fold.keys + i]
+    for measures in merged.values():
+        for i, kind in enumerate(fold.measures):
+            if kind != "sum":
+                _, numerator, denominator = kind
+                measures[i] = measures[numerator] / measures[denominator] if measures[denominator] else None
+    result = [(*key, *measures) for key, measures in merged.items()]
+    if fold.order is not None:
+        result.sort(key=fold.order)
+    return result
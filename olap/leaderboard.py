@@ -0,0 +1,229 @@
+import threading
+
+import numpy as np
+
+from aggregates import DIMENSION_COLUMNS, FACT_TABLE
+
+# Top-N products and customers answered from per-day partial aggregates kept
+# in memory. The partials are folded forward with the sales appended since the
+# last load (ids above the watermark), so a refresh only reads the new rows,
+# and a date range is answered by merging the partials of its days, at a cost
+# that grows with the entities sold in the range rather than with the sales.
+# A leaderboard whose partials don't fit in its memory budget is dropped, and
+# its template runs in the database instead.
+
+# Template, leaderboard dimension and measures of its rows after the id
+LEADERBOARDS = {
+    "top_products": ("product", ("total_amount", "quantity", "avg_unit_price")),
+    "top_customers": ("customer", ("total_amount", "row_count", "avg_total_amount")),
+}
+
+FETCH_SIZE = 100_000
+
+# Bytes per partial: two ids and four measures
+PARTIAL_BYTES = 4 + 4 + 8 + 8 + 8 + 8
+
+
+class Partials:
+    """(date id, entity id) partial sums, sorted by date and entity."""
+
+    def __init__(self, date_ids, entity_ids, total_amount, quantity, unit_price_sum, row_count):
+        self.date_ids = date_ids
+        self.entity_ids = entity_ids
+        self.total_amount = total_amount
+        self.quantity = quantity
+        self.unit_price_sum = unit_price_sum
+        self.row_count = row_count
+        # Start of each date's run of partials
+        self.dates, self.offsets = np.unique(date_ids, return_index=True)
+        self.offsets = np.append(self.offsets, len(date_ids))
+
+    def __len__(self):
+        return len(self.date_ids)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns())
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0), np.empty(0, dtype=np.int64),
+            np.empty(0), np.empty(0, dtype=np.int64),
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        if not rows:
+            return cls.empty()
+        date_ids, entity_ids, amounts, quantities, prices, counts = zip(*rows)
+        return cls(
+            np.array(date_ids, dtype=np.int32), np.array(entity_ids, dtype=np.int32),
+            np.array(amounts, dtype=np.float64), np.array(quantities, dtype=np.int64),
+            np.array(prices, dtype=np.float64), np.array(counts, dtype=np.int64),
+        )
+
+    def columns(self):
+        return (self.date_ids, self.entity_ids, self.total_amount, self.quantity, self.unit_price_sum, self.row_count)
+
+    def merge(self, *others):
+        """New Partials with the sums of all, one partial per (date, entity)."""
+        others = [other for other in others if len(other)]
+        if not others:
+            return self
+        columns = [np.concatenate(parts) for parts in zip(self.columns(), *(other.columns() for other in others))]
+        order = np.lexsort((columns[1], columns[0]))
+        date_ids, entity_ids, *measures = (column[order] for column in columns)
+        starts = np.flatnonzero(np.concatenate((
+            [True], (date_ids[1:] != date_ids[:-1]) | (entity_ids[1:] != entity_ids[:-1])
+        ))) if len(date_ids) else np.empty(0, dtype=np.int64)
+        return Partials(
+            date_ids[starts], entity_ids[starts], *(np.add.reduceat(measure, starts) for measure in measures)
+        )
+
+    def rows_in(self, date_ids):
+        # Positions of the partials of the given dates
+        date_ids = np.unique(np.asarray(date_ids, dtype=np.int32))
+        positions = np.searchsorted(self.dates, date_ids)
+        found = positions < len(self.dates)
+        found[found] = self.dates[positions[found]] == date_ids[found]
+        positions = positions[found]
+        if not len(positions):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in positions])
+
+
+class Leaderboard:
+    """Per-day partials of one dimension, in sync with the fact table.
+
+    The fact table is re-checked whenever `version()` changes. Sales with ids
+    above the watermark are folded in; a lower highest id or a different
+    lowest id means the table was truncated or reloaded, and the partials are
+    rebuilt. The ETL appends sales in one transaction per batch, so ids below
+    the watermark don't show up later.
+
+    Folding happens outside the state, which is swapped in whole when done:
+    readers of an unchanged version never wait for a refresh. Partials over
+    `memory_budget` bytes are dropped and `partials()` gives None until the
+    next version.
+    """
+
+    def __init__(self, pool, dim, version, memory_budget=None):
+        self.pool = pool
+        self.dim = dim
+        self.version = version
+        self.memory_budget = memory_budget
+        # One refresh at a time
+        self._lock = threading.Lock()
+        # (version, partials, (lowest id, highest folded id) of the fact table)
+        self._state = (None, Partials.empty(), None)
+
+    def _fold(self, conn, partials, after, until):
+        # `partials` with the sales in (after, until] added, None past the budget
+        column = DIMENSION_COLUMNS[self.dim]
+        with conn.cursor(name=f"olap_leaderboard_{self.dim}") as cur:
+            cur.itersize = FETCH_SIZE
+            cur.execute(f"""
+                SELECT date_id, {column}, SUM(total_amount), SUM(quantity), SUM(unit_price), COUNT(*)
+                FROM {FACT_TABLE}
+                WHERE id > %s AND id <= %s
+                GROUP BY date_id, {column}
+            """, (after, until))
+            chunks = []
+            size = partials.nbytes
+            while True:
+                chunk = cur.fetchmany(FETCH_SIZE)
+                if not chunk:
+                    break
+                chunks.append(Partials.from_rows(chunk))
+                size += chunks[-1].nbytes
+                if self.memory_budget is not None and size > self.memory_budget:
+                    chunks = None
+                    break
+        conn.rollback()
+        if chunks is None:
+            return None
+        partials = partials.merge(*chunks)
+        if self.memory_budget is not None and partials.nbytes > self.memory_budget:
+            return None
+        return partials
+
+    def partials(self):
+        version = self.version()
+        state = self._state
+        if state[0] == version:
+            return state[1]
+        with self._lock:
+            # Another thread may have refreshed it while this one waited
+            state = self._state
+            if state[0] == version:
+                return state[1]
+            _, partials, bounds = state
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT MIN(id), MAX(id) FROM {FACT_TABLE}")
+                    low, high = cur.fetchone()
+                if low is None:
+                    partials, bounds = Partials.empty(), None
+                else:
+                    if partials is None or bounds is None or low != bounds[0] or high < bounds[1]:
+                        partials, bounds = Partials.empty(), (low, low - 1)
+                    if high > bounds[1]:
+                        partials = self._fold(conn, partials, bounds[1], high)
+                        bounds = (low, high) if partials is not None else None
+            self._state = (version, partials, bounds)
+            return partials
+
+    def top(self, date_ids, n):
+        """The `n` entities with the highest sales on `date_ids`.
+
+        Returns (entity id, total amount, quantity, row count, unit price sum)
+        tuples, highest total first, or None over the memory budget.
+        """
+        partials = self.partials()
+        if partials is None:
+            return None
+        positions = partials.rows_in(date_ids)
+        entities, inverse = np.unique(partials.entity_ids[positions], return_inverse=True)
+        totals = [
+            np.bincount(inverse, weights=measure[positions], minlength=len(entities))
+            for measure in (partials.total_amount, partials.quantity, partials.unit_price_sum, partials.row_count)
+        ]
+        amounts = totals[0]
+        # Selection of the n largest, then sorting only those
+        best = np.argpartition(-amounts, n - 1)[:n] if n < len(entities) else np.arange(len(entities))
+        best = best[np.argsort(-amounts[best], kind="stable")]
+        return [
+            (int(entities[i]), float(amounts[i]), int(totals[1][i]), int(totals[3][i]), float(totals[2][i]))
+            for i in best
+        ]
+
+
+class Leaderboards:
+    """Answers the templates in LEADERBOARDS from a Leaderboard per dimension."""
+
+    def __init__(self, pool, version, memory_budget=None):
+        self._boards = {
+            dim: Leaderboard(pool, dim, version, memory_budget) for dim, _ in LEADERBOARDS.values()
+        }
+
+    def __contains__(self, template_id):
+        return template_id in LEADERBOARDS
+
+    def query(self, template_id, params):
+        """Rows of the template, None when its leaderboard is over the memory budget."""
+        dim, measures = LEADERBOARDS[template_id]
+        top = self._boards[dim].top(params["date_ids"], params["top_n"])
+        if top is None:
+            return None
+        rows = []
+        for entity_id, amount, quantity, count, price_sum in top:
+            values = {
+                "total_amount": amount,
+                "quantity": quantity,
+                "row_count": count,
+                "avg_unit_price": price_sum / count,
+                "avg_total_amount": amount / count,
+            }
+            rows.append((entity_id, *(values[measure] for measure in measures)))
+        return rows
@@ -0,0 +1,111 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from aggregates import FACT_TABLE
+from cache import result_size
+from incremental import Watermarked
+from queries import TEMPLATES
+
+# Timings of everything a page does: queries (wall time, time to first row,
+# rows, payload and cache status), DataFrame conversions and figure builds.
+# Records are kept in memory for the diagnostics page and written as JSON
+# lines to the "olap.profile" logger.
+
+logger = logging.getLogger("olap.profile")
+
+# Page (and tab) being rendered by the current script run
+_page = contextvars.ContextVar("olap_page", default=None)
+
+
+def set_page(page):
+    _page.set(page)
+
+
+def result_stats(result):
+    """Rows and approximate bytes of a query result, None when unknown."""
+    if result is None:
+        return None, None
+    if isinstance(result, Watermarked):
+        return result_stats(result.result)
+    if isinstance(result, list):
+        return len(result), result_size(result)
+    if hasattr(result, "frame"):
+        return result.rows, result_size(result)
+    if hasattr(result, "seek"):
+        # Exported file
+        position = result.tell()
+        result.seek(0, 2)
+        size = result.tell()
+        result.seek(position)
+        return None, size
+    return None, result_size(result)
+
+
+def explain(conn, template_id, values, source=FACT_TABLE):
+    template = TEMPLATES[template_id]
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {template.source_sql(source)}", template.unbind(values))
+        return "\n".join(row[0] for row in cur.fetchall())
+
+
+class Profiler:
+    """Bounded history of timing records.
+
+    Queries slower than `slow_threshold` seconds are flagged so their plan can
+    be captured with EXPLAIN (ANALYZE, BUFFERS).
+    """
+
+    def __init__(self, max_records=1000, slow_threshold=1.0):
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+
+    def is_slow(self, seconds):
+        return self.slow_threshold is not None and seconds >= self.slow_threshold
+
+    def record(self, kind, name, seconds, **fields):
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "page": _page.get(),
+            "kind": kind,
+            "name": name,
+            "seconds": round(seconds, 6),
+            **fields,
+        }
+        with self._lock:
+            self._records.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record, default=str, ensure_ascii=False))
+        return record
+
+    @contextmanager
+    def span(self, kind, name, **fields):
+        """Times the block, which can add fields to the yielded dict."""
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(kind, name, time.perf_counter() - start, **fields)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+def log_to(path):
+    """Writes the records as JSON lines to `path`."""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
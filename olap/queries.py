@@ -0,0 +1,404 @@
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+import semantic
+from aggregates import FACT_TABLE, rewrite
+from semantic import DATE_FILTER, DATE_JOIN, DATE_PARAMS, Query, compile_query, filter_sql
+
+# Statement templates for every query issued by the OLAP app. Each template has
+# a fixed SQL text and typed parameters, so it can be prepared once per pooled
+# connection and re-executed with EXECUTE, and user input never ends up in the
+# query text.
+
+_PARAM_RE = re.compile(r"%\((\w+)\)s")
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    prepare_sql: str
+    execute_sql: str
+
+
+@dataclass(frozen=True)
+class Template:
+    id: str
+    sql: str
+    # (name, postgres type) pairs, in the order they are bound to $1, $2, ...
+    params: tuple = ()
+    # The normalized semantic.Query of a compiled template
+    query: object = None
+
+    def __post_init__(self):
+        declared = {name for name, _ in self.params}
+        used = set(_PARAM_RE.findall(self.sql))
+        if used != declared:
+            raise ValueError(f"Template {self.id} declares {sorted(declared)} but uses {sorted(used)}")
+
+    def bind(self, params):
+        missing = [name for name, _ in self.params if name not in params]
+        unknown = set(params) - {name for name, _ in self.params}
+        if missing or unknown:
+            raise ValueError(f"Template {self.id}: missing params {missing}, unknown params {sorted(unknown)}")
+        return tuple(params[name] for name, _ in self.params)
+
+    def unbind(self, values):
+        return {name: value for (name, _), value in zip(self.params, values)}
+
+    @property
+    def cache_key(self):
+        # Templates compiled from equivalent queries share their cached results
+        return self.id if self.query is None else self.query.id
+
+    def source_sql(self, source=FACT_TABLE):
+        return self.sql if source == FACT_TABLE else rewrite(self.sql, source)
+
+    def statement(self, source=FACT_TABLE):
+        key = (self.id, source)
+        if key not in _STATEMENTS:
+            sql = self.source_sql(source)
+            positions = {name: i for i, (name, _) in enumerate(self.params, start=1)}
+            body = _PARAM_RE.sub(lambda m: f"${positions[m.group(1)]}", sql).replace("%%", "%")
+            name = "olap_" + re.sub(r"\W", "_", self.id if source == FACT_TABLE else f"{self.id}__{source}")
+            if len(name) > 63:
+                # Postgres truncates longer identifiers, which could make two names collide
+                name = f"{name[:50]}_{hashlib.sha1(name.encode()).hexdigest()[:12]}"
+            types = ", ".join(pg_type for _, pg_type in self.params)
+            args = ", ".join(["%s"] * len(self.params))
+            _STATEMENTS[key] = Statement(
+                name,
+                f"PREPARE {name} ({types}) AS {body}" if types else f"PREPARE {name} AS {body}",
+                f"EXECUTE {name} ({args})" if args else f"EXECUTE {name}",
+            )
+        return _STATEMENTS[key]
+
+
+TEMPLATES = {}
+_STATEMENTS = {}
+_compile_lock = threading.Lock()
+
+
+def register(template_id, sql, **param_types):
+    template = Template(template_id, sql, tuple(param_types.items()))
+    TEMPLATES[template_id] = template
+    return template
+
+
+def register_query(template_id, query):
+    """Registers the statement compiled from a semantic.Query."""
+    sql, param_types = compile_query(query)
+    template = Template(template_id, sql, tuple(param_types.items()), query.normalized())
+    TEMPLATES[template_id] = template
+    return template
+
+
+def compiled(query):
+    """Id of the template of a semantic.Query, compiled the first time it's asked for."""
+    template_id = query.id
+    with _compile_lock:
+        if template_id not in TEMPLATES:
+            register_query(template_id, query)
+    return template_id
+
+
+def execute(conn, template_id, values, source=FACT_TABLE, timing=None):
+    """Runs a registered template with already bound values on `conn`.
+
+    The template is prepared the first time it is used on a connection, every
+    later call only sends EXECUTE, so Postgres can reuse the plan. `source` is
+    the table to read the facts from, `sales` or one of its aggregates. When
+    given, `timing` gets the seconds until the first row in "first_row".
+    """
+    statement = TEMPLATES[template_id].statement(source)
+    with conn.cursor() as cur:
+        if statement.name not in conn.prepared:
+            cur.execute(statement.prepare_sql)
+            conn.prepared.add(statement.name)
+        start = time.perf_counter()
+        cur.execute(statement.execute_sql, values)
+        if timing is not None:
+            timing["first_row"] = time.perf_counter() - start
+        return cur.fetchall()
+
+
+# Dimension labels used by the UI and the keys used in template ids
+DIMENSIONS = {
+    semantic.DIMENSIONS[name].label: name
+    for name in ("store", "product", "customer", "document_type", "month", "year")
+}
+
+# The templates below are compiled from semantic.Query, grouping the facts by
+# their dimension ids without joining the dimension tables. The first column
+# is the id, which the engine replaces with the attributes in LABELS, taken
+# from dimensions.DimensionCache.
+
+register_query("sales_by_store", Query(("store",), ("total_sales", "num_transactions"), order="total"))
+register_query("sales_by_document_type", Query(("document_type",), ("total_sales", "num_transactions"), order="total"))
+register_query("top_products", Query(
+    ("product",), ("total_sales", "total_quantity", "avg_price"), order="total", top_n=True
+))
+register_query("top_customers", Query(
+    ("customer",), ("total_sales", "num_transactions", "avg_transaction_value"), order="total", top_n=True
+))
+
+for grain in ("day", "month", "year"):
+    register_query(f"sales_by_{grain}", Query(
+        (grain,), ("total_sales", "num_transactions", "avg_transaction_value"), periods=True
+    ))
+
+# Drill-down and Roll-up over the date hierarchy. Drill-down shows the year as a number.
+for grain in ("day", "month", "quarter", "year"):
+    register_query(f"drill_{grain}", Query((grain,), periods=grain != "year"))
+
+for grain in ("day", "month", "year"):
+    register_query(f"rollup_{grain}", Query((grain,), periods=True))
+
+# Every level of the date hierarchy in a single scan, see hierarchy.DateHierarchy.
+# GROUPING() tells the levels apart: 0 for days, 1 months, 3 quarters, 7 years
+# and 15 for the grand total.
+register("date_hierarchy", f"""
+    SELECT GROUPING(d.year, CEILING(d.month::numeric / 3), d.month, d.day) as level,
+           d.year, CEILING(d.month::numeric / 3)::int as quarter, d.month, d.day,
+           SUM(s.total_amount) as total_sales
+    FROM sales s
+    {DATE_JOIN}
+    WHERE {DATE_FILTER}
+    GROUP BY ROLLUP (d.year, CEILING(d.month::numeric / 3), d.month, d.day)
+""", **DATE_PARAMS)
+
+# Sales per product and per store, rolled up by ATTRIBUTE_ROLLUPS into
+# (attribute, total sales, number of products/stores) rows
+register_query("rollup_material", Query(("product",), order=None))
+register_query("rollup_location", Query(("store",), order=None))
+
+# Dimension and attributes that replace the id column of the templates above
+LABELS = {
+    template_id: (dim, semantic.DIMENSIONS[dim].attributes)
+    for template_id, dim in (
+        ("sales_by_store", "store"),
+        ("sales_by_document_type", "document_type"),
+        ("top_products", "product"),
+        ("top_customers", "customer"),
+    )
+}
+# Dimension, attribute and label of a missing attribute of the roll-ups
+ATTRIBUTE_ROLLUPS = {
+    "rollup_material": ("product", "material", "Não Especificado"),
+    "rollup_location": ("store", "location", None),
+}
+
+# The templates above with their labels joined in, for exports, which COPY
+# the rows straight from Postgres instead of labeling them in memory
+for template_id, (dim, attrs) in LABELS.items():
+    template = TEMPLATES[template_id]
+    table = semantic.DIMENSIONS[dim].table
+    measures = template.query.measures
+    register(f"export_{template_id}", f"""
+        SELECT {", ".join(f"{dim}.{attr}" for attr in attrs)}, {", ".join(f"g.{name}" for name in measures)}
+        FROM ({template.sql}) g
+        LEFT JOIN {table} {dim} ON {dim}.id = g.{dim}
+        ORDER BY g.{measures[0]} DESC
+    """, **dict(template.params))
+
+for template_id, (dim, attr, missing) in ATTRIBUTE_ROLLUPS.items():
+    template = TEMPLATES[template_id]
+    label = f"{dim}.{attr}" if missing is None else f"COALESCE({dim}.{attr}, '{missing}')"
+    register(f"export_{template_id}", f"""
+        SELECT {label} as {attr}, SUM(g.total_sales) as total_sales, COUNT(*) as members
+        FROM ({template.sql}) g
+        LEFT JOIN {semantic.DIMENSIONS[dim].table} {dim} ON {dim}.id = g.{dim}
+        GROUP BY 1
+        ORDER BY total_sales DESC
+    """, **dict(template.params))
+
+# Values offered by the Slice and Dice selectors. Products and customers are
+# searched by name instead, see search.py.
+register("values_store", "SELECT DISTINCT name FROM d_stores ORDER BY name")
+register("values_document_type", "SELECT DISTINCT name FROM d_document_types ORDER BY name")
+register("values_year", "SELECT DISTINCT year FROM d_dates ORDER BY year")
+
+# Ids of the finest level of each hierarchy with the given names or attribute
+# values, which filters are bound as. Date levels are resolved in memory by
+# dates.DateIndex.
+for dim in semantic.DIMENSIONS.values():
+    if dim.is_attribute:
+        register(f"ids_{dim.name}", f"""
+            SELECT id FROM ({dim.relation.strip()}) r WHERE value = ANY(%(names)s) ORDER BY id
+        """, names="text[]")
+    elif not dim.is_date:
+        register(
+            f"ids_{dim.name}", f"SELECT id FROM {dim.table} WHERE name = ANY(%(names)s) ORDER BY id", names="text[]"
+        )
+
+# Monthly sales of the Slice and Dice filters. A slice by year is the monthly
+# roll-up of that year's dates, and dice filters in either order are the same
+# query, so they share their cached results.
+SLICE_DIMENSIONS = ("store", "product", "customer", "document_type", "year")
+DICE_DIMENSIONS = ("store", "product", "document_type")
+
+MONTHLY = semantic.DIMENSIONS["month"]
+
+# Keyset pages of the same series: the months after (after_year, after_month)
+MONTHLY_SALES_PAGE = f"""
+    SELECT d.year, d.month,
+           {MONTHLY.period} as period,
+           SUM(s.total_amount) as total_sales
+    FROM sales s
+    {DATE_JOIN}
+    WHERE {{where}} AND (d.year, d.month) > (%(after_year)s, %(after_month)s)
+    GROUP BY {MONTHLY.columns}
+    ORDER BY {MONTHLY.columns}
+    LIMIT %(page_size)s
+"""
+
+# Total and number of months of the series, from the same grouping
+MONTHLY_SALES_TOTAL = f"""
+    SELECT SUM(total_sales) as total_sales, COUNT(*) as num_periods
+    FROM (
+        SELECT SUM(s.total_amount) as total_sales
+        FROM sales s
+        {DATE_JOIN}
+        WHERE {{where}}
+        GROUP BY {MONTHLY.columns}
+    ) monthly
+"""
+KEYSET_PARAMS = {"after_year": "int", "after_month": "int", "page_size": "int"}
+
+for dim in SLICE_DIMENSIONS:
+    query = Query(("month",), filters=(dim,), periods=True)
+    where, params = filter_sql(query.normalized().filters)
+    register_query(f"slice_{dim}", query)
+    register(f"slice_{dim}_page", MONTHLY_SALES_PAGE.format(where=where), **params, **KEYSET_PARAMS)
+    register(f"slice_{dim}_total", MONTHLY_SALES_TOTAL.format(where=where), **params)
+
+for dim1 in DICE_DIMENSIONS:
+    for dim2 in DICE_DIMENSIONS:
+        if dim1 != dim2:
+            register_query(f"dice_{dim1}_{dim2}", Query(("month",), filters=(dim1, dim2), periods=True))
+
+# Grouping key over the facts, and the join and label attached after
+# aggregation ({key} is the key's column in the grouped rows). Periods are
+# grouped by their label directly.
+PIVOT_DIMENSIONS = {}
+for name in ("store", "product", "document_type", "month", "year"):
+    dim = semantic.DIMENSIONS[name]
+    if dim.is_date:
+        PIVOT_DIMENSIONS[name] = (dim.period, "", "g.{key}")
+    else:
+        PIVOT_DIMENSIONS[name] = (dim.key, f"JOIN {dim.table} {name} ON {name}.id = g.{{key}}", f"{name}.name")
+PERIOD_DIMENSIONS = ("month", "year")
+
+for rows in PIVOT_DIMENSIONS:
+    for cols in PIVOT_DIMENSIONS:
+        if rows == cols:
+            continue
+        row_key, row_join, row_label = (part.format(key="row_key") for part in PIVOT_DIMENSIONS[rows])
+        col_key, col_join, col_label = (part.format(key="col_key") for part in PIVOT_DIMENSIONS[cols])
+        date_join = DATE_JOIN if {rows, cols} & set(PERIOD_DIMENSIONS) else ""
+        # Rows that share a name are summed by the outer grouping, as in the pivot table
+        register(f"pivot_{rows}_{cols}", f"""
+            SELECT
+                {row_label} as row_dim,
+                {col_label} as col_dim,
+                SUM(g.total_sales) as total_sales
+            FROM (
+                SELECT {row_key} as row_key, {col_key} as col_key, SUM(s.total_amount) as total_sales
+                FROM sales s
+                {date_join}
+                WHERE {DATE_FILTER}
+                GROUP BY row_key, col_key
+            ) g
+            {row_join}
+            {col_join}
+            GROUP BY row_dim, col_dim
+            ORDER BY row_dim, col_dim
+        """, **DATE_PARAMS)
+
+# Crosstab of the Pivot tab, computed in the database one page of rows at a
+# time: the sales of each row are split over the top columns (picked by
+# pivot_columns_*, at most CROSSTAB_COLUMNS) by their position in
+# %(col_keys)s, and the other columns are summed together. Keys are ids, or
+# the integer keys of periods, labeled by the engine.
+CROSSTAB_COLUMNS = 50
+CROSSTAB_KEYS = {
+    name: semantic.DIMENSIONS[name].key if name in PERIOD_DIMENSIONS else f"{semantic.DIMENSIONS[name].key}::int"
+    for name in PIVOT_DIMENSIONS
+}
+
+for cols, col_key in CROSSTAB_KEYS.items():
+    date_join = DATE_JOIN if cols in PERIOD_DIMENSIONS else ""
+    register(f"pivot_columns_{cols}", f"""
+        SELECT {col_key} as col_key, SUM(s.total_amount) as total_sales
+        FROM sales s
+        {date_join}
+        WHERE {DATE_FILTER}
+        GROUP BY col_key
+        ORDER BY total_sales DESC, col_key
+        LIMIT %(top_n)s
+    """, **DATE_PARAMS, top_n="int")
+
+CROSSTAB_SLOTS = ",\n".join(
+    f"SUM(g.total_sales) FILTER (WHERE g.slot = {slot}) as col_{slot}" for slot in range(1, CROSSTAB_COLUMNS + 1)
+)
+
+for rows, row_key in CROSSTAB_KEYS.items():
+    for cols, col_key in CROSSTAB_KEYS.items():
+        if rows == cols:
+            continue
+        date_join = DATE_JOIN if {rows, cols} & set(PERIOD_DIMENSIONS) else ""
+        # Periods in calendar order, other rows by their total
+        order = "g.row_key" if rows in PERIOD_DIMENSIONS else "total_sales DESC, g.row_key"
+        register(f"crosstab_{rows}_{cols}", f"""
+            SELECT
+                g.row_key,
+                {CROSSTAB_SLOTS},
+                SUM(g.total_sales) FILTER (WHERE g.slot IS NULL) as others,
+                SUM(g.total_sales) as total_sales,
+                COUNT(*) OVER () as row_count
+            FROM (
+                SELECT
+                    {row_key} as row_key,
+                    array_position(%(col_keys)s, {col_key}) as slot,
+                    SUM(s.total_amount) as total_sales
+                FROM sales s
+                {date_join}
+                WHERE {DATE_FILTER}
+                GROUP BY row_key, slot
+            ) g
+            GROUP BY g.row_key
+            ORDER BY {order}
+            LIMIT %(page_size)s OFFSET %(page_offset)s
+        """, **DATE_PARAMS, col_keys="int[]", page_size="int", page_offset="int")
+
+# Fact rows behind the charts, for exports
+FACT_ROWS = f"""
+    SELECT MAKE_DATE(d.year, d.month, d.day) as date,
+           st.name as store, st.location,
+           p.sku, p.name as product,
+           c.name as customer,
+           dt.name as document_type, s.document_num,
+           s.quantity, s.unit_price, s.total_amount
+    FROM sales s
+    {DATE_JOIN}
+    JOIN d_stores st ON s.store_id = st.id
+    JOIN d_products p ON s.product_id = p.id
+    JOIN d_customers c ON s.customer_id = c.id
+    JOIN d_document_types dt ON s.document_type_id = dt.id
+    WHERE {{where}}
+    ORDER BY s.id
+"""
+
+register("facts", FACT_ROWS.format(where=DATE_FILTER), **DATE_PARAMS)
+
+for dim in SLICE_DIMENSIONS:
+    where, params = filter_sql(Query(filters=(dim,)).normalized().filters)
+    register(f"facts_{dim}", FACT_ROWS.format(where=where), **params)
+
+for dim1 in DICE_DIMENSIONS:
+    for dim2 in DICE_DIMENSIONS:
+        if dim1 != dim2:
+            where, params = filter_sql(Query(filters=(dim1, dim2)).normalized().filters)
+            register(f"facts_{dim1}_{dim2}", FACT_ROWS.format(where=where), **params)
@@ -0,0 +1,164 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from psycopg2 import extensions
+
+from aggregates import FACT_TABLE
+
+# Random sample of the `sales` fact table for the approximate preview mode.
+# Each day is a stratum sampled at `rate`, or more for days with few sales so
+# every day keeps at least `min_rows` rows, and each sampled row carries the
+# inverse of its inclusion probability in `weight`. Sums and counts are the
+# weighted sums over the sample, with a 95% confidence margin from the
+# Horvitz-Thompson variance estimate, sum(w * (w - 1) * y^2).
+
+SAMPLE_TABLE = "sales_sample"
+SAMPLE_CATALOG = "olap_samples"
+DEFAULT_RATE = 0.01
+DEFAULT_MIN_ROWS = 30
+# Normal quantile of a two-sided 95% interval
+Z_95 = 1.96
+
+# Measure expressions over `sales` and their estimate from the weighted sample
+MEASURE_ESTIMATES = [
+    ("AVG(s.total_amount)", "(SUM(s.total_amount * s.weight) / SUM(s.weight))"),
+    ("AVG(s.unit_price)", "(SUM(s.unit_price * s.weight) / SUM(s.weight))"),
+    ("SUM(s.total_amount)", "SUM(s.total_amount * s.weight)"),
+    ("SUM(s.quantity)", "ROUND(SUM(s.quantity * s.weight))::bigint"),
+    ("COUNT(DISTINCT s.id)", "ROUND(SUM(s.weight))::bigint"),
+    ("COUNT(s.id)", "ROUND(SUM(s.weight))::bigint"),
+]
+MARGIN_SQL = f"{Z_95} * SQRT(SUM(s.weight * (s.weight - 1) * s.total_amount * s.total_amount)) as total_sales_margin"
+
+_FROM_RE = re.compile(rf"\n\s*FROM {FACT_TABLE} s\b")
+
+
+def estimate_sql(sql, source):
+    """Rewrites a query over `sales s` into its estimate from the sample `source`.
+
+    The estimate of SUM(s.total_amount) gets its confidence margin as an extra
+    last column.
+    """
+    if not _FROM_RE.search(sql) or "SUM(s.total_amount)" not in sql:
+        raise ValueError("Query doesn't sum sales from the fact table")
+    for fact_expr, estimate_expr in MEASURE_ESTIMATES:
+        sql = sql.replace(fact_expr, estimate_expr)
+    return _FROM_RE.sub(lambda m: f",\n        {MARGIN_SQL}\n    FROM {source} s", sql, count=1)
+
+
+@dataclass(frozen=True)
+class Sample:
+    # FROM clause source with the sales columns and `weight`
+    source: str
+    rate: float
+    # Build time of the sample table, None for a TABLESAMPLE
+    refreshed_at: object = None
+
+
+def tablesample_source(rate=DEFAULT_RATE):
+    # Same columns as the sample table, drawn on the fly
+    return (
+        f"(SELECT *, {1 / rate!r}::float8 AS weight FROM {FACT_TABLE} "
+        f"TABLESAMPLE BERNOULLI ({rate * 100!r}) REPEATABLE (0))"
+    )
+
+
+def refresh_sample(conn, rate=DEFAULT_RATE, min_rows=DEFAULT_MIN_ROWS):
+    """Rebuilds the sample table from `sales`, returns its row count and build time.
+
+    Like the aggregates, the table is built from one snapshot and swapped in
+    atomically.
+    """
+    start = time.monotonic()
+    staging = f"{SAMPLE_TABLE}_new"
+    conn.set_session(isolation_level=extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SAMPLE_CATALOG} (
+                    name text PRIMARY KEY,
+                    rate double precision NOT NULL,
+                    min_rows integer NOT NULL,
+                    row_count bigint NOT NULL,
+                    source_max_id bigint NOT NULL,
+                    refreshed_at timestamptz NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {FACT_TABLE}")
+            source_max_id = cur.fetchone()[0]
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(f"""
+                CREATE TABLE {staging} AS
+                WITH strata AS (
+                    SELECT date_id, LEAST(1.0, GREATEST(%(rate)s, %(min_rows)s::float8 / COUNT(*))) AS probability
+                    FROM {FACT_TABLE}
+                    GROUP BY date_id
+                )
+                SELECT s.*, 1.0 / st.probability AS weight
+                FROM (SELECT *, random() AS draw FROM {FACT_TABLE}) s
+                JOIN strata st ON st.date_id = s.date_id
+                WHERE s.draw < st.probability
+            """, {"rate": rate, "min_rows": min_rows})
+            # Drawn per sale, a filter on the strata alone would be evaluated once per day
+            cur.execute(f"ALTER TABLE {staging} DROP COLUMN draw")
+            cur.execute(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO {SAMPLE_TABLE}")
+            cur.execute(f"CREATE INDEX {SAMPLE_TABLE}_date_id_idx ON {SAMPLE_TABLE} (date_id)")
+            cur.execute(f"ANALYZE {SAMPLE_TABLE}")
+            cur.execute(f"SELECT COUNT(*) FROM {SAMPLE_TABLE}")
+            row_count = cur.fetchone()[0]
+            cur.execute(f"""
+                INSERT INTO {SAMPLE_CATALOG} (name, rate, min_rows, row_count, source_max_id, refreshed_at)
+                VALUES (%s, %s, %s, %s, %s, now())
+                ON CONFLICT (name) DO UPDATE SET
+                    rate = EXCLUDED.rate,
+                    min_rows = EXCLUDED.min_rows,
+                    row_count = EXCLUDED.row_count,
+                    source_max_id = EXCLUDED.source_max_id,
+                    refreshed_at = EXCLUDED.refreshed_at
+            """, (SAMPLE_TABLE, rate, min_rows, row_count, source_max_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return row_count, time.monotonic() - start
+
+
+class Sampler:
+    """Source of the approximate queries.
+
+    The sample table while it is up to date with `sales`, re-checked at most
+    every `refresh_interval` seconds; otherwise a TABLESAMPLE of `sales` at
+    `fallback_rate`.
+    """
+
+    def __init__(self, pool, fallback_rate=DEFAULT_RATE, refresh_interval=60.0):
+        self.pool = pool
+        self.fallback_rate = fallback_rate
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._sample = None
+        self._checked_at = 0.0
+
+    def sample(self):
+        with self._lock:
+            if self._sample is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._sample
+
+            sample = Sample(tablesample_source(self.fallback_rate), self.fallback_rate)
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (SAMPLE_CATALOG,))
+                    if cur.fetchone()[0]:
+                        cur.execute(f"""
+                            SELECT rate, refreshed_at FROM {SAMPLE_CATALOG}
+                            WHERE name = %s AND source_max_id = (SELECT COALESCE(MAX(id), 0) FROM {FACT_TABLE})
+                        """, (SAMPLE_TABLE,))
+                        row = cur.fetchone()
+                        if row is not None:
+                            sample = Sample(SAMPLE_TABLE, *row)
+            self._sample = sample
+            self._checked_at = time.monotonic()
+            return self._sample
@@ -0,0 +1,163 @@
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from semantic import DIMENSIONS
+
+# Typeahead search over the names of the large dimensions. Every distinct name
+# is kept in a sorted array, for prefix lookups, and in trigram postings, for
+# substrings anywhere in the name. Matching ignores case and accents.
+
+SEARCH_DIMENSIONS = {name: DIMENSIONS[name].table for name in ("product", "customer")}
+
+
+def fold(text):
+    # "Aroma da Sé" -> "aroma da se"
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def trigrams(folded):
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+class ValueIndex:
+    """Ranked prefix and substring search over a growing set of names."""
+
+    def __init__(self, names=()):
+        # Searches read the index while `add` extends it
+        self._lock = threading.RLock()
+        # Names by id, ids are only appended
+        self._names = []
+        self._folded = []
+        self._ids = {}
+        # (folded name, id), sorted
+        self._sorted = []
+        self._postings = {}
+        self.add(names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, names):
+        """Adds the names not indexed yet, returns how many were new."""
+        with self._lock:
+            return self._add(names)
+
+    def _add(self, names):
+        added = []
+        postings = {}
+        for name in names:
+            if name is None or name in self._ids:
+                continue
+            name_id = len(self._names)
+            folded = fold(name)
+            self._ids[name] = name_id
+            self._names.append(name)
+            self._folded.append(folded)
+            added.append((folded, name_id))
+            for gram in trigrams(folded):
+                postings.setdefault(gram, []).append(name_id)
+        for gram, ids in postings.items():
+            ids = np.array(ids, dtype=np.int32)
+            previous = self._postings.get(gram)
+            self._postings[gram] = ids if previous is None else np.concatenate([previous, ids])
+        if added:
+            # Two sorted runs, merged in linear time by Timsort
+            self._sorted.extend(sorted(added))
+            self._sorted.sort()
+        return len(added)
+
+    def search(self, text, limit=50):
+        """Names matching `text`, best first: exact, prefix, word prefix, substring."""
+        with self._lock:
+            return self._search(fold(text.strip()), limit)
+
+    def _search(self, query, limit):
+        if not query:
+            return [self._names[name_id] for _, name_id in self._sorted[:limit]]
+
+        # Prefix matches are a contiguous run of the sorted array, ranked
+        # whole before the best `limit` are kept
+        start = bisect.bisect_left(self._sorted, (query,))
+        end = bisect.bisect_left(self._sorted, (query[:-1] + chr(ord(query[-1]) + 1),), start)
+        prefixed = heapq.nsmallest(
+            limit, (name_id for _, name_id in self._sorted[start:end]),
+            key=lambda name_id: (self._folded[name_id] != query, len(self._folded[name_id])),
+        )
+        if len(prefixed) == limit or len(query) < 3:
+            return [self._names[name_id] for name_id in prefixed]
+
+        # Names containing every trigram of the query, intersected rarest first
+        postings = [self._postings.get(gram) for gram in trigrams(query)]
+        if any(posting is None for posting in postings):
+            return [self._names[name_id] for name_id in prefixed]
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                break
+
+        # Every candidate is verified, the trigrams can be in any order
+        seen = set(prefixed)
+        matches = []
+        for name_id in candidates.tolist():
+            folded = self._folded[name_id]
+            if name_id in seen or query not in folded:
+                continue
+            word_prefix = f" {query}" in folded
+            matches.append((not word_prefix, len(folded), folded, name_id))
+        ranked = prefixed + [name_id for *_, name_id in heapq.nsmallest(limit - len(prefixed), matches)]
+        return [self._names[name_id] for name_id in ranked]
+
+
+class DimensionSearch:
+    """ValueIndex of a dimension's names, kept in sync with the data mart.
+
+    The table's row count and highest id are re-checked at most every
+    `refresh_interval` seconds. Rows appended since the last check are added
+    to the index; any other change rebuilds it.
+    """
+
+    def __init__(self, pool, table, refresh_interval=60.0):
+        self.pool = pool
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def index(self):
+        with self._lock:
+            if self._index is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return self._index
+
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {self.table}")
+                    signature = cur.fetchone()
+                    if self._index is None:
+                        self._index = ValueIndex()
+                        self._signature = (0, 0)
+                    if signature != self._signature:
+                        count, max_id = self._signature
+                        cur.execute(f"SELECT name FROM {self.table} WHERE id > %s ORDER BY id", (max_id,))
+                        appended = [name for name, in cur.fetchall()]
+                        if count + len(appended) == signature[0]:
+                            self._index.add(appended)
+                        else:
+                            # Rows were deleted or reloaded, start over
+                            cur.execute(f"SELECT name FROM {self.table} ORDER BY id")
+                            self._index = ValueIndex(name for name, in cur.fetchall())
+                        self._signature = signature
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def search(self, text, limit=50):
+        return self.index().search(text, limit)
@@ -0,0 +1,288 @@
+from dataclasses import dataclass
+
+# Semantic layer of the data mart: the dimensions, hierarchies and measures of
+# the `sales` facts, declared once, and a compiler from a query (group-by
+# dimensions, filtered dimensions, measures) to a single statement over
+# `sales s`.
+#
+# Compiled statements only join what they use: d_dates when a date level is
+# grouped, and an attribute's relation after aggregation, on the grouped ids.
+# Dimension tables are never joined for their names, which
+# dimensions.DimensionCache looks up in memory. Filters are pushed down to the
+# fact columns: the values of any level of a hierarchy are resolved to ids of
+# its finest level (names to store ids, materials to product ids, years to
+# date ids) and bound as arrays.
+
+DATE_JOIN = "JOIN d_dates d ON s.date_id = d.id"
+DATE_FILTER = "s.date_id = ANY(%(date_ids)s)"
+DATE_PARAMS = {"date_ids": "int[]"}
+
+
+@dataclass(frozen=True)
+class Dimension:
+    name: str
+    # Label shown by the app
+    label: str
+    # Grouping key: a fact id column, or for a date level an integer that
+    # sorts in calendar order (year * 100 + month for months)
+    key: str = None
+    # Dimension table of the ids, and the attributes kept in memory for labels
+    table: str = None
+    attributes: tuple = ("name",)
+    # Date levels: the d_dates columns grouped and ordered by, and the label of a period
+    columns: str = None
+    period: str = None
+    # Attributes of another dimension: an (id, value) relation over the ids
+    # of their hierarchy's finest level
+    relation: str = None
+
+    @property
+    def is_date(self):
+        return self.columns is not None
+
+    @property
+    def is_attribute(self):
+        return self.relation is not None
+
+
+DIMENSIONS = {dim.name: dim for dim in (
+    Dimension("store", "Loja", "s.store_id", table="d_stores", attributes=("name", "location")),
+    Dimension("product", "Produto", "s.product_id", table="d_products", attributes=("name", "sku", "material")),
+    Dimension("customer", "Cliente", "s.customer_id", table="d_customers", attributes=("name", "email")),
+    Dimension("document_type", "Tipo de Documento", "s.document_type_id", table="d_document_types"),
+    Dimension("year", "Ano", "d.year::int", columns="d.year", period="d.year::text"),
+    Dimension(
+        "quarter", "Trimestre", "(d.year * 10 + CEILING(d.month::numeric / 3))::int",
+        columns="d.year, CEILING(d.month::numeric / 3)",
+        period="d.year::text || '-Q' || CEILING(d.month::numeric / 3)::text",
+    ),
+    Dimension(
+        "month", "Mês", "(d.year * 100 + d.month)::int",
+        columns="d.year, d.month", period="TO_CHAR(MAKE_DATE(d.year, d.month, 1), 'MM/YYYY')",
+    ),
+    Dimension(
+        "day", "Dia", "(d.year * 10000 + d.month * 100 + d.day)::int",
+        columns="d.year, d.month, d.day", period="TO_CHAR(MAKE_DATE(d.year, d.month, d.day), 'DD/MM/YYYY')",
+    ),
+    Dimension("material", "Material", relation="SELECT id, material AS value FROM d_products"),
+    Dimension("location", "Localização", relation="SELECT id, location AS value FROM d_stores"),
+    # A customer's city is the one of their latest address
+    Dimension("city", "Cidade", relation="""
+        SELECT DISTINCT ON (customer_id) customer_id AS id, city AS value
+        FROM d_customer_addresses
+        ORDER BY customer_id, created_at DESC, id DESC
+    """),
+)}
+
+# Levels of each hierarchy, coarsest first. The finest level is a column of
+# the facts: the date's ids are s.date_id.
+HIERARCHIES = {
+    "date": ("year", "quarter", "month", "day"),
+    "store": ("location", "store"),
+    "product": ("material", "product"),
+    "customer": ("city", "customer"),
+    "document_type": ("document_type",),
+}
+
+_BASE_LEVELS = {level: levels[-1] for levels in HIERARCHIES.values() for level in levels}
+
+
+def base_level(name):
+    """Finest level of the dimension's hierarchy, the ids its filters are bound as."""
+    return _BASE_LEVELS[name]
+
+
+def key_label(name, key):
+    """Label of a date level's integer key, the same as its period in SQL."""
+    if name == "day":
+        return f"{key % 100:02d}/{key // 100 % 100:02d}/{key // 10000}"
+    if name == "month":
+        return f"{key % 100:02d}/{key // 100}"
+    if name == "quarter":
+        return f"{key // 10}-Q{key % 10}"
+    return str(key)
+
+
+@dataclass(frozen=True)
+class Measure:
+    name: str
+    label: str
+    sql: str
+    # Postgres type of the values
+    pg_type: str
+    # Averages: the (sum, count) they're the ratio of, so partial groups can be added up
+    ratio: tuple = None
+
+
+MEASURES = {measure.name: measure for measure in (
+    Measure("total_sales", "Total Vendas", "SUM(s.total_amount)", "float8"),
+    Measure("num_transactions", "Número de Transações", "COUNT(s.id)", "bigint"),
+    Measure("total_quantity", "Quantidade Vendida", "SUM(s.quantity)", "bigint"),
+    Measure("avg_price", "Preço Médio", "AVG(s.unit_price)", "float8", ("SUM(s.unit_price)", "COUNT(s.id)")),
+    Measure(
+        "avg_transaction_value", "Valor Médio", "AVG(s.total_amount)", "float8",
+        ("SUM(s.total_amount)", "COUNT(s.id)"),
+    ),
+)}
+
+
+def filter_sql(filters):
+    """WHERE clause and parameter types of the date range and the filtered finest levels."""
+    predicates = [DATE_FILTER]
+    params = dict(DATE_PARAMS)
+    for name in filters:
+        predicates.append(f"{DIMENSIONS[name].key} = ANY(%({name}_ids)s)")
+        params[f"{name}_ids"] = "int[]"
+    return " AND ".join(predicates), params
+
+
+@dataclass(frozen=True)
+class Query:
+    # Group-by dimensions, in the order of the result's columns
+    dims: tuple = ()
+    measures: tuple = ("total_sales",)
+    # Filtered dimensions, bound as ids of their finest level
+    filters: tuple = ()
+    # "dims" orders by the dimensions (periods in calendar order), "total" by
+    # the first measure, highest first, and None leaves the order to Postgres
+    order: str = "dims"
+    # Keep only the first %(top_n)s rows
+    top_n: bool = False
+    # Date levels as their period label instead of their integer key
+    periods: bool = False
+
+    def normalized(self):
+        """The query in canonical form, so equivalent queries compile to the same statement.
+
+        Repeated dimensions and measures are dropped, and filters are
+        replaced by the sorted finest levels they are bound as; the date
+        hierarchy's are part of the date ids every query is filtered by.
+        """
+        unknown = [name for name in (*self.dims, *self.filters) if name not in DIMENSIONS]
+        unknown += [name for name in self.measures if name not in MEASURES]
+        if unknown:
+            raise ValueError(f"Unknown dimensions or measures: {', '.join(unknown)}")
+        if not self.measures:
+            raise ValueError("A query needs at least one measure")
+        if self.order not in ("dims", "total", None):
+            raise ValueError(f"Unknown order {self.order!r}")
+        dims = tuple(dict.fromkeys(self.dims))
+        filters = tuple(sorted({base_level(name) for name in self.filters} - {"day"}))
+        return Query(
+            dims,
+            tuple(dict.fromkeys(self.measures)),
+            filters,
+            self.order if dims or self.order != "dims" else None,
+            self.top_n,
+            self.periods and any(DIMENSIONS[name].is_date for name in dims),
+        )
+
+    @property
+    def id(self):
+        """Template id of the normalized query."""
+        query = self.normalized()
+        parts = ["query", "_".join(query.dims) or "total", "_".join(query.measures)]
+        if query.filters:
+            parts.append("where_" + "_".join(query.filters))
+        if query.order == "total":
+            parts.append("by_total")
+        if query.top_n:
+            parts.append("top")
+        if query.periods:
+            parts.append("periods")
+        return "__".join(parts)
+
+
+def compile_query(query):
+    """(SQL, parameter types) of a query, reading `sales s` with the fewest joins."""
+    query = query.normalized()
+    dims = [DIMENSIONS[name] for name in query.dims]
+    measures = [MEASURES[name] for name in query.measures]
+    where, params = filter_sql(query.filters)
+    if query.top_n:
+        params["top_n"] = "int"
+    date_join = DATE_JOIN if any(dim.is_date for dim in dims) else ""
+
+    if not any(dim.is_attribute for dim in dims):
+        select = []
+        group = []
+        for dim in dims:
+            if dim.is_date:
+                select.append(f"{dim.period if query.periods else dim.key} as {dim.name}")
+                group.append(dim.columns)
+            else:
+                select.append(f"{dim.key} as {dim.name}")
+                group.append(dim.key)
+        select += [f"{measure.sql} as {measure.name}" for measure in measures]
+        order = group
+        sql = f"""
+        SELECT {", ".join(select)}
+        FROM sales s
+        {date_join}
+        WHERE {where}"""
+        if group:
+            sql += f"""
+        GROUP BY {", ".join(group)}"""
+    else:
+        # Grouped by ids first, then by the attributes joined to the grouped rows
+        inner, inner_group, outer, outer_group, order, joins = [], [], [], [], [], []
+        for dim in dims:
+            if dim.is_attribute:
+                parent = DIMENSIONS[base_level(dim.name)]
+                if f"{parent.key} as {parent.name}_id" not in inner:
+                    inner.append(f"{parent.key} as {parent.name}_id")
+                    inner_group.append(parent.key)
+                joins.append(f"LEFT JOIN ({dim.relation.strip()}) {dim.name} ON {dim.name}.id = g.{parent.name}_id")
+                outer.append(f"{dim.name}.value as {dim.name}")
+                outer_group.append(f"{dim.name}.value")
+                order.append(f"{dim.name}.value")
+            elif dim.is_date:
+                inner.append(f"{dim.key} as {dim.name}")
+                inner_group.append(dim.columns)
+                if query.periods:
+                    inner.append(f"{dim.period} as {dim.name}_period")
+                    outer.append(f"g.{dim.name}_period as {dim.name}")
+                    outer_group.append(f"g.{dim.name}_period")
+                else:
+                    outer.append(f"g.{dim.name}")
+                outer_group.append(f"g.{dim.name}")
+                order.append(f"g.{dim.name}")
+            else:
+                inner.append(f"{dim.key} as {dim.name}")
+                inner_group.append(dim.key)
+                outer.append(f"g.{dim.name}")
+                outer_group.append(f"g.{dim.name}")
+                order.append(f"g.{dim.name}")
+        for measure in measures:
+            if measure.ratio is None:
+                inner.append(f"{measure.sql} as {measure.name}")
+                outer.append(f"SUM(g.{measure.name})::{measure.pg_type} as {measure.name}")
+            else:
+                total, count = measure.ratio
+                inner.append(f"{total} as {measure.name}_total, {count} as {measure.name}_count")
+                outer.append(
+                    f"(SUM(g.{measure.name}_total) / NULLIF(SUM(g.{measure.name}_count), 0))::{measure.pg_type}"
+                    f" as {measure.name}"
+                )
+        sql = f"""
+        SELECT {", ".join(outer)}
+        FROM (
+            SELECT {", ".join(inner)}
+            FROM sales s
+            {date_join}
+            WHERE {where}
+            GROUP BY {", ".join(inner_group)}
+        ) g
+        {" ".join(joins)}
+        GROUP BY {", ".join(dict.fromkeys(outer_group))}"""
+
+    if query.order == "dims":
+        sql += f"""
+        ORDER BY {", ".join(order)}"""
+    elif query.order == "total":
+        sql += f"""
+        ORDER BY {measures[0].name} DESC"""
+    if query.top_n:
+        sql += """
+        LIMIT %(top_n)s"""
+    return sql + "\n", params
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pyarrow as pa
+
+from hierarchy import DateHierarchy
+from incremental import Watermarked
+from streaming import FrameResult
+
+# Second level of the result cache, on disk and shared by every Streamlit
+# process of the host, so a query computed by one worker is a hit for the
+# others and survives restarts. Entries live in one SQLite database in WAL
+# mode (concurrent readers, one writer at a time across processes), each
+# result serialized as an uncompressed Arrow IPC stream that is read back
+# without copying its buffers. Every key keeps only its latest result, with
+# the data version it was computed for.
+
+DEFAULT_MAX_BYTES = 1024 * 2**20
+# Seconds a writer waits for another process's write to finish
+BUSY_TIMEOUT = 30.0
+# Hits only move an entry up the LRU once this many seconds have passed
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS results (
+        key text PRIMARY KEY,
+        version text NOT NULL,
+        kind text NOT NULL,
+        data blob NOT NULL,
+        size integer NOT NULL,
+        expires_at real NOT NULL,
+        used_at real NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS results_used_at_idx ON results (used_at);
+"""
+
+
+def cache_key(key):
+    """Digest of a normalized cache key, the same in every process."""
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def _rows_table(rows, metadata):
+    columns = list(zip(*rows)) if rows else []
+    table = pa.table({f"c{i}": pa.array(column) for i, column in enumerate(columns)})
+    return table.replace_schema_metadata({**metadata, "rows": str(len(rows))})
+
+
+def _table_rows(table):
+    if not table.num_columns:
+        return [()] * int(table.schema.metadata[b"rows"])
+    return list(zip(*(column.to_pylist() for column in table.columns)))
+
+
+def encode(result):
+    """(kind, Arrow IPC bytes) of a cached result, None for a type that isn't stored."""
+    metadata = {}
+    kind = ""
+    if isinstance(result, Watermarked):
+        metadata = {"low_id": json.dumps(result.low_id), "high_id": json.dumps(result.high_id)}
+        kind = "watermarked:"
+        result = result.result
+    if isinstance(result, FrameResult):
+        table = pa.Table.from_pandas(result.frame, preserve_index=False).replace_schema_metadata(
+            {**metadata, "truncated": json.dumps(result.truncated), "bytes": str(result.bytes)}
+        )
+        kind += "frame"
+    elif isinstance(result, DateHierarchy):
+        table = _rows_table(result.to_rows(), metadata)
+        kind += "hierarchy"
+    elif isinstance(result, list):
+        table = _rows_table(result, metadata)
+        kind += "rows"
+    else:
+        return None
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return kind, sink.getvalue().to_pybytes()
+
+
+def decode(kind, data):
+    table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+    metadata = table.schema.metadata or {}
+    watermarked = kind.startswith("watermarked:")
+    kind = kind.removeprefix("watermarked:")
+    if kind == "frame":
+        frame = table.to_pandas(split_blocks=True)
+        result = FrameResult(frame, json.loads(metadata[b"truncated"]), len(frame), int(metadata[b"bytes"]))
+    elif kind == "hierarchy":
+        result = DateHierarchy(_table_rows(table))
+    else:
+        result = _table_rows(table)
+    if watermarked:
+        result = Watermarked(result, json.loads(metadata[b"low_id"]), json.loads(metadata[b"high_id"]))
+    return result
+
+
+class SharedCache:
+    """Results on disk at `path`, bounded by `max_bytes` of serialized data.
+
+    The least recently used entries are evicted first. Any error reading or
+    writing the database is counted and treated as a miss, the in-memory cache
+    keeps working without it.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes}")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **counters):
+        with self._lock:
+            for name, increment in counters.items():
+                setattr(self, name, getattr(self, name) + increment)
+
+    def get(self, key, version):
+        """(current, result) of the latest result stored for `key`, None if there is none.
+
+        `current` is False for a result of another data version.
+        """
+        digest = cache_key(key)
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT version, kind, data, expires_at, used_at FROM results WHERE key = ?", (digest,)
+            ).fetchone()
+            now = time.time()
+            if row is None or row[3] <= now:
+                self._count(misses=1)
+                return None
+            if now - row[4] > TOUCH_INTERVAL:
+                conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (now, digest))
+            result = decode(row[1], row[2])
+        except (sqlite3.Error, pa.ArrowException, KeyError, ValueError):
+            self._count(errors=1)
+            return None
+        current = row[0] == repr(version)
+        self._count(**{"hits" if current else "misses": 1})
+        return current, result
+
+    def put(self, key, result, version, ttl):
+        try:
+            encoded = encode(result)
+        except (pa.ArrowException, TypeError, ValueError):
+            # e.g. a column mixing types Arrow can't hold together
+            encoded = None
+        if encoded is None:
+            return
+        kind, data = encoded
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key(key), repr(version), kind, data, len(data), now + ttl, now),
+                )
+                evicted = self._evict(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            self._count(errors=1)
+            return
+        self._count(writes=1, evictions=evicted)
+
+    def _evict(self, conn):
+        # Expired entries first, then the least recently used until under max_bytes
+        evicted = conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - self.max_bytes
+        if excess > 0:
+            keys = []
+            for key, size in conn.execute("SELECT key, size FROM results ORDER BY used_at"):
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM results WHERE key = ?", keys)
+            evicted += len(keys)
+        return evicted
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM results")
+        except sqlite3.Error:
+            self._count(errors=1)
+
+    def stats(self):
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        with self._lock:
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
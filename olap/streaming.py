@@ -0,0 +1,84 @@
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from aggregates import FACT_TABLE
+from queries import TEMPLATES
+
+# Fetching of large results through named (server-side) cursors: rows come
+# from Postgres `itersize` at a time and are turned into DataFrame chunks, so
+# only one chunk of Python tuples is alive at any moment.
+#
+# These are the only template queries not run with queries.execute's
+# PREPARE/EXECUTE. psycopg2 opens a named cursor with DECLARE ... CURSOR FOR,
+# which only takes a SELECT or VALUES, not an EXECUTE of a prepared statement,
+# and it has no protocol-level portals to page through one. The template's
+# fixed SQL is sent with its values bound by the driver instead, so it is
+# planned on every call, with cursor_tuple_fraction favouring the first rows.
+# Streamed views are the ones with the longest results, where that planning
+# is a small share of the query's time.
+
+DEFAULT_ITERSIZE = 10_000
+
+FrameResult = namedtuple("FrameResult", ["frame", "truncated", "rows", "bytes"])
+
+
+def stream(conn, template_id, values, source=FACT_TABLE, itersize=DEFAULT_ITERSIZE, timing=None):
+    """Yields the rows of a template in lists of at most `itersize` rows.
+
+    When given, `timing` gets the seconds until the first chunk in "first_row".
+    """
+    template = TEMPLATES[template_id]
+    start = time.perf_counter()
+    with conn.cursor(name=f"olap_stream_{template_id}") as cur:
+        cur.itersize = itersize
+        cur.execute(template.source_sql(source), template.unbind(values))
+        while True:
+            rows = cur.fetchmany(itersize)
+            if timing is not None and "first_row" not in timing:
+                timing["first_row"] = time.perf_counter() - start
+            if not rows:
+                break
+            yield rows
+
+
+def iter_frames(conn, template_id, values, columns, source=FACT_TABLE, itersize=DEFAULT_ITERSIZE, timing=None):
+    for rows in stream(conn, template_id, values, source, itersize, timing):
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def fetch_frame(conn, template_id, values, columns, source=FACT_TABLE, itersize=DEFAULT_ITERSIZE,
+                max_rows=None, max_bytes=None, timing=None):
+    """Builds the DataFrame of a template chunk by chunk.
+
+    Stops once `max_rows` rows or `max_bytes` bytes of DataFrame memory are
+    reached, in which case the result is flagged as truncated.
+    """
+    chunks = []
+    rows = 0
+    size = 0
+    truncated = False
+    frames = iter_frames(conn, template_id, values, columns, source, itersize, timing)
+    try:
+        for chunk in frames:
+            if max_rows is not None and rows + len(chunk) > max_rows:
+                chunk = chunk.iloc[:max_rows - rows]
+                truncated = True
+            chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+            if max_bytes is not None and size + chunk_bytes > max_bytes:
+                # Keep the share of the chunk that still fits
+                keep = int(len(chunk) * (max_bytes - size) / chunk_bytes) if chunk_bytes else 0
+                chunk = chunk.iloc[:max(keep, 0)]
+                chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+                truncated = True
+            chunks.append(chunk)
+            rows += len(chunk)
+            size += chunk_bytes
+            if truncated:
+                break
+    finally:
+        frames.close()
+
+    frame = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    return FrameResult(frame, truncated, rows, size)
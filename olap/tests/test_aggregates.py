@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from aggregates import FACT_TABLE, Aggregate, Navigator, fact_dimensions, rewrite
+from dates import DateIndex
+
+SQL = """
+    SELECT s.store_id, SUM(s.total_amount), COUNT(s.id), AVG(s.unit_price)
+    FROM sales s
+    JOIN d_dates d ON s.date_id = d.id
+    WHERE s.date_id = ANY(%(date_ids)s)
+    GROUP BY s.store_id
+"""
+
+
+def test_rewrite_reads_the_aggregate_measures():
+    sql = rewrite(SQL, "agg_sales_day_store_doctype")
+
+    assert "FROM agg_sales_day_store_doctype s" in sql
+    assert "SUM(s.row_count)::bigint" in sql
+    assert "(SUM(s.unit_price_sum) / SUM(s.row_count))" in sql
+    assert "SUM(s.total_amount)" in sql
+
+
+def test_rewrite_rejects_columns_that_arent_aggregated():
+    with pytest.raises(ValueError):
+        rewrite("SELECT s.document_num FROM sales s", "agg_sales_day_customer")
+    with pytest.raises(ValueError):
+        rewrite("SELECT id FROM d_dates", "agg_sales_day_customer")
+
+
+def test_fact_dimensions():
+    assert fact_dimensions(SQL) == {"store"}
+
+
+def test_swap_renames_the_staging_table_and_its_indexes():
+    aggregate = Aggregate("agg_sales_day_customer", "day", ("customer",))
+
+    assert aggregate.index_sql("staging") == [
+        "CREATE INDEX staging_date_id_idx ON staging (date_id)",
+        "CREATE INDEX staging_customer_id_idx ON staging (customer_id, date_id)",
+    ]
+    assert aggregate.swap_sql("staging")[1:] == [
+        "ALTER TABLE staging RENAME TO agg_sales_day_customer",
+        "ALTER INDEX staging_date_id_idx RENAME TO agg_sales_day_customer_date_id_idx",
+        "ALTER INDEX staging_customer_id_idx RENAME TO agg_sales_day_customer_customer_id_idx",
+    ]
+
+
+def navigator(catalog, rows):
+    # Catalog as already read, smallest aggregate first
+    navigator = Navigator(pool=None, date_index=lambda: DateIndex(rows), refresh_interval=3600)
+    navigator._catalog = [(name, grain, frozenset(dims), count) for name, grain, dims, count in catalog]
+    navigator._checked_at = time.monotonic()
+    return navigator
+
+
+DATES = [(day, 2024, 1, day) for day in range(1, 32)] + [(32, 2024, 2, 1)]
+CATALOG = [
+    ("agg_sales_month_store", "month", ("store", "document_type"), 10),
+    ("agg_sales_day_store", "day", ("store", "document_type"), 100),
+]
+
+
+def test_route_picks_the_smallest_aggregate_that_fits():
+    assert navigator(CATALOG, DATES).route(SQL, list(range(1, 32))) == "agg_sales_month_store"
+
+
+def test_route_skips_monthly_aggregates_for_partial_months_and_days():
+    assert navigator(CATALOG, DATES).route(SQL, list(range(1, 31))) == "agg_sales_day_store"
+    daily = SQL.replace("GROUP BY s.store_id", "GROUP BY s.store_id, d.day")
+    assert navigator(CATALOG, DATES).route(daily, list(range(1, 32))) == "agg_sales_day_store"
+
+
+def test_route_falls_back_to_the_facts():
+    by_customer = SQL.replace("s.store_id", "s.customer_id")
+    assert navigator(CATALOG, DATES).route(by_customer) == FACT_TABLE
+    assert navigator(CATALOG, DATES).route(SQL.replace("AVG(s.unit_price)", "MAX(s.document_num)")) == FACT_TABLE
@@ -0,0 +1,69 @@
+from cache import ResultCache, freeze
+
+ROWS = [("a", 1.0)]
+
+
+def test_hits_need_the_same_data_version():
+    cache = ResultCache()
+    cache.put("key", ROWS, 1)
+
+    assert cache.get("key", 1) == (True, ROWS)
+    assert cache.get("key", 2) == (False, None)
+    assert cache.pop_outdated("key", 2) == ROWS
+    assert cache.pop_outdated("key", 2) is None
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", ROWS, 1)
+    cache.put("b", ROWS, 1)
+    cache.get("a", 1)
+    cache.put("c", ROWS, 1)
+
+    assert cache.get("b", 1) == (False, None)
+    assert cache.get("a", 1)[0] and cache.get("c", 1)[0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = ResultCache()
+    cache.put("key", ROWS, 1, ttl=0)
+
+    assert cache.get("key", 1) == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+
+def test_results_larger_than_the_cache_arent_stored():
+    cache = ResultCache(max_bytes=10)
+    cache.put("key", ROWS, 1)
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_or_compute_refreshes_outdated_results():
+    cache = ResultCache()
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return ROWS
+
+    assert cache.get_or_compute("sales_by_store", [[1, 2]], compute, 1) == ROWS
+    assert cache.get_or_compute("sales_by_store", [[1, 2]], compute, 1) == ROWS
+    assert len(computed) == 1
+
+    refreshed = cache.get_or_compute("sales_by_store", [[1, 2]], compute, 2, refresh=lambda rows: rows + ROWS)
+    assert refreshed == ROWS + ROWS
+    assert len(computed) == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_failed_queries_arent_cached():
+    cache = ResultCache()
+
+    assert cache.get_or_compute("sales_by_store", [], lambda: None, 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_freeze_makes_bound_values_hashable():
+    assert freeze([[1, 2], "x", None]) == ((1, 2), "x", None)
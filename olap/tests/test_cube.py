@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from cube import Cube
+from db import ConnectionPool
+from queries import TEMPLATES, execute
+
+# Runs every template the cube answers on the same facts in Postgres and in
+# the cube. The fixture is loaded into temporary tables, which shadow the
+# data mart's for the session, so any database will do.
+DATABASE_URL = os.getenv("OLAP_TEST_POSTGRES_URI")
+
+FIXTURE = """
+    CREATE TEMP TABLE d_stores (id smallint, name text, location text);
+    CREATE TEMP TABLE d_document_types (id smallint, name text);
+    CREATE TEMP TABLE d_products (id int, name text, sku text, material text);
+    CREATE TEMP TABLE d_customers (id int, name text, email text);
+    CREATE TEMP TABLE d_dates (id int, year smallint, month smallint, day smallint);
+    CREATE TEMP TABLE sales (
+        id bigint, quantity smallint, unit_price float8, total_amount float8, date_id int,
+        customer_id int, store_id smallint, product_id int, document_type_id smallint, document_num int
+    );
+    INSERT INTO d_stores VALUES (1, 'Loja A', 'Viseu'), (2, 'Loja B', 'Porto'), (3, 'Loja C', 'Viseu');
+    INSERT INTO d_document_types VALUES (1, 'Fatura'), (2, 'Recibo');
+    INSERT INTO d_products VALUES (1, 'Pão', 'P1', 'Trigo'), (2, 'Bolo', 'P2', NULL), (3, 'Broa', 'P3', 'Milho');
+    INSERT INTO d_customers VALUES (1, 'Ana', 'ana@x.pt'), (2, 'Rui', 'rui@x.pt');
+    INSERT INTO d_dates VALUES (1, 2023, 12, 31), (2, 2024, 1, 1), (3, 2024, 1, 15), (4, 2024, 2, 29), (5, 2024, 7, 1);
+    -- Amounts whose float sums aren't exact, e.g. 0.1 + 0.2
+    INSERT INTO sales
+    SELECT i, 1 + i % 3, 0, (ARRAY[0.1, 0.2, 0.7, 19.99, 1234.56])[1 + i % 5] + i % 4,
+           1 + i % 5, 1 + i % 2, 1 + i % 3, 1 + (i * 7) % 3, 1 + i % 2, i
+    FROM generate_series(1, 500) i;
+"""
+
+
+@pytest.fixture(scope="module")
+def conn():
+    if not DATABASE_URL:
+        pytest.skip("OLAP_TEST_POSTGRES_URI isn't set")
+    pool = ConnectionPool(DATABASE_URL, minconn=0, maxconn=1)
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(FIXTURE)
+            conn.commit()
+            yield conn
+    finally:
+        pool.close()
+
+
+def bind(template_id):
+    params = {}
+    for name, _ in TEMPLATES[template_id].params:
+        params[name] = [1, 2, 4, 5] if name == "date_ids" else [1, 3]
+    return TEMPLATES[template_id].bind(params)
+
+
+def cents(rows):
+    return [tuple(round(value, 2) if isinstance(value, float) else value for value in row) for row in rows]
+
+
+def test_cube_matches_every_template_it_answers(conn):
+    cube = Cube.load(conn)
+    answered = [template_id for template_id in TEMPLATES if cube.supports(template_id)]
+    assert answered
+
+    for template_id in answered:
+        values = bind(template_id)
+        expected = cents(execute(conn, template_id, values))
+        got = cents(cube.execute(template_id, values))
+        conn.rollback()
+        if TEMPLATES[template_id].query.order is None:
+            expected, got = sorted(expected), sorted(got)
+        assert got == expected, template_id
+
+
+def test_cube_sums_cents_exactly(conn):
+    cube = Cube.load(conn)
+
+    (_, total), = cube.group(["year"], cube.rows_in_dates([2, 3, 4, 5]))
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT SUM(ROUND(total_amount * 100)) / 100 FROM sales WHERE date_id <> 1")
+        exact = float(cur.fetchone()[0])
+    conn.rollback()
+    assert total == exact
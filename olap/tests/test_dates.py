@@ -0,0 +1,32 @@
+from datetime import date
+
+from dates import DateIndex
+
+# Ids in load order, not calendar order: all of February 2024 and two days of March
+ROWS = [(10 + day, 2024, 2, day) for day in range(1, 30)] + [(5, 2024, 3, 2), (1, 2024, 3, 1)]
+
+
+def test_resolve_maps_a_calendar_range_to_its_ids():
+    index = DateIndex(ROWS)
+
+    assert index.resolve(date(2024, 2, 28), date(2024, 3, 1)).ids == (1, 38, 39)
+    assert len(index.resolve()) == 31
+    assert not index.resolve(date(2025, 1, 1))
+    assert (index.first, index.last) == (date(2024, 2, 1), date(2024, 3, 2))
+
+
+def test_restrict_keeps_the_dates_in_the_given_periods():
+    index = DateIndex(ROWS)
+    selection = index.resolve(date(2024, 2, 29), date(2024, 3, 2))
+
+    assert index.restrict(selection, "month", [202403]).ids == (1, 5)
+    assert index.restrict(selection, "quarter", ["20241"]).ids == (1, 5, 39)
+    assert index.restrict(selection, "year", [2023]).ids == ()
+
+
+def test_covers_whole_months():
+    index = DateIndex(ROWS)
+
+    assert index.covers_whole_months(index.resolve(date(2024, 2, 1), date(2024, 2, 29)).ids)
+    assert index.covers_whole_months(index.resolve().ids)
+    assert not index.covers_whole_months(index.resolve(date(2024, 2, 2), date(2024, 3, 2)).ids)
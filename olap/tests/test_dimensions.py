@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+
+from dimensions import DimensionCache
+
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        # d_products rows are (id, name, sku, material), the small dimensions are empty
+        ids = params[0] if params else []
+        self.rows = [(i, f"Produto {i}", f"SKU{i}", "Madeira" if i % 2 else "Vidro") for i in ids]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakePool:
+    @contextmanager
+    def connection(self):
+        class Connection:
+            def cursor(self):
+                return FakeCursor()
+
+        yield Connection()
+
+
+def test_attributes_larger_than_the_lru_keep_every_label():
+    cache = DimensionCache(FakePool(), version=lambda: 1, max_lazy_rows=10)
+    ids = list(range(1, 51))
+
+    names = cache.attributes("product", ids, ("name",))
+
+    assert names == [(f"Produto {i}",) for i in ids]
+    assert len(cache._rows["product"]) == 10
+
+
+def test_rollup_larger_than_the_lru_counts_every_member():
+    cache = DimensionCache(FakePool(), version=lambda: 1, max_lazy_rows=10)
+    rows = [(i, 1.0) for i in range(1, 51)]
+
+    rolled_up = cache.label("rollup_material", rows)
+
+    assert sorted(rolled_up) == [("Madeira", 25.0, 25), ("Vidro", 25.0, 25)]
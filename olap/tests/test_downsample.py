@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from downsample import downsample, lttb, minmax
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    y = np.zeros(100)
+    y[37] = 10.0
+    y[71] = -10.0
+
+    picked = lttb(np.arange(100, dtype=np.float64), y, 10)
+
+    assert len(picked) == 10
+    assert picked[0] == 0 and picked[-1] == 99
+    assert {37, 71} <= set(picked.tolist())
+    assert (np.diff(picked) > 0).all()
+
+
+def test_lttb_returns_every_point_of_a_short_series():
+    assert lttb(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_minmax_keeps_the_lowest_and_highest_point_of_each_bucket_in_order():
+    y = np.array([5.0, 1.0, 9.0, 3.0, 4.0, 8.0, 0.0, 2.0])
+
+    assert minmax(y, 4).tolist() == [1, 2, 5, 6]
+
+
+def test_downsample_picks_frame_rows():
+    frame = pd.DataFrame({"Período": range(1000), "Total Vendas": np.sin(np.arange(1000) / 50)})
+
+    assert downsample(frame, "Total Vendas", 2000) is frame
+    sampled = downsample(frame, "Total Vendas", 100, "minmax")
+    assert len(sampled) <= 100
+    assert sampled["Total Vendas"].max() == frame["Total Vendas"].max()
@@ -0,0 +1,39 @@
+import gzip
+import tempfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from exports import ExportReader, export_frame
+
+FRAME = pd.DataFrame([["Loja A", 1.5, None], ["Loja B", 2.0, 3.25]], columns=["Loja", "01/2024", "Total"])
+
+
+def test_reader_streams_the_spooled_file():
+    with tempfile.SpooledTemporaryFile(max_size=4) as spool:
+        spool.write(b"Loja,Total\nLoja A,1.5\n")
+        reader = ExportReader(spool)
+
+        assert reader.size == 22
+        reader.seek(0)
+        assert reader.read() == b"Loja,Total\nLoja A,1.5\n"
+
+
+def test_frame_exports_as_csv_with_its_columns():
+    with export_frame(FRAME, "csv") as exported:
+        assert exported.read().decode() == "Loja,01/2024,Total\nLoja A,1.5,\nLoja B,2.0,3.25\n"
+
+
+def test_frame_exports_as_gzip_csv():
+    with export_frame(FRAME, "csv.gz") as exported:
+        assert gzip.decompress(exported.read()).decode().splitlines()[0] == "Loja,01/2024,Total"
+
+
+def test_frame_exports_as_parquet_with_repeated_column_names():
+    frame = FRAME.set_axis(["Produto", "Pão", "Pão"], axis=1)
+
+    with export_frame(frame, "parquet") as exported:
+        table = pq.ParquetFile(exported).read()
+
+    assert table.column_names == ["Produto", "Pão", "Pão"]
+    assert table.column(2).to_pylist() == [None, 3.25]
@@ -0,0 +1,49 @@
+from hierarchy import DateHierarchy
+
+# Rows of the date_hierarchy ROLLUP: (GROUPING(), year, quarter, month, day, total)
+ROWS = [
+    (0, 2024, 1, 1, 5, 10.0),
+    (0, 2024, 1, 1, 20, 5.0),
+    (0, 2024, 1, 2, 1, 7.0),
+    (0, 2023, 4, 12, 31, 3.0),
+    (1, 2024, 1, 1, None, 15.0),
+    (1, 2024, 1, 2, None, 7.0),
+    (1, 2023, 4, 12, None, 3.0),
+    (3, 2024, 1, None, None, 22.0),
+    (3, 2023, 4, None, None, 3.0),
+    (7, 2024, None, None, None, 22.0),
+    (7, 2023, None, None, None, 3.0),
+    (15, None, None, None, None, 25.0),
+]
+
+
+def test_levels_are_labeled_like_the_templates_in_calendar_order():
+    hierarchy = DateHierarchy(ROWS)
+
+    assert hierarchy.total == 25.0
+    assert hierarchy.rows("year") == [("2023", 3.0), ("2024", 22.0)]
+    assert hierarchy.rows("year", numeric_year=True) == [(2023, 3.0), (2024, 22.0)]
+    assert hierarchy.rows("quarter") == [("2023-Q4", 3.0), ("2024-Q1", 22.0)]
+    assert hierarchy.rows("month") == [("12/2023", 3.0), ("01/2024", 15.0), ("02/2024", 7.0)]
+    assert hierarchy.rows("day")[0] == ("31/12/2023", 3.0)
+
+
+def test_drilling_into_a_period():
+    hierarchy = DateHierarchy(ROWS)
+
+    assert hierarchy.periods("month", (2024, 1)) == [((2024, 1, 1), 15.0), ((2024, 1, 2), 7.0)]
+    assert hierarchy.subtotal((2024, 1, 1)) == 15.0
+    assert hierarchy.subtotal((2022,)) is None
+
+
+def test_pages_of_periods_start_after_a_key():
+    hierarchy = DateHierarchy(ROWS)
+
+    assert hierarchy.periods_after("day", limit=2) == [((2023, 4, 12, 31), 3.0), ((2024, 1, 1, 5), 10.0)]
+    assert hierarchy.periods_after("day", (2024, 1, 1, 5), 5) == [((2024, 1, 1, 20), 5.0), ((2024, 1, 2, 1), 7.0)]
+
+
+def test_round_trip_through_the_template_rows():
+    hierarchy = DateHierarchy(ROWS)
+
+    assert sorted(DateHierarchy(hierarchy.to_rows()).to_rows(), key=str) == sorted(ROWS, key=str)
@@ -0,0 +1,58 @@
+import pytest
+
+from incremental import Fold, delta_sql, fold_of, fold_rows, query_fold
+from queries import TEMPLATES
+from semantic import Query
+
+
+def test_delta_sql_reads_only_the_sales_above_the_watermark():
+    sql = delta_sql("SELECT SUM(s.total_amount) FROM sales s WHERE s.date_id = ANY(%(date_ids)s)")
+
+    assert "FROM (SELECT * FROM sales WHERE id > %(watermark)s) s WHERE" in sql
+
+
+def test_delta_sql_rejects_queries_not_over_the_facts():
+    with pytest.raises(ValueError):
+        delta_sql("SELECT id FROM d_dates")
+
+
+def test_fold_rows_adds_sums_and_recomputes_ratios():
+    # (period, total sales, transactions, average transaction value)
+    fold = Fold(1, ("sum", "sum", ("ratio", 0, 1)))
+    rows = [("2024", 100.0, 4, 25.0)]
+    delta = [("2024", 50.0, 1, 50.0), ("2025", 10.0, 2, 5.0)]
+
+    assert sorted(fold_rows(fold, rows, delta)) == [("2024", 150.0, 5, 30.0), ("2025", 10.0, 2, 5.0)]
+
+
+def test_folded_periods_keep_the_calendar_order():
+    fold = query_fold(Query(("month",), periods=True).normalized())
+
+    rows = fold_rows(fold, [("02/2024", 1.0), ("12/2024", 1.0)], [("01/2025", 1.0), ("03/2024", 1.0)])
+
+    assert [row[0] for row in rows] == ["02/2024", "03/2024", "12/2024", "01/2025"]
+
+
+def test_folded_quarters_keep_the_calendar_order():
+    fold = query_fold(Query(("quarter",), periods=True).normalized())
+
+    rows = fold_rows(fold, [("2024-Q2", 1.0)], [("2023-Q4", 1.0), ("2024-Q1", 1.0)])
+
+    assert [row[0] for row in rows] == ["2023-Q4", "2024-Q1", "2024-Q2"]
+
+
+def test_folded_totals_are_ordered_highest_first():
+    fold = query_fold(Query(("store",), ("total_sales", "num_transactions"), order="total").normalized())
+
+    rows = fold_rows(fold, [(1, 10.0, 1), (2, 5.0, 1)], [(2, 20.0, 3)])
+
+    assert rows == [(2, 25.0, 4), (1, 10.0, 1)]
+
+
+def test_queries_that_cant_be_folded_are_recomputed():
+    # Top-N cuts, averages without their sum and count, and attributes
+    assert query_fold(Query(("product",), order="total", top_n=True).normalized()) is None
+    assert query_fold(Query(("store",), ("avg_price",)).normalized()) is None
+    assert query_fold(Query(("material",)).normalized()) is None
+    assert fold_of(TEMPLATES["sales_by_store"]) is not None
+    assert fold_of(TEMPLATES["date_hierarchy"]) == Fold(5, ("sum",))
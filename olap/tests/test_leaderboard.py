@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+from leaderboard import PARTIAL_BYTES, Leaderboard, Partials
+
+# (id, date id, product id, total amount, quantity, unit price) of the fake fact table
+SALES = [
+    (1, 1, 10, 5.0, 1, 5.0),
+    (2, 1, 10, 4.0, 1, 4.0),
+    (3, 1, 20, 7.0, 2, 3.5),
+    (4, 2, 20, 1.0, 1, 1.0),
+    (5, 2, 30, 9.5, 3, 3.0),
+]
+
+
+class FakeCursor:
+    def __init__(self, sales):
+        self.sales = sales
+        self.rows = []
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if "MIN(id)" in sql:
+            ids = [sale[0] for sale in self.sales]
+            self.rows = [(min(ids, default=None), max(ids, default=None))]
+            return
+        after, until = params
+        groups = {}
+        for sale_id, date_id, entity_id, amount, quantity, price in self.sales:
+            if after < sale_id <= until:
+                sums = groups.setdefault((date_id, entity_id), [0.0, 0, 0.0, 0])
+                for i, value in enumerate((amount, quantity, price, 1)):
+                    sums[i] += value
+        self.rows = [(*key, *sums) for key, sums in groups.items()]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+
+class FakePool:
+    def __init__(self, sales):
+        self.sales = list(sales)
+        self.folds = 0
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Connection:
+            def cursor(self, name=None):
+                if name is not None:
+                    pool.folds += 1
+                return FakeCursor(pool.sales)
+
+            def rollback(self):
+                pass
+
+        yield Connection()
+
+
+def partials(*rows):
+    return Partials.from_rows(list(rows))
+
+
+def test_merge_sums_partials_of_the_same_date_and_entity():
+    merged = partials((2, 10, 1.0, 1, 1.0, 1), (1, 10, 2.0, 1, 2.0, 1)).merge(
+        partials((1, 10, 3.0, 2, 1.5, 2), (1, 20, 4.0, 1, 4.0, 1))
+    )
+
+    assert list(zip(merged.date_ids, merged.entity_ids)) == [(1, 10), (1, 20), (2, 10)]
+    assert merged.total_amount.tolist() == [5.0, 4.0, 1.0]
+    assert merged.row_count.tolist() == [3, 1, 1]
+    assert merged.rows_in([2, 3]).tolist() == [2]
+
+
+def test_top_ranks_the_entities_of_the_dates():
+    board = Leaderboard(FakePool(SALES), "product", version=lambda: 1)
+
+    assert board.top([1, 2], 2) == [(30, 9.5, 3, 1, 3.0), (10, 9.0, 2, 2, 9.0)]
+    assert board.top([1], 5) == [(10, 9.0, 2, 2, 9.0), (20, 7.0, 2, 1, 3.5)]
+
+
+def test_new_sales_are_folded_in_on_a_new_version():
+    pool = FakePool(SALES[:3])
+    version = [1]
+    board = Leaderboard(pool, "product", version=lambda: version[0])
+    assert board.top([1, 2], 1) == [(10, 9.0, 2, 2, 9.0)]
+
+    pool.sales = list(SALES)
+    assert board.top([1, 2], 1) == [(10, 9.0, 2, 2, 9.0)]
+    version[0] = 2
+    assert board.top([1, 2], 1) == [(30, 9.5, 3, 1, 3.0)]
+    assert pool.folds == 2
+
+
+def test_partials_over_the_budget_are_dropped_until_the_next_version():
+    version = [1]
+    board = Leaderboard(FakePool(SALES), "product", version=lambda: version[0], memory_budget=3 * PARTIAL_BYTES)
+
+    assert board.partials() is None
+    assert board.top([1, 2], 3) is None
+
+    board.memory_budget = 10 * PARTIAL_BYTES
+    assert board.top([1, 2], 3) is None
+    version[0] = 2
+    assert len(board.partials()) == 4
+    assert isinstance(board.partials().total_amount, np.ndarray)
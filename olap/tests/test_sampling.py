@@ -0,0 +1,32 @@
+import pytest
+
+from sampling import MARGIN_SQL, SAMPLE_TABLE, estimate_sql, tablesample_source
+
+SQL = """
+        SELECT s.store_id as store, SUM(s.total_amount) as total_sales, COUNT(s.id) as num_transactions
+        FROM sales s
+        WHERE s.date_id = ANY(%(date_ids)s)
+        GROUP BY s.store_id
+"""
+
+
+def test_measures_are_weighted_sums_over_the_sample():
+    sql = estimate_sql(SQL, SAMPLE_TABLE)
+
+    assert "SUM(s.total_amount * s.weight) as total_sales" in sql
+    assert "ROUND(SUM(s.weight))::bigint as num_transactions" in sql
+    assert f"as num_transactions,\n        {MARGIN_SQL}\n    FROM sales_sample s\n" in sql
+    assert "GROUP BY s.store_id" in sql
+
+
+def test_tablesample_weights_every_row_by_the_rate():
+    sql = estimate_sql(SQL, tablesample_source(0.05))
+
+    assert "SELECT *, 20.0::float8 AS weight FROM sales TABLESAMPLE BERNOULLI (5.0)" in sql
+
+
+def test_queries_that_dont_sum_sales_cant_be_estimated():
+    with pytest.raises(ValueError):
+        estimate_sql(SQL.replace("SUM(s.total_amount)", "MAX(s.total_amount)"), SAMPLE_TABLE)
+    with pytest.raises(ValueError):
+        estimate_sql("SELECT SUM(total_amount) FROM agg_sales_day_store s", SAMPLE_TABLE)
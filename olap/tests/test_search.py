@@ -0,0 +1,47 @@
+from search import ValueIndex, fold
+
+
+def test_fold_ignores_case_and_accents():
+    assert fold("Aroma da Sé") == "aroma da se"
+
+
+def test_exact_then_shorter_prefix_matches_first():
+    index = ValueIndex(["Pão de Ló", "Pão", "Pão Caseiro", "Broa"])
+
+    assert index.search("pao") == ["Pão", "Pão de Ló", "Pão Caseiro"]
+
+
+def test_best_prefix_matches_are_kept_when_the_run_is_longer_than_the_limit():
+    # The short name sorts last among the prefix matches
+    names = [f"Produto {i:03d} extra" for i in range(100)] + ["Produtoz"]
+    index = ValueIndex(names)
+
+    assert index.search("produto", limit=3)[0] == "Produtoz"
+
+
+def test_word_prefixes_rank_before_other_substrings():
+    index = ValueIndex(["Bolorento", "Bolo Rei", "Grande bolo", "Pequenobolo"])
+
+    assert index.search("bolo") == ["Bolo Rei", "Bolorento", "Grande bolo", "Pequenobolo"]
+
+
+def test_substring_matches_are_ranked_over_every_candidate():
+    # Thousands of long matches with lower ids than the best one
+    names = [f"Cliente {i:05d} da Silva Santos" for i in range(3_000)] + ["Ana Silva"]
+    index = ValueIndex(names)
+
+    assert index.search("silva", limit=1) == ["Ana Silva"]
+
+
+def test_added_names_are_searchable():
+    index = ValueIndex(["Pão"])
+
+    assert index.add(["Pão", "Pastel"]) == 1
+    assert index.search("pas") == ["Pastel"]
+    assert len(index) == 2
+
+
+def test_empty_query_lists_names_in_order():
+    index = ValueIndex(["b", "a", "c"])
+
+    assert index.search("", limit=2) == ["a", "b"]
@@ -0,0 +1,48 @@
+import pytest
+
+from semantic import Query, compile_query, key_label
+
+
+def test_equivalent_queries_share_an_id():
+    query = Query(("store", "store"), ("total_sales", "total_sales"), ("product", "location", "material", "year"))
+
+    assert query.normalized() == Query(("store",), ("total_sales",), ("product", "store"))
+    assert query.id == Query(("store",), filters=("store", "product")).id
+    assert query.id == "query__store__total_sales__where_product_store"
+    assert Query().id == "query__total__total_sales"
+    assert Query(("store",), periods=True).id == Query(("store",)).id
+
+
+def test_unknown_names_are_rejected():
+    with pytest.raises(ValueError):
+        Query(("region",)).normalized()
+    with pytest.raises(ValueError):
+        Query(measures=()).normalized()
+
+
+def test_facts_are_only_joined_to_the_dates_they_group_by():
+    sql, params = compile_query(Query(("store",), filters=("material",)))
+
+    assert "JOIN" not in sql
+    assert "s.product_id = ANY(%(product_ids)s)" in sql
+    assert params == {"date_ids": "int[]", "product_ids": "int[]"}
+
+    sql, _ = compile_query(Query(("month",), periods=True))
+    assert "JOIN d_dates d ON s.date_id = d.id" in sql
+    assert "TO_CHAR(MAKE_DATE(d.year, d.month, 1), 'MM/YYYY') as month" in sql
+
+
+def test_attributes_are_joined_after_grouping_by_ids():
+    sql, _ = compile_query(Query(("material",), ("avg_price",), order="total", top_n=True))
+
+    assert "GROUP BY s.product_id" in sql
+    assert "LEFT JOIN (SELECT id, material AS value FROM d_products) material ON material.id = g.product_id" in sql
+    assert "SUM(g.avg_price_total) / NULLIF(SUM(g.avg_price_count), 0)" in sql
+    assert sql.rstrip().endswith("ORDER BY avg_price DESC\n        LIMIT %(top_n)s")
+
+
+def test_key_labels_match_the_periods():
+    assert key_label("day", 20240305) == "05/03/2024"
+    assert key_label("month", 202403) == "03/2024"
+    assert key_label("quarter", 20241) == "2024-Q1"
+    assert key_label("year", 2024) == "2024"
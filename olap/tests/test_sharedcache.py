@@ -0,0 +1,48 @@
+import pandas as pd
+
+from hierarchy import DateHierarchy
+from incremental import Watermarked
+from sharedcache import SharedCache, cache_key, decode, encode
+from streaming import FrameResult
+
+
+def round_trip(result):
+    return decode(*encode(result))
+
+
+def test_rows_round_trip():
+    rows = [("Loja 1", 10.5, 3), ("Loja 2", None, 0)]
+
+    assert round_trip(rows) == rows
+    assert round_trip([(), ()]) == [(), ()]
+    assert round_trip([]) == []
+
+
+def test_frames_round_trip():
+    frame = pd.DataFrame({"Loja": ["A", "B"], "Total Vendas": [1.5, 2.0]})
+    result = round_trip(FrameResult(frame, True, 2, 123))
+
+    pd.testing.assert_frame_equal(result.frame, frame)
+    assert (result.truncated, result.bytes) == (True, 123)
+
+
+def test_hierarchies_and_watermarks_round_trip():
+    hierarchy = DateHierarchy([(0, 2024, 1, 1, 5, 10.0), (15, None, None, None, None, 10.0)])
+    result = round_trip(Watermarked(hierarchy, 1, 99))
+
+    assert (result.low_id, result.high_id) == (1, 99)
+    assert result.result.to_rows() == hierarchy.to_rows()
+
+
+def test_other_results_arent_stored():
+    assert encode(42) is None
+
+
+def test_entries_are_shared_through_the_database(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = ("sales_by_store", ((1, 2),))
+    SharedCache(path).put(key, [("Loja 1", 10.0)], (1, 2), 60)
+
+    assert SharedCache(path).get(key, (1, 2)) == (True, [("Loja 1", 10.0)])
+    assert SharedCache(path).get(key, (1, 3)) == (False, [("Loja 1", 10.0)])
+    assert cache_key(key) == cache_key(("sales_by_store", ((1, 2),)))
@@ -0,0 +1,2 @@
+# Pages of the dashboard, one module each, imported when first opened.
+# Every page module has a render(page, date_range, preview) function.
@@ -0,0 +1,47 @@
+import importlib
+import os
+
+import streamlit as st
+from psycopg2 import Error
+
+from cube import CubeTooLarge
+from profiler import set_page
+from views.common import get_engine
+
+# One module per OLAP operation, imported when its tab is first opened
+TABS = {
+    "Slice": "slice",
+    "Dice": "dice",
+    "Drill-down": "drill_down",
+    "Roll-up": "roll_up",
+    "Pivot": "pivot",
+    "Consulta": "query",
+}
+
+
+def render(page, date_range, preview):
+    st.header("Visão Analítica de Vendas")
+
+    # Replace the tabs implementation
+    tab_selection = st.radio("Selecione a operação OLAP:", list(TABS), horizontal=True)
+    page = f"{page} / {tab_selection}"
+    set_page(page)
+
+    use_cube = st.toggle(
+        "Motor em memória (NumPy)",
+        value=os.getenv("OLAP_CUBE") == "1",
+        help="Carrega a tabela de vendas em memória e calcula as operações sem consultar a base de dados."
+    )
+    if use_cube and get_engine() is not None:
+        cube_engine = get_engine().cube_engine
+        if st.button("Recarregar cubo"):
+            try:
+                cube_engine.reload()
+            except (CubeTooLarge, Error) as e:
+                st.warning(f"⚠️ {e}")
+        if cube_engine.load_seconds is not None:
+            st.caption(f"Cubo carregado em {cube_engine.load_seconds:.2f}s")
+
+    st.markdown("---")
+
+    importlib.import_module(f"views.analytics.{TABS[tab_selection]}").render(page, use_cube, date_range)
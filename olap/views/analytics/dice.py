@@ -0,0 +1,74 @@
+import plotly.express as px
+import streamlit as st
+
+from profiler import set_page
+from queries import DIMENSIONS
+from search import SEARCH_DIMENSIONS
+from views.common import build_figure, export_facts, load_view, start_dimension_values, value_selector
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    col1, col2 = st.columns(2)
+
+    with col1:
+        dice_dim1 = st.selectbox("Primeira dimensão:",
+                               ["Loja", "Produto", "Tipo de Documento"])
+
+    with col2:
+        dice_dim2 = st.selectbox("Segunda dimensão:",
+                               ["Tipo de Documento", "Loja", "Produto"],
+                               index=1 if dice_dim1 == "Tipo de Documento" else 0)
+
+    # The listed value sets load at the same time
+    dice_values = {
+        dim: start_dimension_values(DIMENSIONS[dim])
+        for dim in (dice_dim1, dice_dim2) if DIMENSIONS[dim] not in SEARCH_DIMENSIONS
+    }
+    dice_value1 = dice_value2 = None
+
+    with col1:
+        dice_value1 = value_selector(
+            f"Valor para {dice_dim1}:", DIMENSIONS[dice_dim1], "dice_value1", dice_values.get(dice_dim1)
+        )
+
+    with col2:
+        if dice_dim2 == dice_dim1:
+            st.error("Selecione dimensões diferentes")
+        else:
+            dice_value2 = value_selector(
+                f"Valor para {dice_dim2}:", DIMENSIONS[dice_dim2], "dice_value2", dice_values.get(dice_dim2)
+            )
+
+    dice_ready = dice_dim1 != dice_dim2 and dice_value1 is not None and dice_value2 is not None
+    if dice_ready and st.button("Aplicar Dice"):
+        dice_df = load_view(
+            "dice",
+            use_cube,
+            dims=(DIMENSIONS[dice_dim1], DIMENSIONS[dice_dim2]),
+            values=(dice_value1, dice_value2),
+        )
+        if not dice_df.empty:
+
+            fig = build_figure(
+                px.line,
+                dice_df,
+                x="Período",
+                y="Total Vendas",
+                title=f"Vendas para {dice_dim1}={dice_value1} e {dice_dim2}={dice_value2}",
+                markers=True
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.dataframe(dice_df.style.format({"Total Vendas": "{:.2f} €"}))
+        else:
+            st.info("Sem dados para os filtros selecionados.")
+
+    if dice_ready:
+        export_facts(
+            "dice",
+            f"vendas_{DIMENSIONS[dice_dim1]}_{DIMENSIONS[dice_dim2]}",
+            dims=(DIMENSIONS[dice_dim1], DIMENSIONS[dice_dim2]),
+            values=(dice_value1, dice_value2),
+        )
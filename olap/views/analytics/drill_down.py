@@ -0,0 +1,48 @@
+import plotly.express as px
+import streamlit as st
+
+from engine import ViewRequest
+from profiler import set_page
+from views.common import (
+    build_figure, chart_points, export_facts, load_view, paged_table, plot_series, zoomed_series,
+)
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    drill_levels = ["Ano", "Trimestre", "Mês", "Dia"]
+    current_level = st.selectbox("Selecione o nível de detalhe:", drill_levels, index=0)
+
+    drill_grains = {"Ano": "year", "Trimestre": "quarter", "Mês": "month", "Dia": "day"}
+    period_label = current_level
+
+    drill_request = ViewRequest("drill", grain=drill_grains[current_level], **date_range)
+    drill_df = load_view("drill", use_cube, grain=drill_request.grain, **date_range)
+    if not drill_df.empty:
+        drill_df.columns = [period_label, "Total Vendas"]
+        daily = drill_request.grain == "day"
+        chart_df = drill_df
+        if daily:
+            chart_df = zoomed_series("drill", "drill", drill_df, use_cube, grain="day", **date_range)
+            chart_df = chart_df.set_axis(drill_df.columns, axis=1)
+
+        fig = build_figure(
+            px.line,
+            chart_points(chart_df, "Total Vendas", zoomable=daily),
+            x=period_label,
+            y="Total Vendas",
+            title=f"Drill-down - Vendas por {period_label}",
+            markers=True
+        )
+        if daily:
+            plot_series("drill", "sales", fig, grain="day", **date_range)
+        else:
+            st.plotly_chart(fig, use_container_width=True)
+
+        paged_table("drill", drill_request, {"Total Vendas": "{:.2f} €"}, [period_label, "Total Vendas"])
+
+        st.caption(f"Use a caixa de seleção acima para navegar entre os níveis {', '.join(drill_levels)}")
+        export_facts("drill", **date_range)
+    else:
+        st.info("Sem dados para este nível de detalhe.")
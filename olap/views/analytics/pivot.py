@@ -0,0 +1,59 @@
+import plotly.express as px
+import streamlit as st
+
+from engine import CROSSTAB_TOP_COLUMNS, OTHERS_COLUMN, TOTAL_COLUMN, ViewRequest
+from profiler import set_page
+from queries import CROSSTAB_COLUMNS, DIMENSIONS
+from views.common import build_figure, crosstab_page, crosstab_pager, export_controls, export_facts, get_engine
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    col1, col2 = st.columns(2)
+
+    with col1:
+        pivot_rows = st.selectbox(
+            "Selecionar dimensão para linhas:",
+            ["Loja", "Produto", "Tipo de Documento", "Mês", "Ano"]
+        )
+
+    with col2:
+        pivot_cols_options = [x for x in ["Loja", "Produto", "Tipo de Documento", "Mês", "Ano"] if x != pivot_rows]
+        pivot_cols = st.selectbox("Selecionar dimensão para colunas:", pivot_cols_options)
+
+    pivot_request = ViewRequest("pivot", dims=(DIMENSIONS[pivot_rows], DIMENSIONS[pivot_cols]), **date_range)
+    top_columns = st.slider(
+        "Número de colunas:", 1, CROSSTAB_COLUMNS, CROSSTAB_TOP_COLUMNS,
+        help=f'As restantes colunas são somadas em "{OTHERS_COLUMN}".'
+    )
+    pivot = crosstab_page("pivot", pivot_request, top_columns)
+    if pivot is not None and not pivot.frame.empty:
+        pivot_df = pivot.frame
+        pivot_df.index.name = pivot_rows
+        cells = [col for col in pivot_df.columns if col not in (OTHERS_COLUMN, TOTAL_COLUMN)]
+
+        st.subheader(f"Tabela Pivô: {pivot_rows} vs {pivot_cols}")
+        st.dataframe(pivot_df.style.background_gradient(cmap="Blues", subset=cells).format("{:.2f} €"))
+        crosstab_pager("pivot", pivot)
+
+        st.subheader("Visualização da Tabela Pivô")
+
+        fig = build_figure(
+            px.imshow,
+            pivot_df[cells],
+            aspect="auto",
+            color_continuous_scale="Blues",
+            title=f"Pivot: {pivot_rows} vs {pivot_cols}",
+            labels={"x": pivot_cols, "y": pivot_rows, "color": "Vendas (€)"}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        with st.expander("📥 Exportar Tabela Pivô"):
+            export_controls(
+                "pivot", f"pivot_{pivot_rows}_{pivot_cols}",
+                lambda fmt: get_engine().export_crosstab(pivot_request, fmt, top_columns),
+            )
+        export_facts("pivot_facts", **date_range)
+    else:
+        st.info("Sem dados suficientes para criar a tabela pivô.")
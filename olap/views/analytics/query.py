@@ -0,0 +1,46 @@
+import plotly.express as px
+import streamlit as st
+
+from profiler import set_page
+from semantic import DIMENSIONS, MEASURES
+from views.common import build_figure, load_view
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    dim_labels = {dim.label: name for name, dim in DIMENSIONS.items()}
+    measure_labels = {measure.label: name for name, measure in MEASURES.items()}
+
+    col1, col2 = st.columns(2)
+    with col1:
+        query_dims = st.multiselect("Agrupar por:", list(dim_labels), default=["Cidade"], max_selections=3)
+    with col2:
+        query_measures = st.multiselect(
+            "Medidas:", list(measure_labels), default=["Total Vendas", "Quantidade Vendida", "Preço Médio"]
+        )
+    top_n = st.number_input("Top N pela primeira medida (0 para todas as linhas):", 0, 1000, 0)
+
+    if not query_measures:
+        st.info("Selecione pelo menos uma medida.")
+        return
+
+    # The cube only answers the fixed operations, aggregates always run in the database
+    query_df = load_view(
+        "aggregate",
+        dims=tuple(dim_labels[label] for label in query_dims),
+        measures=tuple(measure_labels[label] for label in query_measures),
+        top_n=top_n or None,
+        **date_range,
+    )
+    if not query_df.empty:
+        if len(query_dims) == 1:
+            fig = build_figure(
+                px.bar,
+                query_df.astype({query_dims[0]: str}),
+                x=query_dims[0],
+                y=query_measures[0],
+                title=f"{query_measures[0]} por {query_dims[0]}",
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(query_df, use_container_width=True)
@@ -0,0 +1,93 @@
+import plotly.express as px
+import streamlit as st
+
+from engine import ViewRequest
+from profiler import set_page
+from views.common import (
+    build_figure, chart_points, export_facts, load_view, paged_table, plot_series, view_totals, zoomed_series,
+)
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    rollup_options = ["Produto → Material", "Dia → Mês → Ano", "Loja → Localização"]
+    rollup_choice = st.radio("Selecione o tipo de roll-up:", rollup_options)
+
+    if rollup_choice == "Dia → Mês → Ano":
+        granularity = st.selectbox("Selecione a granularidade:", ["Dia", "Mês", "Ano"])
+
+        rollup_grains = {"Dia": "day", "Mês": "month", "Ano": "year"}
+        rollup_titles = {
+            "Dia": "Vendas diárias",
+            "Mês": "Vendas mensais (roll-up de dias)",
+            "Ano": "Vendas anuais (roll-up de meses)",
+        }
+        title = rollup_titles[granularity]
+
+        rollup_request = ViewRequest("rollup", grain=rollup_grains[granularity], **date_range)
+        rollup_df = load_view("rollup", use_cube, grain=rollup_request.grain, **date_range)
+        if not rollup_df.empty:
+            daily = rollup_request.grain == "day"
+            chart_df = zoomed_series("rollup", "rollup", rollup_df, use_cube, grain="day", **date_range) if daily else rollup_df
+
+            fig = build_figure(
+                px.bar,
+                chart_points(chart_df, "Total Vendas", lines=False, zoomable=daily),
+                x="Período",
+                y="Total Vendas",
+                title=title,
+                text="Total Vendas"
+            )
+            fig.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+            if daily:
+                plot_series("rollup", "sales", fig, grain="day", **date_range)
+            else:
+                st.plotly_chart(fig, use_container_width=True)
+
+            totals = view_totals(rollup_request)
+            if totals is not None:
+                st.metric("Total do período", f"{totals[0]:.2f} €")
+            paged_table("rollup", rollup_request, {"Total Vendas": "{:.2f} €"})
+        else:
+            st.info("Sem dados para esta granularidade.")
+
+    elif rollup_choice == "Produto → Material":
+        rollup_df = load_view("rollup", use_cube, grain="material", **date_range)
+        if not rollup_df.empty:
+
+            fig = build_figure(
+                px.pie,
+                rollup_df,
+                values="Total Vendas",
+                names="Material",
+                title="Roll-up: Vendas por Material de Produto",
+                hover_data=["Número de Produtos"]
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.dataframe(rollup_df.style.format({"Total Vendas": "{:.2f} €"}))
+        else:
+            st.info("Sem dados para categorização de produtos.")
+
+    else:  # Loja → Localização
+        rollup_df = load_view("rollup", use_cube, grain="location", **date_range)
+        if not rollup_df.empty:
+
+            fig = build_figure(
+                px.bar,
+                rollup_df,
+                x="Localização",
+                y="Total Vendas",
+                title="Roll-up: Vendas por Localização",
+                text="Total Vendas",
+                color="Número de Lojas"
+            )
+            fig.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+            st.plotly_chart(fig, use_container_width=True)
+
+            st.dataframe(rollup_df.style.format({"Total Vendas": "{:.2f} €"}))
+        else:
+            st.info("Sem dados para agrupamento por localização.")
+
+    export_facts("rollup", **date_range)
@@ -0,0 +1,52 @@
+import plotly.express as px
+import streamlit as st
+
+from engine import ViewRequest
+from profiler import set_page
+from queries import DIMENSIONS
+from views.common import (
+    build_figure, chart_points, export_facts, load_view, paged_table, value_selector, view_totals,
+)
+
+
+@st.fragment
+def render(page, use_cube, date_range):
+    set_page(page)
+    slice_dim = st.selectbox("Selecione a dimensão para filtrar:",
+                           ["Loja", "Produto", "Cliente", "Tipo de Documento", "Ano"])
+
+    slice_value = value_selector(f"Selecione o valor para {slice_dim}:", DIMENSIONS[slice_dim], "slice_value")
+    if slice_value is not None:
+
+        slice_request = ViewRequest("slice", dims=(DIMENSIONS[slice_dim],), values=(slice_value,))
+        if st.button("Aplicar Slice"):
+            st.session_state["slice_applied"] = slice_request
+
+        # Kept applied while the table is paged
+        if st.session_state.get("slice_applied") == slice_request:
+            slice_df = load_view("slice", use_cube, dims=slice_request.dims, values=slice_request.values)
+            if not slice_df.empty:
+
+                fig = build_figure(
+                    px.bar,
+                    chart_points(slice_df, "Total Vendas", lines=False),
+                    x="Período",
+                    y="Total Vendas",
+                    title=f"Vendas para {slice_dim} = {slice_value}",
+                    text="Total Vendas"
+                )
+                fig.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+                st.plotly_chart(fig, use_container_width=True)
+
+                totals = view_totals(slice_request)
+                if totals is not None:
+                    col1, col2 = st.columns(2)
+                    col1.metric("Total de Vendas", f"{totals[0]:.2f} €")
+                    col2.metric("Meses com vendas", totals[1])
+                paged_table("slice", slice_request, {"Total Vendas": "{:.2f} €"})
+            else:
+                st.info("Sem dados para este filtro.")
+
+        export_facts(
+            "slice", f"vendas_{DIMENSIONS[slice_dim]}", dims=(DIMENSIONS[slice_dim],), values=(slice_value,)
+        )
@@ -0,0 +1,355 @@
+import os
+from concurrent.futures import CancelledError, Future
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from psycopg2 import Error, InterfaceError, OperationalError
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from downsample import FULL_WIDTH, WEBGL_POINTS, downsample, target_points
+from engine import MARGIN_COLUMN, Engine, ViewRequest
+from exports import FORMATS as EXPORT_FORMATS, ExportReader
+from search import SEARCH_DIMENSIONS
+from warmup import Warmer
+
+# Helpers shared by the dashboard's pages: the engine, loading views on the
+# run's query batch, reporting errors, paging, charts and exports.
+
+
+@st.cache_resource
+def get_engine():
+    # Shared by every session: connection pool, result cache, aggregates and cube
+    return Engine.from_env()
+
+
+@st.cache_resource
+def get_warmer():
+    # One per server, refills the cache after a restart or an ETL load
+    engine = get_engine()
+    if engine is None or os.getenv("OLAP_WARMUP", "1") != "1":
+        return None
+    return Warmer(engine, delay=float(os.getenv("OLAP_WARMUP_DELAY_MS", "200")) / 1000).start()
+
+
+def notices():
+    # Errors and warnings go to the sidebar, except from a fragment, which can
+    # only write inside itself
+    ctx = get_script_run_ctx()
+    return st if ctx is not None and ctx.current_fragment_id else st.sidebar
+
+
+def rerun():
+    # From a fragment's own rerun, only that fragment runs again
+    ctx = get_script_run_ctx()
+    st.rerun(scope="fragment" if ctx is not None and ctx.fragment_ids_this_run else "app")
+
+
+def report_error(e):
+    if isinstance(e, (OperationalError, InterfaceError)):
+        notices().error(f"❌ Database connection error: {e}")
+    else:
+        notices().error(f"❌ Query error: {e}")
+
+
+def start_batch():
+    # Queries of this run. A new run abandons the previous one, so anything it
+    # left running is cancelled on the server.
+    previous = st.session_state.pop("query_batch", None)
+    if previous is not None:
+        previous.cancel()
+    engine = get_engine()
+    if engine is None:
+        return None
+    batch = engine.batch()
+    # Checked in parallel up front, so the views find both fresh
+    batch.submit(engine.dates.index)
+    batch.submit(engine.data_version.current)
+    st.session_state["query_batch"] = batch
+    return batch
+
+
+def start_view(view, use_cube=False, approximate=False, **fields):
+    # Starts loading a view in the background, load_view waits for it
+    query_batch = st.session_state.get("query_batch")
+    if query_batch is None:
+        return None
+    return query_batch.submit(get_engine().view, ViewRequest(view, **fields), use_cube, approximate)
+
+
+def load_view(view, use_cube=False, approximate=False, **fields):
+    # DataFrame of a dashboard view, empty when it couldn't be loaded.
+    # `view` can also be a future from start_view.
+    future = view if isinstance(view, Future) else start_view(view, use_cube, approximate, **fields)
+    if future is None:
+        notices().error("❌ DATABASE_URL not found in environment variables")
+        return pd.DataFrame()
+    try:
+        result = future.result()
+    except CancelledError:
+        # Abandoned by a newer run of the page, which shows its own result
+        return pd.DataFrame()
+    except Exception as e:
+        report_error(e)
+        return pd.DataFrame()
+    for warning in result.warnings:
+        notices().warning(f"⚠️ {warning}")
+    if result.truncated:
+        st.warning(f"⚠️ Resultado truncado: apenas as primeiras {len(result.frame)} linhas são apresentadas.")
+    if result.sample_rate is not None:
+        st.info(
+            f"⚡ Valores estimados a partir de uma amostra de pelo menos {result.sample_rate:.0%} das vendas, "
+            "com a margem de erro de 95% do total de vendas."
+        )
+    if result.frame.empty:
+        notices().warning("⚠️ Query returned no data")
+    return result.frame
+
+
+@st.fragment(run_every=1)
+def wait_for_exact(future):
+    # Reruns the page once the exact result is ready
+    if future.done():
+        st.rerun()
+    st.caption("⏳ A calcular os valores exatos...")
+
+
+def load_preview(view, preview, **fields):
+    # In preview mode the view is estimated from the sales sample, and its
+    # exact result computed in the background on request replaces the estimate
+    if not preview:
+        return load_view(view, **fields)
+    request = ViewRequest(view, **fields)
+    exact = st.session_state.get(f"{view}_exact")
+    if exact is not None and exact[0] == request and exact[1].done():
+        return load_view(exact[1])
+
+    df = load_view(view, approximate=True, **fields)
+    if df.empty:
+        return df
+    if exact is not None and exact[0] == request:
+        wait_for_exact(exact[1])
+    elif st.button("Calcular valores exatos", key=f"{view}_exact_button"):
+        # On the engine's workers instead of the page batch, so it outlives this run
+        engine = get_engine()
+        st.session_state[f"{view}_exact"] = (request, engine.executor.submit(engine.view, request))
+        st.rerun()
+    return df
+
+
+def margin_formats(df):
+    # Table format of the confidence margin of estimated views
+    return {MARGIN_COLUMN: "± {:.2f} €"} if MARGIN_COLUMN in df else {}
+
+
+def start_dimension_values(dim):
+    query_batch = st.session_state.get("query_batch")
+    if query_batch is None:
+        return None
+    return query_batch.submit(get_engine().dimension_values, dim)
+
+
+def dimension_values(dim):
+    # Values of a dimension, `dim` can also be a future from start_dimension_values
+    future = dim if isinstance(dim, Future) else start_dimension_values(dim)
+    if future is None:
+        notices().error("❌ DATABASE_URL not found in environment variables")
+        return []
+    try:
+        return future.result()
+    except Error as e:
+        report_error(e)
+        return []
+
+
+def search_values(dim, text):
+    engine = get_engine()
+    if engine is None:
+        notices().error("❌ DATABASE_URL not found in environment variables")
+        return []
+    try:
+        return engine.search_values(dim, text)
+    except Error as e:
+        report_error(e)
+        return []
+
+
+def value_selector(label, dim, key, values=None):
+    # Selected value of a dimension, None when there is nothing to select.
+    # Large dimensions are searched by name instead of listed.
+    if dim in SEARCH_DIMENSIONS:
+        text = st.text_input(
+            "Pesquisar por nome:", key=f"{key}_search",
+            placeholder="Parte do nome (3 letras ou mais para procurar no meio do nome)",
+        )
+        options = search_values(dim, text)
+        if not options:
+            st.info("Sem resultados para a pesquisa.")
+    else:
+        options = dimension_values(dim if values is None else values)
+    if not options:
+        return None
+    return st.selectbox(label, options, key=key)
+
+
+def paged_table(key, request, formats, columns=None):
+    # Detail table read one page at a time, each page starting after the
+    # last period of the previous one
+    engine = get_engine()
+    if engine is None:
+        return
+    state = st.session_state.get(f"{key}_pages")
+    if state is None or state[0] != request:
+        state = (request, [None])
+        st.session_state[f"{key}_pages"] = state
+    starts = state[1]
+    try:
+        page = engine.page(request, starts[-1])
+    except Error as e:
+        report_error(e)
+        return
+    if columns:
+        page.frame.columns = columns
+    st.dataframe(page.frame.style.format(formats), use_container_width=True)
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    if col1.button("◀ Anterior", key=f"{key}_previous", disabled=len(starts) == 1):
+        starts.pop()
+        rerun()
+    if col2.button("Seguinte ▶", key=f"{key}_next", disabled=not page.has_more):
+        starts.append(page.last_key)
+        rerun()
+    col3.caption(f"Página {len(starts)}")
+
+
+def crosstab_page(key, request, top_columns):
+    # One page of rows of a pivot computed in the database
+    engine = get_engine()
+    if engine is None:
+        notices().error("❌ DATABASE_URL not found in environment variables")
+        return None
+    state = st.session_state.get(f"{key}_offset")
+    if state is None or state[0] != (request, top_columns):
+        state = [(request, top_columns), 0]
+        st.session_state[f"{key}_offset"] = state
+    try:
+        crosstab = engine.crosstab(request, state[1], top_columns=top_columns)
+        if crosstab.frame.empty and state[1] > 0:
+            # The pivot got shorter since the page was opened
+            state[1] = 0
+            crosstab = engine.crosstab(request, 0, top_columns=top_columns)
+        return crosstab
+    except Error as e:
+        report_error(e)
+        return None
+
+
+def crosstab_pager(key, crosstab):
+    state = st.session_state[f"{key}_offset"]
+    col1, col2, col3 = st.columns([1, 1, 4])
+    if col1.button("◀ Anterior", key=f"{key}_previous", disabled=crosstab.offset == 0):
+        state[1] = max(0, crosstab.offset - len(crosstab.frame))
+        rerun()
+    if col2.button("Seguinte ▶", key=f"{key}_next", disabled=not crosstab.has_more):
+        state[1] = crosstab.offset + len(crosstab.frame)
+        rerun()
+    col3.caption(
+        f"Linhas {crosstab.offset + 1}–{crosstab.offset + len(crosstab.frame)} de {crosstab.total_rows}"
+    )
+
+
+def view_totals(request):
+    # (total sales, number of periods) of a paginated view
+    try:
+        return get_engine().totals(request)
+    except Error as e:
+        report_error(e)
+        return None
+
+
+def chart_points(df, y, width=FULL_WIDTH, lines=True, zoomable=False):
+    # Long series are charted from as many points as the chart is wide
+    points = downsample(df, y, target_points(width), "lttb" if lines else "minmax")
+    if len(points) < len(df):
+        hint = "selecione um intervalo no gráfico para o ver com todos os pontos" if zoomable else "a tabela tem todos os valores"
+        st.caption(f"Gráfico com {len(points)} de {len(df)} pontos; {hint}.")
+    return points
+
+
+def zoomed_series(key, view, df, use_cube=False, **fields):
+    # Daily series to chart: the whole series, or the range selected on its
+    # chart re-fetched at full resolution
+    zoom = st.session_state.get(f"{key}_zoom")
+    if zoom is None or zoom[0] != fields:
+        return df
+    col1, col2 = st.columns([4, 1])
+    col1.caption(f"Zoom de {zoom[1]:%d/%m/%Y} a {zoom[2]:%d/%m/%Y}")
+    if col2.button("Repor zoom", key=f"{key}_zoom_reset"):
+        del st.session_state[f"{key}_zoom"]
+        rerun()
+    zoomed = load_view(view, use_cube, **{**fields, "start": zoom[1], "end": zoom[2]})
+    return df if zoomed.empty else zoomed
+
+
+def plot_series(key, chart, fig, **fields):
+    # Chart of a daily series where a box selection zooms into its days
+    zoom = st.session_state.get(f"{key}_zoom")
+    # A new chart per zoom, so the selection that made it doesn't carry over
+    event = st.plotly_chart(
+        fig, use_container_width=True, on_select="rerun", selection_mode="box",
+        key=f"{key}_{chart}_{zoom and zoom[1:]}",
+    )
+    days = sorted({datetime.strptime(point["x"], "%d/%m/%Y").date() for point in event.selection.points})
+    if len(days) > 1 and (fields, days[0], days[-1]) != zoom:
+        st.session_state[f"{key}_zoom"] = (fields, days[0], days[-1])
+        rerun()
+
+
+def export_controls(key, file_name, export):
+    # `export(fmt)` generates the file, only when asked for. Streamlit copies
+    # the file behind a download button into memory on every run that draws
+    # it, so the button is only drawn in the run that generated the file and
+    # the file is closed right after.
+    fmt = st.selectbox(
+        "Formato:", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f].label, key=f"{key}_format"
+    )
+    if not st.button("Gerar ficheiro", key=f"{key}_generate"):
+        return
+    try:
+        exported = export(fmt)
+    except Error as e:
+        report_error(e)
+        return
+    with exported:
+        reader = ExportReader(exported)
+        max_mb = float(os.getenv("OLAP_DOWNLOAD_MAX_MB", "200"))
+        if reader.size > max_mb * 2**20:
+            st.warning(
+                f"⚠️ O ficheiro tem {reader.size / 2**20:.0f} MB, acima do limite de {max_mb:.0f} MB para "
+                "descarregar na aplicação. Reduza o intervalo de datas."
+            )
+            return
+        st.download_button(
+            f"Descarregar ({EXPORT_FORMATS[fmt].label})",
+            data=reader,
+            file_name=f"{file_name}.{EXPORT_FORMATS[fmt].extension}",
+            mime=EXPORT_FORMATS[fmt].mime,
+            key=f"{key}_download",
+            on_click="ignore",
+        )
+    st.caption("O ficheiro fica disponível para descarregar até à próxima interação com a página.")
+
+
+def export_facts(key, file_name="vendas", **fields):
+    request = ViewRequest("facts", **fields)
+    with st.expander("📥 Exportar vendas"):
+        export_controls(key, file_name, lambda fmt: get_engine().export(request, fmt))
+
+
+def build_figure(builder, *args, **kwargs):
+    # Plotly Express call, timed for the diagnostics page. Long lines and
+    # scatters are drawn with WebGL.
+    if builder.__name__ in ("line", "scatter") and len(args[0]) > WEBGL_POINTS:
+        kwargs.setdefault("render_mode", "webgl")
+    with get_engine().profiler.span("figure", builder.__name__):
+        return builder(*args, **kwargs)
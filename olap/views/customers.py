@@ -0,0 +1,60 @@
+import plotly.express as px
+import streamlit as st
+
+from profiler import set_page
+from views.common import build_figure, export_facts, load_view
+
+
+def render(page, date_range, preview):
+    st.header("Análise de Vendas por Clientes")
+    top_customers(page, date_range)
+
+
+@st.fragment
+def top_customers(page, date_range):
+    # Changing Top N reruns only this part of the page
+    set_page(page)
+    top_n = st.slider("Mostrar Top N Clientes", min_value=5, max_value=50, value=10)
+
+    df = load_view("customers", top_n=top_n, **date_range)
+
+    if not df.empty:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig1 = build_figure(
+                px.bar,
+                df.sort_values("Total Compras", ascending=False).head(10),
+                x="Cliente",
+                y="Total Compras",
+                title=f"Top {top_n} Clientes por Valor de Compras",
+                color="Total Compras",
+                text="Total Compras",
+                labels={"Total Compras": "Montante Total (€)"}
+            )
+            fig1.update_layout(xaxis={'categoryorder':'total descending'})
+            fig1.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+            st.plotly_chart(fig1, use_container_width=True)
+
+        with col2:
+            fig2 = build_figure(
+                px.scatter,
+                df,
+                x="Número Transações",
+                y="Valor Médio",
+                size="Total Compras",
+                hover_name="Cliente",
+                title="Frequência vs Valor Médio por Cliente",
+                labels={"Valor Médio": "Valor Médio por Transação (€)"}
+            )
+            st.plotly_chart(fig2, use_container_width=True)
+
+        st.subheader("Detalhes por Cliente")
+        df["Email"] = df["Email"].apply(lambda x: x.split("@")[0][:3] + "***@" + x.split("@")[1])
+        st.dataframe(df.style.format({
+            "Total Compras": "{:.2f} €",
+            "Valor Médio": "{:.2f} €"
+        }))
+        export_facts("customer", **date_range)
+    else:
+        st.info("Sem dados para exibir. Tente ajustar os filtros.")
@@ -0,0 +1,84 @@
+import plotly.express as px
+import streamlit as st
+
+from downsample import HALF_WIDTH
+from engine import MARGIN_COLUMN
+from profiler import set_page
+from views.common import (
+    build_figure, chart_points, export_facts, load_preview, margin_formats, plot_series, zoomed_series,
+)
+
+
+def render(page, date_range, preview):
+    st.header("Análise de Vendas por Período")
+    sales_by_period(page, date_range, preview)
+
+
+@st.fragment
+def sales_by_period(page, date_range, preview):
+    # Changing the granularity or zooming reruns only this part of the page
+    set_page(page)
+    granularity = st.radio("Selecione a Granularidade", ["Diário", "Mensal", "Anual"])
+    grain = {"Diário": "day", "Mensal": "month", "Anual": "year"}[granularity]
+
+    df = load_preview("dates", preview, grain=grain, **date_range)
+
+    if not df.empty:
+        chart_df = zoomed_series("dates", "dates", df, grain=grain, **date_range) if grain == "day" else df
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig1 = build_figure(
+                px.line,
+                chart_points(chart_df, "Total Vendas", HALF_WIDTH, zoomable=grain == "day"),
+                x="Período",
+                y="Total Vendas",
+                title=f"Evolução de Vendas ({granularity})",
+                markers=True,
+                error_y=MARGIN_COLUMN if MARGIN_COLUMN in chart_df else None,
+                labels={"Total Vendas": "Montante Total (€)"}
+            )
+            if grain == "day":
+                plot_series("dates", "sales", fig1, grain=grain, **date_range)
+            else:
+                st.plotly_chart(fig1, use_container_width=True)
+
+        with col2:
+            fig2 = build_figure(
+                px.bar,
+                chart_points(chart_df, "Número Transações", HALF_WIDTH, lines=False, zoomable=grain == "day"),
+                x="Período",
+                y="Número Transações",
+                title=f"Número de Transações ({granularity})",
+                color="Valor Médio",
+                labels={"Número Transações": "Quantidade", "Valor Médio": "Valor Médio (€)"}
+            )
+            if grain == "day":
+                plot_series("dates", "transactions", fig2, grain=grain, **date_range)
+            else:
+                st.plotly_chart(fig2, use_container_width=True)
+
+        total_period = df["Total Vendas"].sum()
+        avg_period = df["Total Vendas"].mean()
+        max_period = df["Total Vendas"].max()
+        max_period_time = df.loc[df["Total Vendas"].idxmax()]["Período"]
+
+        col1, col2, col3 = st.columns(3)
+        if MARGIN_COLUMN in df:
+            # Margins of independent strata add in quadrature
+            total_margin = (df[MARGIN_COLUMN] ** 2).sum() ** 0.5
+            col1.metric("Total de Vendas no Período", f"{total_period:.2f} € ± {total_margin:.2f} €")
+        else:
+            col1.metric("Total de Vendas no Período", f"{total_period:.2f} €")
+        col2.metric(f"Média de Vendas por {granularity if granularity != 'Mensal' else 'Mês'}", f"{avg_period:.2f} €")
+        col3.metric(f"Melhor {granularity if granularity != 'Mensal' else 'Mês'}", f"{max_period:.2f} € ({max_period_time})")
+
+        st.subheader(f"Detalhes por {granularity}")
+        st.dataframe(df.style.format({
+            "Total Vendas": "{:.2f} €",
+            "Valor Médio": "{:.2f} €",
+            **margin_formats(df)
+        }))
+        export_facts("dates", **date_range)
+    else:
+        st.info("Sem dados para exibir. Tente ajustar os filtros.")
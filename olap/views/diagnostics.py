@@ -0,0 +1,76 @@
+import pandas as pd
+import streamlit as st
+
+from views.common import get_engine, get_warmer
+
+
+def render(page, date_range, preview):
+    st.header("Diagnóstico")
+
+    engine = get_engine()
+    if engine is None:
+        st.sidebar.error("❌ DATABASE_URL not found in environment variables")
+        st.stop()
+    profiler = engine.profiler
+    records = profiler.records()
+
+    cache_stats = engine.cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Entradas em cache", f"{cache_stats['entries']} ({cache_stats['bytes'] / 2**20:.1f} MB)")
+    col2.metric("Taxa de acerto", f"{cache_stats['hit_rate']:.0%}")
+    col3.metric("Remoções (LRU / TTL)", f"{cache_stats['evictions']} / {cache_stats['expirations']}")
+    col4.metric("Invalidações / Atualizações", f"{cache_stats['invalidations']} / {cache_stats['refreshes']}")
+
+    shared_stats = cache_stats["shared"]
+    if shared_stats is not None:
+        shared_size = "?" if shared_stats["bytes"] is None else f"{shared_stats['bytes'] / 2**20:.1f} MB"
+        st.caption(
+            f"Cache partilhada ({shared_stats['path']}): {shared_stats['entries']} entradas ({shared_size}), "
+            f"{shared_stats['hits']} acertos, {shared_stats['misses']} falhas, {shared_stats['writes']} escritas, "
+            f"{shared_stats['evictions']} remoções, {shared_stats['errors']} erros"
+        )
+
+    pool_stats = engine.pool.stats()
+    st.caption(
+        f"Pool: {pool_stats['in_use']} ligações em uso, {pool_stats['idle']} livres, "
+        f"espera média {pool_stats['wait_avg_s'] * 1000:.1f} ms, {pool_stats['timeouts']} timeouts"
+    )
+
+    warmer = get_warmer()
+    if warmer is not None:
+        warm_status = warmer.status()
+        warm_caption = f"Pré-aquecimento: {warm_status['state']}, {warm_status['done']}/{warm_status['total']} vistas"
+        if warm_status["seconds"] is not None:
+            warm_caption += f" em {warm_status['seconds']:.1f}s"
+        if warm_status["errors"]:
+            warm_caption += f", {warm_status['errors']} erros ({warm_status['error']})"
+        st.caption(warm_caption)
+
+    if records:
+        records_df = pd.DataFrame(records)
+
+        st.subheader("Resumo")
+        summary = records_df.groupby(["kind", "name"])["seconds"].agg(
+            count="count",
+            mean="mean",
+            p95=lambda seconds: seconds.quantile(0.95),
+            max="max",
+        ).sort_values("max", ascending=False)
+        st.dataframe(summary.style.format({"mean": "{:.4f}s", "p95": "{:.4f}s", "max": "{:.4f}s"}))
+
+        st.subheader("Registos recentes")
+        st.dataframe(records_df.drop(columns=["explain"], errors="ignore").iloc[::-1], use_container_width=True)
+
+        slow = [record for record in records if record.get("explain")]
+        if slow:
+            st.subheader("Consultas lentas")
+            for record in reversed(slow[-20:]):
+                seconds = record.get("query_seconds", record["seconds"])
+                with st.expander(f"{record['name']} · {seconds * 1000:.0f} ms · {record['at']}"):
+                    st.code(record["explain"])
+    else:
+        st.info("Sem registos. Navegue pelas outras páginas para recolher tempos.")
+
+    if st.button("Limpar registos"):
+        profiler.clear()
+        st.rerun()
@@ -0,0 +1,44 @@
+import plotly.express as px
+import streamlit as st
+
+from views.common import build_figure, export_facts, load_preview, margin_formats
+
+
+def render(page, date_range, preview):
+    st.header("Análise de Vendas por Tipo de Documento")
+
+    df = load_preview("document_type", preview, **date_range)
+
+    if not df.empty:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig1 = build_figure(
+                px.pie,
+                df,
+                values="Total Vendas",
+                names="Tipo de Documento",
+                title="Distribuição de Vendas por Tipo de Documento",
+                hole=0.4
+            )
+            fig1.update_traces(textinfo="percent+label")
+            st.plotly_chart(fig1, use_container_width=True)
+
+        with col2:
+            fig2 = build_figure(
+                px.bar,
+                df,
+                x="Tipo de Documento",
+                y="Número de Transações",
+                title="Número de Transações por Tipo de Documento",
+                color="Tipo de Documento",
+                text="Número de Transações"
+            )
+            fig2.update_traces(texttemplate='%{text}', textposition='outside')
+            st.plotly_chart(fig2, use_container_width=True)
+
+        st.subheader("Detalhes por Tipo de Documento")
+        st.dataframe(df.style.format({"Total Vendas": "{:.2f} €", **margin_formats(df)}))
+        export_facts("document_type", **date_range)
+    else:
+        st.info("Sem dados para exibir. Tente ajustar os filtros.")
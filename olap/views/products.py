@@ -0,0 +1,60 @@
+import plotly.express as px
+import streamlit as st
+
+from profiler import set_page
+from views.common import build_figure, export_facts, load_view
+
+
+def render(page, date_range, preview):
+    st.header("Análise de Vendas por Produtos")
+    top_products(page, date_range)
+
+
+@st.fragment
+def top_products(page, date_range):
+    # Changing Top N reruns only this part of the page
+    set_page(page)
+    top_n = st.slider("Mostrar Top N Produtos", min_value=5, max_value=50, value=10)
+
+    df = load_view("products", top_n=top_n, **date_range)
+
+    if not df.empty:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig1 = build_figure(
+                px.bar,
+                df.sort_values("Total Vendas"),
+                y="Produto",
+                x="Total Vendas",
+                title=f"Top {top_n} Produtos por Valor de Vendas",
+                orientation="h",
+                color="Total Vendas",
+                text="Total Vendas",
+                labels={"Total Vendas": "Montante Total (€)"}
+            )
+            fig1.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+            st.plotly_chart(fig1, use_container_width=True)
+
+        with col2:
+            fig2 = build_figure(
+                px.scatter,
+                df,
+                x="Preço Médio",
+                y="Quantidade Vendida",
+                size="Total Vendas",
+                color="Material" if df["Material"].notna().any() else None,
+                hover_name="Produto",
+                title="Relação entre Preço Médio e Quantidade Vendida",
+                labels={"Preço Médio": "Preço Médio (€)"}
+            )
+            st.plotly_chart(fig2, use_container_width=True)
+
+        st.subheader("Detalhes por Produto")
+        st.dataframe(df.style.format({
+            "Total Vendas": "{:.2f} €",
+            "Preço Médio": "{:.2f} €"
+        }))
+        export_facts("product", **date_range)
+    else:
+        st.info("Sem dados para exibir. Tente ajustar os filtros.")
@@ -0,0 +1,48 @@
+import plotly.express as px
+import streamlit as st
+
+from engine import MARGIN_COLUMN
+from views.common import build_figure, export_facts, load_preview, margin_formats
+
+
+def render(page, date_range, preview):
+    st.header("Análise de Vendas por Loja")
+
+    df = load_preview("store", preview, **date_range)
+
+    if not df.empty:
+        col1, col2 = st.columns(2)
+
+        with col1:
+            fig1 = build_figure(
+                px.bar,
+                df,
+                x="Loja",
+                y="Total Vendas",
+                title="Total de Vendas por Loja",
+                text="Total Vendas",
+                color="Loja",
+                error_y=MARGIN_COLUMN if MARGIN_COLUMN in df else None,
+                labels={"Total Vendas": "Montante Total (€)"}
+            )
+            fig1.update_traces(texttemplate='%{text:.2f} €', textposition='outside')
+            st.plotly_chart(fig1, use_container_width=True)
+
+        with col2:
+            fig2 = build_figure(
+                px.scatter,
+                df,
+                x="Loja",
+                y="Número de Transações",
+                size="Total Vendas",
+                color="Loja",
+                title="Número de Transações por Loja",
+                hover_data=["Localização"]
+            )
+            st.plotly_chart(fig2, use_container_width=True)
+
+        st.subheader("Detalhes por Loja")
+        st.dataframe(df.style.format({"Total Vendas": "{:.2f} €", **margin_formats(df)}))
+        export_facts("store", **date_range)
+    else:
+        st.info("Sem dados para exibir. Tente ajustar os filtros.")
@@ -0,0 +1,129 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from engine import ViewRequest
+from profiler import set_page
+
+# Fills the shared result cache with what every page shows before any filter
+# is touched, so the first visitor after a restart or an ETL load doesn't wait
+# for cold queries. The warm-up runs again whenever the data mart changes or
+# the default date range moves to a new day.
+
+DEFAULT_RANGE = timedelta(days=365)
+# Value lists of the Slice and Dice selectors, the other dimensions are searched
+DIMENSION_VALUES = ("store", "document_type", "year")
+
+
+def default_requests(today=None):
+    """Requests of each page and OLAP tab with the app's default filters."""
+    today = today or date.today()
+    dates = {"start": today - DEFAULT_RANGE, "end": today}
+    return [
+        ViewRequest("store", **dates),
+        ViewRequest("document_type", **dates),
+        ViewRequest("products", top_n=10, **dates),
+        ViewRequest("customers", top_n=10, **dates),
+        *(ViewRequest("dates", grain=grain, **dates) for grain in ("day", "month", "year")),
+        ViewRequest("drill", grain="year", **dates),
+        *(ViewRequest("rollup", grain=grain, **dates) for grain in ("material", "day", "month", "year", "location")),
+        ViewRequest("pivot", dims=("store", "product"), **dates),
+    ]
+
+
+class Warmer:
+    """Background thread warming the engine's cache with the default views.
+
+    Runs one query at a time, `delay` seconds apart, and only while more than
+    `reserved_connections` pool connections are free, so live sessions keep
+    priority.
+    """
+
+    def __init__(self, engine, delay=0.2, reserved_connections=2, check_interval=30.0):
+        self.engine = engine
+        self.delay = delay
+        self.reserved_connections = reserved_connections
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # (data version, day) of the last finished warm-up
+        self._warmed = None
+        self._status = {
+            "state": "idle", "done": 0, "total": 0, "errors": 0, "started_at": None, "seconds": None, "runs": 0,
+            "error": None,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="olap-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def _loop(self):
+        set_page("warm-up")
+        while not self._stop.is_set():
+            try:
+                key = (self.engine.data_version.current(), date.today())
+                if key != self._warmed:
+                    self.warm(key[1])
+                    self._warmed = key
+            except Exception as e:
+                # The data mart may be down, try again on the next check
+                self._update(state="failed", error=str(e))
+            self._stop.wait(self.check_interval)
+
+    def _throttle(self):
+        self._stop.wait(self.delay)
+        while not self._stop.is_set():
+            stats = self.engine.pool.stats()
+            # A small pool still leaves one connection to the warm-up
+            if stats["max"] - stats["in_use"] > min(self.reserved_connections, stats["max"] - 1):
+                return
+            self._stop.wait(self.delay)
+
+    def warm(self, today=None):
+        """Runs the default requests once, returns the number of failed ones."""
+        tasks = [(f"values_{dim}", self.engine.dimension_values, dim) for dim in DIMENSION_VALUES]
+        tasks += [(f"search_{dim}", self.engine.search_values, dim) for dim in self.engine.searches]
+        # The Pivot tab shows the first page of the pivot's crosstab
+        tasks += [
+            (request.slug, self.engine.crosstab if request.view == "pivot" else self.engine.view, request)
+            for request in default_requests(today)
+        ]
+        self._update(
+            state="running", done=0, total=len(tasks), errors=0,
+            started_at=datetime.now().isoformat(timespec="seconds"), seconds=None, error=None,
+        )
+
+        start = time.perf_counter()
+        errors = 0
+        for done, (name, run, arg) in enumerate(tasks, start=1):
+            self._throttle()
+            if self._stop.is_set():
+                self._update(state="stopped")
+                return errors
+            try:
+                run(arg)
+            except Exception as e:
+                errors += 1
+                self._update(error=f"{name}: {e}")
+            self._update(done=done, errors=errors)
+
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._status.update(state="done", seconds=seconds)
+            self._status["runs"] += 1
+        self.engine.profiler.record("warmup", "default views", seconds, rows=len(tasks), errors=errors)
+        return errors